@@ -0,0 +1,59 @@
+"""Compare encoding insert bodies from dictionaries with column-oriented rows.
+
+``insert()`` takes one dictionary per row and scans the keys of every row
+for the `columns` parameter; ``insert_columns()`` takes tuples with a fixed
+list of columns, and codecs such as msgspec encode them without building
+any dictionary.
+
+Run with::
+
+    poetry run python benchmarks/columnar_insert.py
+"""
+
+from __future__ import annotations
+
+import timeit
+
+from postgrest.base_request_builder import _unique_columns
+from postgrest.codec import (
+    JSONCodec,
+    MsgspecJSONCodec,
+    OrjsonJSONCodec,
+    StdlibJSONCodec,
+)
+
+COLUMNS = ["id", "name", "score", "active", "note"]
+
+
+def make_rows(count: int) -> list:
+    return [(i, f"name {i}", i * 0.5, i % 2 == 0, None) for i in range(count)]
+
+
+def encode_dicts(codec: JSONCodec, rows: list) -> bytes:
+    json = [dict(zip(COLUMNS, row)) for row in rows]
+    _unique_columns(json)
+    return codec.dumps(json)
+
+
+def main() -> None:
+    rows = make_rows(100_000)
+    for codec_class in (StdlibJSONCodec, OrjsonJSONCodec, MsgspecJSONCodec):
+        try:
+            codec = codec_class()
+        except ImportError:
+            continue
+        before = min(
+            timeit.repeat(lambda: encode_dicts(codec, rows), number=1, repeat=5)
+        )
+        after = min(
+            timeit.repeat(lambda: codec.dumps_rows(COLUMNS, rows), number=1, repeat=5)
+        )
+        print(
+            f"{codec.name:>8}: dicts {before * 1000:9.3f} ms"
+            f" | columns {after * 1000:9.3f} ms"
+            f" | x{before / after:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
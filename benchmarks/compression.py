@@ -0,0 +1,83 @@
+"""Compare the CPU time spent compressing insert bodies with the bytes saved.
+
+The rows are those of the test fixtures in ``infra/init.sql``, repeated to
+make insert bodies of a realistic size, and encoded as ``insert()`` would.
+The fixtures being small, the bodies repeat a few rows and compress better
+than real data would. The codecs whose package is not installed are skipped.
+
+Run with::
+
+    poetry run python benchmarks/compression.py
+"""
+
+from __future__ import annotations
+
+import re
+import time
+from ast import literal_eval
+from pathlib import Path
+from typing import Dict, List
+
+from postgrest.codec import get_default_json_codec
+from postgrest.compression import Compression
+
+FIXTURES = Path(__file__).parent.parent / "infra" / "init.sql"
+
+_INSERT = re.compile(r"insert into \S+ \((?P<columns>[^)]*)\) values", re.IGNORECASE)
+_ROW = re.compile(r"^\s*(\(.*\))[,;]$")
+
+LEVELS = {"gzip": (1, 6, 9), "br": (1, 4, 11), "zstd": (1, 3, 19)}
+
+
+def load_tables() -> Dict[str, List[dict]]:
+    """Read the rows of the `insert` statements of the fixtures."""
+    tables: Dict[str, List[dict]] = {}
+    rows: List[dict] = []
+    columns: List[str] = []
+    for line in FIXTURES.read_text().splitlines():
+        match = _INSERT.search(line)
+        if match:
+            columns = [column.strip() for column in match["columns"].split(",")]
+            rows = tables.setdefault(line.split()[2], [])
+            continue
+        match = _ROW.match(line)
+        if match and columns:
+            row = re.sub(r"\bNULL\b", "None", match[1])
+            values = literal_eval(re.sub(r"\barray\[", "[", row))
+            rows.append(dict(zip(columns, values)))
+            if line.rstrip().endswith(";"):
+                columns = []
+    return tables
+
+
+def make_body(rows: List[dict], count: int) -> bytes:
+    repeated = [{**rows[i % len(rows)], "id": i} for i in range(count)]
+    return get_default_json_codec().dumps(repeated)
+
+
+def main() -> None:
+    for table, rows in load_tables().items():
+        if not rows:
+            continue
+        body = make_body(rows, 10_000)
+        print(f"{table}: {len(body) / 1024:,.0f} KiB")
+        for codec, levels in LEVELS.items():
+            for level in levels:
+                try:
+                    compression = Compression(codec, level)
+                except ImportError:
+                    break
+                started = time.process_time()
+                for _ in range(5):
+                    compressed = compression.compress(body)
+                elapsed = (time.process_time() - started) / 5
+                print(
+                    f"  {codec:>4} {level:>2}: {len(compressed) / 1024:9,.1f} KiB"
+                    f" | x{len(body) / len(compressed):5.1f}"
+                    f" | {elapsed * 1000:8.2f} ms CPU"
+                    f" | {(len(body) - len(compressed)) / 1024 / max(elapsed, 1e-9) / 1024:8.1f} MiB saved/s"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Compare decoding response bodies from text with the single pass decoding.
+
+The previous handling decoded the body to text, then parsed it again with
+``Response.json()``; bodies are now handed to the JSON codec as bytes.
+
+Run with::
+
+    poetry run python benchmarks/response_body.py
+"""
+
+from __future__ import annotations
+
+import json
+import timeit
+
+from httpx import Request, Response
+
+from postgrest.base_request_builder import decode_response_body
+
+ROW = {
+    "id": 0,
+    "name": "country",
+    "iso2": "BQ",
+    "iso3": "BES",
+    "local_name": None,
+    "continent": None,
+}
+
+
+def make_body(size: int) -> bytes:
+    row = json.dumps(ROW).encode()
+    return b"[" + b",".join([row] * max(1, size // (len(row) + 1))) + b"]"
+
+
+def make_response(body: bytes) -> Response:
+    # a fresh response for every run, httpx caches the decoded text
+    return Response(
+        status_code=200,
+        content=body,
+        headers={"content-type": "application/json"},
+        request=Request(method="GET", url="http://example.com"),
+    )
+
+
+def decode_twice(response: Response) -> object:
+    if not response.text:
+        return []
+    try:
+        return response.json()
+    except ValueError:
+        return response.text
+
+
+def main() -> None:
+    for label, size in (("1 KB", 1 << 10), ("1 MB", 1 << 20), ("50 MB", 50 << 20)):
+        body = make_body(size)
+        number = max(1, (4 << 20) // size)
+        before = min(
+            timeit.repeat(
+                lambda: decode_twice(make_response(body)), number=number, repeat=5
+            )
+        )
+        after = min(
+            timeit.repeat(
+                lambda: decode_response_body(make_response(body)),
+                number=number,
+                repeat=5,
+            )
+        )
+        print(
+            f"{label:>6}: text + json {before / number * 1000:9.3f} ms"
+            f" | single pass {after / number * 1000:9.3f} ms"
+            f" | x{before / after:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Compare the cost of executing a query with and without the raw response mode.
+
+The queries run through the sync client against an ``httpx.MockTransport``
+answering with the same body every time, so the timings include building
+the request, decoding the body and building the response, but no network.
+``execute()`` builds an :class:`APIResponse` whose rows are typed as ``Any``,
+so pydantic only checks the list holding them, and ``execute(raw=True)``
+returns the decoded rows as they are: both should stay close. The last
+column is the time spent validating the same rows as an
+``APIResponse[Country]``, the cost the raw mode avoids for a caller who
+would otherwise validate the rows with a model.
+
+Run with::
+
+    poetry run python benchmarks/responses.py
+"""
+
+from __future__ import annotations
+
+import json
+import timeit
+from typing import Callable, Optional
+
+from httpx import Client, MockTransport, Response
+from pydantic import BaseModel
+
+from postgrest import APIResponse, CountMethod, SyncRequestBuilder
+
+
+class Country(BaseModel):
+    id: int
+    name: str
+    iso2: str
+    iso3: str
+    local_name: Optional[str]
+    continent: Optional[str]
+
+
+def make_body(rows: int) -> bytes:
+    data = [
+        {
+            "id": i,
+            "name": f"country {i}",
+            "iso2": "BQ",
+            "iso3": "BES",
+            "local_name": None,
+            "continent": None,
+        }
+        for i in range(rows)
+    ]
+    return json.dumps(data).encode()
+
+
+def make_client(rows: int) -> Client:
+    body = make_body(rows)
+    headers = {
+        "content-type": "application/json",
+        "content-range": f"0-{rows - 1}/{rows}",
+    }
+    transport = MockTransport(
+        lambda request: Response(200, content=body, headers=headers)
+    )
+    return Client(base_url="http://example.com", transport=transport)
+
+
+def best(fn: Callable[[], object], number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number
+
+
+def main() -> None:
+    for rows in (100, 10_000, 50_000):
+        number = max(1, 100_000 // rows)
+        with make_client(rows) as client:
+            query = SyncRequestBuilder(client, "/countries").select(
+                "*", count=CountMethod.exact
+            )
+            validated = best(lambda: query.execute(), number)
+            raw = best(lambda: query.execute(raw=True), number)
+            data = client.get("/countries").json()
+        models = best(lambda: APIResponse[Country](data=data, count=rows), number)
+        print(
+            f"{rows:>6} rows:"
+            f" execute() {validated * 1000:8.2f} ms"
+            f" | execute(raw=True) {raw * 1000:8.2f} ms"
+            f" | x{validated / raw:.2f}"
+            f" | APIResponse[Country] +{models * 1000:8.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -22,9 +22,16 @@ from ._sync.request_builder import (
     SyncSelectRequestBuilder,
     SyncSingleRequestBuilder,
 )
-from .base_request_builder import APIResponse
+from .base_request_builder import APIResponse, LazyAPIResponse, RawAPIResponse
+from .bulk import BulkChunkResult, BulkResult
+from .codec import JSONCodec, MsgspecJSONCodec, OrjsonJSONCodec, StdlibJSONCodec
+from .columnar import ColumnarBuilder, ColumnarRows
+from .compression import Compression
 from .constants import DEFAULT_POSTGREST_CLIENT_HEADERS
+from .count_cache import CountCache
 from .exceptions import APIError
+from .paging import AdaptivePageSize, PageStats
+from .spool import DEFAULT_SPOOL_THRESHOLD, SpooledAPIResponse, SpooledBody
 from .types import (
     CountMethod,
     Filters,
@@ -51,6 +58,23 @@ __all__ = [
     "SyncSelectRequestBuilder",
     "SyncSingleRequestBuilder",
     "APIResponse",
+    "BulkChunkResult",
+    "BulkResult",
+    "ColumnarBuilder",
+    "ColumnarRows",
+    "Compression",
+    "CountCache",
+    "RawAPIResponse",
+    "LazyAPIResponse",
+    "SpooledAPIResponse",
+    "SpooledBody",
+    "DEFAULT_SPOOL_THRESHOLD",
+    "AdaptivePageSize",
+    "PageStats",
+    "JSONCodec",
+    "MsgspecJSONCodec",
+    "OrjsonJSONCodec",
+    "StdlibJSONCodec",
     "DEFAULT_POSTGREST_CLIENT_HEADERS",
     "APIError",
     "CountMethod",
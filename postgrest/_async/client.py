@@ -1,16 +1,19 @@
 from __future__ import annotations
 
-from typing import Any, Dict, Optional, Union, cast
+from typing import Any, Dict, Iterable, Optional, Union, cast
 from warnings import warn
 
 from deprecation import deprecated
 from httpx import AsyncClient, Headers, QueryParams, Timeout
 
 from ..base_client import BasePostgrestClient
+from ..codec import JSONCodec, get_default_json_codec
+from ..compression import Compression
 from ..constants import (
     DEFAULT_POSTGREST_CLIENT_HEADERS,
     DEFAULT_POSTGREST_CLIENT_TIMEOUT,
 )
+from ..count_cache import CountCache
 from ..types import CountMethod
 from ..version import __version__
 from .request_builder import AsyncRequestBuilder, AsyncRPCFilterRequestBuilder
@@ -31,6 +34,9 @@ class AsyncPostgrestClient(BasePostgrestClient):
         verify: Optional[bool] = None,
         proxy: Optional[str] = None,
         http_client: Optional[AsyncClient] = None,
+        json_codec: Optional[JSONCodec] = None,
+        count_cache: Optional[CountCache] = None,
+        compression: Optional[Compression] = None,
     ) -> None:
         if timeout is not None:
             warn(
@@ -61,6 +67,8 @@ class AsyncPostgrestClient(BasePostgrestClient):
                 else DEFAULT_POSTGREST_CLIENT_TIMEOUT
             )
         )
+        if compression is not None:
+            headers = {**headers, "Accept-Encoding": compression.accept_encoding}
 
         BasePostgrestClient.__init__(
             self,
@@ -73,6 +81,9 @@ class AsyncPostgrestClient(BasePostgrestClient):
             http_client=http_client,
         )
         self.session = cast(AsyncClient, self.session)
+        self.json_codec = json_codec or get_default_json_codec()
+        self.count_cache = count_cache
+        self.compression = compression
 
     def create_session(
         self,
@@ -110,6 +121,9 @@ class AsyncPostgrestClient(BasePostgrestClient):
             timeout=self.timeout,
             verify=self.verify,
             proxy=self.proxy,
+            json_codec=self.json_codec,
+            count_cache=self.count_cache,
+            compression=self.compression,
         )
 
     async def __aenter__(self) -> AsyncPostgrestClient:
@@ -130,7 +144,13 @@ class AsyncPostgrestClient(BasePostgrestClient):
         Returns:
             :class:`AsyncRequestBuilder`
         """
-        return AsyncRequestBuilder[_TableT](self.session, f"/{table}")
+        return AsyncRequestBuilder[_TableT](
+            self.session,
+            f"/{table}",
+            self.json_codec,
+            self.count_cache,
+            self.compression,
+        )
 
     def table(self, table: str) -> AsyncRequestBuilder[_TableT]:
         """Alias to :meth:`from_`."""
@@ -182,8 +202,57 @@ class AsyncPostgrestClient(BasePostgrestClient):
                 headers,
                 QueryParams(params),
                 json={},
+                json_codec=self.json_codec,
             )
         # the params here are params to be sent to the RPC and not the queryparams!
         return AsyncRPCFilterRequestBuilder[Any](
-            self.session, f"/rpc/{func}", method, headers, QueryParams(), json=params
+            self.session,
+            f"/rpc/{func}",
+            method,
+            headers,
+            QueryParams(),
+            json=params,
+            json_codec=self.json_codec,
+            compression=self.compression,
         )
+
+    def rpc_in(
+        self,
+        func: str,
+        keys: Iterable[Any],
+        *,
+        param: str = "keys",
+        params: Optional[dict] = None,
+        count: Optional[CountMethod] = None,
+    ) -> AsyncRPCFilterRequestBuilder[Any]:
+        """Filter a table on a large set of keys through a set-returning
+        function, the keys being sent as a JSON array in the body.
+
+        Unlike :meth:`AsyncSelectRequestBuilder.in_` and
+        :meth:`AsyncSelectRequestBuilder.split_in`, the keys are not part of
+        the URL: any number of them is sent in a single request. The
+        filters, order and limit of the returned builder are applied by
+        PostgREST to the result set of the function, see
+        :meth:`rpc_in_sql` to generate one.
+
+        Args:
+            func: The name of the function, taking the keys as an array.
+            keys: The keys to look up.
+            param: The name of the array argument of the function.
+            params: The other arguments of the function, if any.
+            count: The method to use to get the count of rows returned.
+        Returns:
+            :class:`AsyncRPCFilterRequestBuilder`
+        Example:
+            .. code-block:: python
+
+                await (
+                    client.rpc_in("users_by_id", ids)
+                    .select("id", "name")
+                    .eq("active", True)
+                    .order("name")
+                    .limit(100)
+                    .execute()
+                )
+        """
+        return self.rpc(func, {**(params or {}), param: list(keys)}, count=count)
@@ -1,16 +1,19 @@
 from __future__ import annotations
 
-from typing import Any, Dict, Optional, Union, cast
+from typing import Any, Dict, Iterable, Optional, Union, cast
 from warnings import warn
 
 from deprecation import deprecated
 from httpx import Client, Headers, QueryParams, Timeout
 
 from ..base_client import BasePostgrestClient
+from ..codec import JSONCodec, get_default_json_codec
+from ..compression import Compression
 from ..constants import (
     DEFAULT_POSTGREST_CLIENT_HEADERS,
     DEFAULT_POSTGREST_CLIENT_TIMEOUT,
 )
+from ..count_cache import CountCache
 from ..types import CountMethod
 from ..version import __version__
 from .request_builder import SyncRequestBuilder, SyncRPCFilterRequestBuilder
@@ -31,6 +34,9 @@ class SyncPostgrestClient(BasePostgrestClient):
         verify: Optional[bool] = None,
         proxy: Optional[str] = None,
         http_client: Optional[Client] = None,
+        json_codec: Optional[JSONCodec] = None,
+        count_cache: Optional[CountCache] = None,
+        compression: Optional[Compression] = None,
     ) -> None:
         if timeout is not None:
             warn(
@@ -61,6 +67,8 @@ class SyncPostgrestClient(BasePostgrestClient):
                 else DEFAULT_POSTGREST_CLIENT_TIMEOUT
             )
         )
+        if compression is not None:
+            headers = {**headers, "Accept-Encoding": compression.accept_encoding}
 
         BasePostgrestClient.__init__(
             self,
@@ -73,6 +81,9 @@ class SyncPostgrestClient(BasePostgrestClient):
             http_client=http_client,
         )
         self.session = cast(Client, self.session)
+        self.json_codec = json_codec or get_default_json_codec()
+        self.count_cache = count_cache
+        self.compression = compression
 
     def create_session(
         self,
@@ -110,6 +121,9 @@ class SyncPostgrestClient(BasePostgrestClient):
             timeout=self.timeout,
             verify=self.verify,
             proxy=self.proxy,
+            json_codec=self.json_codec,
+            count_cache=self.count_cache,
+            compression=self.compression,
         )
 
     def __enter__(self) -> SyncPostgrestClient:
@@ -128,9 +142,15 @@ class SyncPostgrestClient(BasePostgrestClient):
         Args:
             table: The name of the table
         Returns:
-            :class:`AsyncRequestBuilder`
+            :class:`SyncRequestBuilder`
         """
-        return SyncRequestBuilder[_TableT](self.session, f"/{table}")
+        return SyncRequestBuilder[_TableT](
+            self.session,
+            f"/{table}",
+            self.json_codec,
+            self.count_cache,
+            self.compression,
+        )
 
     def table(self, table: str) -> SyncRequestBuilder[_TableT]:
         """Alias to :meth:`from_`."""
@@ -158,16 +178,16 @@ class SyncPostgrestClient(BasePostgrestClient):
             head: When set to `true`, `data` will not be returned. Useful if you only need the count.
             get: When set to `true`, the function will be called with read-only access mode.
         Returns:
-            :class:`AsyncRPCFilterRequestBuilder`
+            :class:`SyncRPCFilterRequestBuilder`
         Example:
             .. code-block:: python
 
-                await client.rpc("foobar", {"arg": "value"}).execute()
+                client.rpc("foobar", {"arg": "value"}).execute()
 
         .. versionchanged:: 0.10.9
-            This method now returns a :class:`AsyncRPCFilterRequestBuilder`.
+            This method now returns a :class:`SyncRPCFilterRequestBuilder`.
         .. versionchanged:: 0.10.2
-            This method now returns a :class:`AsyncFilterRequestBuilder` which allows you to
+            This method now returns a :class:`SyncFilterRequestBuilder` which allows you to
             filter on the RPC's resultset.
         """
         method = "HEAD" if head else "GET" if get else "POST"
@@ -182,8 +202,57 @@ class SyncPostgrestClient(BasePostgrestClient):
                 headers,
                 QueryParams(params),
                 json={},
+                json_codec=self.json_codec,
             )
         # the params here are params to be sent to the RPC and not the queryparams!
         return SyncRPCFilterRequestBuilder[Any](
-            self.session, f"/rpc/{func}", method, headers, QueryParams(), json=params
+            self.session,
+            f"/rpc/{func}",
+            method,
+            headers,
+            QueryParams(),
+            json=params,
+            json_codec=self.json_codec,
+            compression=self.compression,
         )
+
+    def rpc_in(
+        self,
+        func: str,
+        keys: Iterable[Any],
+        *,
+        param: str = "keys",
+        params: Optional[dict] = None,
+        count: Optional[CountMethod] = None,
+    ) -> SyncRPCFilterRequestBuilder[Any]:
+        """Filter a table on a large set of keys through a set-returning
+        function, the keys being sent as a JSON array in the body.
+
+        Unlike :meth:`SyncSelectRequestBuilder.in_` and
+        :meth:`SyncSelectRequestBuilder.split_in`, the keys are not part of
+        the URL: any number of them is sent in a single request. The
+        filters, order and limit of the returned builder are applied by
+        PostgREST to the result set of the function, see
+        :meth:`rpc_in_sql` to generate one.
+
+        Args:
+            func: The name of the function, taking the keys as an array.
+            keys: The keys to look up.
+            param: The name of the array argument of the function.
+            params: The other arguments of the function, if any.
+            count: The method to use to get the count of rows returned.
+        Returns:
+            :class:`SyncRPCFilterRequestBuilder`
+        Example:
+            .. code-block:: python
+
+                (
+                    client.rpc_in("users_by_id", ids)
+                    .select("id", "name")
+                    .eq("active", True)
+                    .order("name")
+                    .limit(100)
+                    .execute()
+                )
+        """
+        return self.rpc(func, {**(params or {}), param: list(keys)}, count=count)
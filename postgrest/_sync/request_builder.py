@@ -1,28 +1,389 @@
 from __future__ import annotations
 
-from typing import Any, Generic, Optional, TypeVar, Union
+from collections import deque
+from contextlib import contextmanager
+from copy import copy
+from functools import partial
+from heapq import merge
+from io import TextIOBase
+from itertools import chain, islice
+from os import PathLike
+from re import compile
+from time import perf_counter
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Deque,
+    Dict,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Literal,
+    Mapping,
+    Optional,
+    Sequence,
+    TextIO,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    overload,
+)
 
-from httpx import Client, Headers, QueryParams
+from httpx import (
+    Client,
+    Headers,
+    HTTPError,
+    QueryParams,
+    Response,
+    TransportError,
+)
 from pydantic import ValidationError
 
 from ..base_request_builder import (
+    DEFAULT_MAX_URL_LENGTH,
     APIResponse,
     BaseFilterRequestBuilder,
     BaseRPCRequestBuilder,
     BaseSelectRequestBuilder,
     CountMethod,
+    LazyAPIResponse,
+    RawAPIResponse,
     SingleAPIResponse,
+    conflict_columns,
+    count_method,
+    decode_response_body,
+    dedupe_rows,
+    encode_json_body,
+    in_filter_budget,
+    in_filter_chunks,
+    is_row_stream,
+    json_content_headers,
+    largest_in_filter,
+    order_sort_key,
+    partition_key_range,
     pre_delete,
     pre_insert,
+    pre_paginate,
     pre_select,
     pre_update,
     pre_upsert,
+    response_body_format,
+    row_key_values,
+    split_in_list,
+    with_count,
+)
+from ..bulk import (
+    RETRYABLE_STATUS_CODES,
+    BulkChunk,
+    BulkChunkResult,
+    BulkResult,
+    CSVSource,
+    encode_chunks,
+    encode_column_chunks,
+)
+from ..codec import JSONCodec, get_default_json_codec
+from ..columnar import Column, ColumnarBuilder, ColumnarRows
+from ..compression import Compression
+from ..concurrency import SyncBackgroundTasks, SyncReadAhead, SyncTaskPool
+from ..count_cache import CountCache, CountKey
+from ..exceptions import (
+    APIError,
+    api_error_from_response,
+    generate_default_error_message,
 )
-from ..exceptions import APIError, APIErrorFromJSON, generate_default_error_message
+from ..paging import AdaptivePageSize
+from ..spool import SpooledAPIResponse, SpooledBody
+from ..streaming import CSVStreamParser, JSONArrayEncoder, JSONArrayParser
 from ..types import ReturnMethod
-from ..utils import get_origin_and_cast, model_validate_json
+from ..utils import get_origin_and_cast, json_model_decoder, sanitize_param
 
 _ReturnT = TypeVar("_ReturnT")
+_ModelT = TypeVar("_ModelT")
+_SingleT = TypeVar("_SingleT", bound="SyncSingleRequestBuilder[Any]")
+
+_JSON_ARRAY_START = compile(rb"\s*\[")
+
+# the count cache refreshes exact counts in the background
+_background_tasks = SyncBackgroundTasks()
+
+
+def _decode_model(model: Type[Any], content: bytes) -> Any:
+    # RPCs returning a set of rows send an array, a single value otherwise
+    many = _JSON_ARRAY_START.match(content) is not None
+    return json_model_decoder(model, many=many)(content)
+
+
+_Executable = Union["SyncQueryRequestBuilder[Any]", "SyncSingleRequestBuilder[Any]"]
+
+
+def _iterate(
+    items: Union[Iterable[Any], Iterable[Any]],
+) -> Iterator[Any]:
+    if hasattr(items, "__iter__"):
+        for item in items:  # noqa: UP028
+            yield item
+    else:
+        for item in items:  # noqa: UP028
+            yield item
+
+
+def _stream_json_array(
+    rows: Union[Iterable[Any], Iterable[Any]], json_codec: JSONCodec
+) -> Iterator[bytes]:
+    """Encode rows into a JSON array as they are produced."""
+    encoder = JSONArrayEncoder(json_codec)
+    for row in _iterate(rows):
+        chunk = encoder.feed(row)
+        if chunk:
+            yield chunk
+    yield encoder.close()
+
+
+def _encode_body(
+    builder: _Executable,
+) -> Tuple[Union[None, bytes, Iterator[bytes]], Headers]:
+    """Encode the body of the request of `builder`, streaming the rows given
+    as an iterator and CSV documents, which are sent with a chunked transfer
+    encoding, and compress it if the client is configured to."""
+    content: Union[None, bytes, Iterator[bytes]]
+    if isinstance(builder.json, CSVSource):
+        source = builder.json
+        content = _iterate(source.source if source.is_async else source.iter_bytes())
+        headers = builder.headers
+    elif is_row_stream(builder.json):
+        headers = json_content_headers(builder.headers, builder.session)
+        content = _stream_json_array(builder.json, builder.json_codec)
+    else:
+        content, headers = encode_json_body(
+            builder.json, builder.headers, builder.session, builder.json_codec
+        )
+    return _compress_body(builder.compression, content, headers)
+
+
+def _compress_body(
+    compression: Optional[Compression],
+    content: Union[None, bytes, Iterator[bytes]],
+    headers: Headers,
+) -> Tuple[Union[None, bytes, Iterator[bytes]], Headers]:
+    """Compress a request body, unless it is smaller than the threshold of
+    `compression`; streamed bodies are compressed as they are produced."""
+    if compression is None or content is None:
+        return content, headers
+    if isinstance(content, bytes):
+        if len(content) < compression.threshold:
+            return content, headers
+        content = compression.compress(content)
+    else:
+        content = _compress_stream(content, compression)
+    headers = headers.copy()
+    headers["Content-Encoding"] = compression.codec
+    return content, headers
+
+
+def _compress_stream(
+    chunks: Iterator[bytes], compression: Compression
+) -> Iterator[bytes]:
+    compressor = compression.compressor()
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _check_url_length(builder: _Executable) -> None:
+    """Refuse to send a URL longer than the limit set by `split_in()`, for the
+    requests that cannot be split."""
+    if builder.max_url_length is None:
+        return
+    url = builder.session.build_request(
+        builder.http_method, builder.path, params=builder.params
+    ).url
+    if len(str(url).encode()) > builder.max_url_length:
+        raise ValueError(
+            f"The URL of the query is longer than {builder.max_url_length} bytes:"
+            " split_in() only splits execute(), not streamed, spooled or single-row"
+            " queries"
+        )
+
+
+@contextmanager
+def _stream_response(builder: _Executable) -> Iterator[Response]:
+    """Send the request of `builder`, leaving the response body to be streamed."""
+    _check_url_length(builder)
+    content, headers = _encode_body(builder)
+    with builder.session.stream(
+        builder.http_method,
+        builder.path,
+        content=content,
+        params=builder.params,
+        headers=headers,
+    ) as r:
+        if not r.is_success:
+            r.read()
+            raise api_error_from_response(r)
+        yield r
+
+
+def _execute_spooled(builder: _Executable, threshold: int) -> SpooledAPIResponse:
+    body = SpooledBody(threshold)
+    try:
+        with _stream_response(builder) as r:
+            for chunk in r.iter_bytes():
+                body.write(chunk)
+    except BaseException:
+        body.close()
+        raise
+    return SpooledAPIResponse(
+        body,
+        APIResponse._get_count_from_http_request_response(r),
+        r.headers,
+        response_body_format(builder.headers.get("Accept")),
+    )
+
+
+def _execute_with_count_cache(
+    builder: _Executable, cache: CountCache, raw: bool, lazy: bool
+) -> Any:
+    query = copy(builder)
+    query.count_cache = None
+    method = count_method(builder.headers)
+    if method is None or builder.http_method not in ("GET", "HEAD"):
+        return query.execute(raw=raw, lazy=lazy)
+    headers = Headers(builder.session.headers)
+    headers.update(builder.headers)
+    key = CountCache.key(builder.path, builder.params, headers, method)
+    count = cache.get(key)
+    fallback = count is None and method == CountMethod.exact and cache.fallback
+    if count is not None:
+        query.headers = with_count(builder.headers)
+    elif fallback:
+        query.headers = with_count(builder.headers, cache.fallback)
+        if cache.start_refresh(key):
+            _background_tasks.spawn(partial(_refresh_count, builder, cache, key))
+    response = query.execute(raw=raw, lazy=lazy)
+    if isinstance(response, str) or response is None:
+        return response
+    if count is not None:
+        response.count = count
+    elif not fallback and response.count is not None:
+        cache.set(key, response.count)
+    return response
+
+
+def _refresh_count(builder: _Executable, cache: CountCache, key: CountKey) -> None:
+    query = copy(builder)
+    query.count_cache = None
+    query.http_method = "HEAD"
+    query.headers = with_count(builder.headers, CountMethod.exact)
+    # the count doesn't depend on the representation asked for, while a
+    # single object would be refused for more than one row
+    query.headers.pop("Accept", None)
+    count = None
+    try:
+        count = (query.execute(raw=True)).count
+    except (APIError, HTTPError):
+        # the next query asking for the count will try again
+        pass
+    finally:
+        cache.end_refresh(key, count)
+
+
+def _send_chunk(
+    builder: _Executable,
+    chunk: BulkChunk,
+    headers: Headers,
+    retries: int,
+    backoff: float,
+) -> BulkChunkResult:
+    """Send a chunk of a bulk write with the method, path and parameters of
+    `builder`, retrying after transport errors and transient statuses."""
+    started = perf_counter()
+    content, headers = _compress_body(builder.compression, chunk.body, headers)
+    attempts = 0
+    while True:
+        attempts += 1
+        try:
+            r = builder.session.request(
+                builder.http_method,
+                builder.path,
+                content=content,
+                params=builder.params if chunk.params is None else chunk.params,
+                headers=headers,
+            )
+        except TransportError as e:
+            error: Optional[Union[APIError, HTTPError]] = e
+        else:
+            if r.is_success:
+                if builder.response_model is not None and r.content:
+                    model = builder.response_model
+                    data = json_model_decoder(model, many=True)(r.content)
+                else:
+                    data = decode_response_body(r, builder.json_codec)
+                count = APIResponse._get_count_from_http_request_response(r)
+                return BulkChunkResult(
+                    chunk.index,
+                    chunk.start,
+                    chunk.rows,
+                    count,
+                    data,
+                    None,
+                    attempts,
+                    perf_counter() - started,
+                )
+            error = api_error_from_response(r)
+            if r.status_code not in RETRYABLE_STATUS_CODES:
+                break
+        if attempts > retries:
+            break
+        SyncTaskPool.sleep(backoff * 2 ** (attempts - 1))
+    return BulkChunkResult(
+        chunk.index,
+        chunk.start,
+        chunk.rows,
+        None,
+        [],
+        error,
+        attempts,
+        perf_counter() - started,
+    )
+
+
+def _send_chunks(
+    builder: _Executable,
+    chunks: Iterable[BulkChunk],
+    headers: Headers,
+    concurrency: int,
+    retries: int,
+    backoff: float,
+    ordered: bool = True,
+) -> Iterator[BulkChunkResult]:
+    """Send the chunks of a bulk write concurrently, yielding their outcome."""
+    send = partial(
+        _send_chunk, builder, headers=headers, retries=retries, backoff=backoff
+    )
+    return SyncTaskPool(concurrency).map(send, chunks, ordered=ordered)
+
+
+def _execute_chunks(
+    builder: _Executable,
+    chunks: Iterable[BulkChunk],
+    headers: Headers,
+    concurrency: int,
+    retries: int,
+    backoff: float,
+) -> BulkResult:
+    started = perf_counter()
+    results = [
+        result
+        for result in _send_chunks(
+            builder, chunks, headers, concurrency, retries, backoff
+        )
+    ]
+    return BulkResult(results, perf_counter() - started)
 
 
 class SyncQueryRequestBuilder(Generic[_ReturnT]):
@@ -34,6 +395,8 @@ class SyncQueryRequestBuilder(Generic[_ReturnT]):
         headers: Headers,
         params: QueryParams,
         json: dict,
+        json_codec: Optional[JSONCodec] = None,
+        compression: Optional[Compression] = None,
     ) -> None:
         self.session = session
         self.path = path
@@ -41,44 +404,277 @@ class SyncQueryRequestBuilder(Generic[_ReturnT]):
         self.headers = headers
         self.params = params
         self.json = None if http_method in {"GET", "HEAD"} else json
+        self.json_codec = json_codec or get_default_json_codec()
+        self.compression = compression
+        self.response_model: Optional[Type[Any]] = None
+        self.count_cache: Optional[CountCache] = None
+        self.max_url_length: Optional[int] = None
+        self.split_concurrency = 4
+        self.collapsed_rows = 0
+        """The number of rows dropped by the `dedupe` option of an upsert."""
+
+    @overload
+    def execute(
+        self, *, raw: Literal[False] = False, lazy: Literal[False] = False
+    ) -> APIResponse[_ReturnT]: ...
 
-    def execute(self) -> APIResponse[_ReturnT]:
+    @overload
+    def execute(
+        self, *, raw: Literal[True], lazy: Literal[False] = False
+    ) -> RawAPIResponse[List[_ReturnT]]: ...
+
+    @overload
+    def execute(
+        self, *, raw: bool = False, lazy: Literal[True]
+    ) -> LazyAPIResponse[List[_ReturnT]]: ...
+
+    @overload
+    def execute(
+        self, *, raw: bool = False, lazy: bool = False, spool: int
+    ) -> SpooledAPIResponse: ...
+
+    def execute(
+        self, *, raw: bool = False, lazy: bool = False, spool: Optional[int] = None
+    ) -> Union[
+        APIResponse[_ReturnT],
+        RawAPIResponse[List[_ReturnT]],
+        LazyAPIResponse[List[_ReturnT]],
+        SpooledAPIResponse,
+    ]:
         """Execute the query.
 
         .. tip::
             This is the last method called, after the query is built.
 
+        Args:
+            raw: Return a :class:`RawAPIResponse` holding the decoded body as-is,
+                skipping the validation done when building an :class:`APIResponse`.
+            lazy: Return a :class:`LazyAPIResponse`, whose body is only decoded
+                when its `data` is first accessed. Its `count` is read from
+                the headers, which makes count-only queries and writes with
+                ``returning=minimal`` nearly free.
+            spool: Write the body to a :class:`SpooledBody` as it is received,
+                keeping up to `spool` bytes in memory before spilling to a
+                temporary file, and return a :class:`SpooledAPIResponse`
+                iterating over the rows. Meant for results larger than the
+                available memory, see :data:`DEFAULT_SPOOL_THRESHOLD`.
         Returns:
             :class:`APIResponse`
 
         Raises:
             :class:`APIError` If the API raised an error.
         """
+        if spool is not None:
+            return _execute_spooled(self, spool)
+        if self.max_url_length is not None:
+            split = self._split_in_filter(self.max_url_length)
+            if split is not None:
+                if lazy:
+                    raise ValueError(
+                        "A query split by split_in() cannot be executed lazily"
+                        " or paginated"
+                    )
+                return self._execute_split(*split, raw=raw)
+        if self.count_cache is not None:
+            return _execute_with_count_cache(self, self.count_cache, raw=raw, lazy=lazy)
+        content, headers = _encode_body(self)
         r = self.session.request(
             self.http_method,
             self.path,
-            json=self.json,
+            content=content,
             params=self.params,
-            headers=self.headers,
+            headers=headers,
         )
+        if not r.is_success:
+            raise api_error_from_response(r)
+        if (
+            self.http_method != "HEAD"
+            and response_body_format(self.headers.get("Accept")) != "json"
+        ):
+            return r.text
+        if lazy:
+            return LazyAPIResponse.from_http_request_response(
+                r,
+                self.json_codec,
+                json_model_decoder(self.response_model, many=True)
+                if self.response_model is not None
+                else None,
+            )
+        if self.response_model is not None and r.content:
+            # validation errors of the response model are left to the caller
+            data = json_model_decoder(self.response_model, many=True)(r.content)
+            count = APIResponse._get_count_from_http_request_response(r)
+            if raw:
+                return RawAPIResponse(data, count, r.headers)
+            return APIResponse[_ReturnT](data=data, count=count)
+        if raw:
+            return RawAPIResponse.from_http_request_response(r, self.json_codec)
         try:
-            if r.is_success:
-                if self.http_method != "HEAD":
-                    body = r.text
-                    if self.headers.get("Accept") == "text/csv":
-                        return body
-                    if self.headers.get(
-                        "Accept"
-                    ) and "application/vnd.pgrst.plan" in self.headers.get("Accept"):
-                        if "+json" not in self.headers.get("Accept"):
-                            return body
-                return APIResponse[_ReturnT].from_http_request_response(r)
-            else:
-                json_obj = model_validate_json(APIErrorFromJSON, r.content)
-                raise APIError(dict(json_obj))
+            return APIResponse[_ReturnT].from_http_request_response(r, self.json_codec)
         except ValidationError as e:
             raise APIError(generate_default_error_message(r))
 
+    def execute_bulk(
+        self,
+        chunk_rows: Optional[int] = 1000,
+        chunk_bytes: Optional[int] = None,
+        *,
+        concurrency: int = 4,
+        retries: int = 2,
+        backoff: float = 0.5,
+    ) -> BulkResult:
+        """Execute an insert or an upsert of many rows as several requests.
+
+        The rows are split into chunks of at most `chunk_rows` rows and
+        `chunk_bytes` encoded bytes, which are sent concurrently. Every
+        chunk is sent with the headers and parameters of the query, so the
+        `returning`, `count`, `ignore_duplicates`, `on_conflict` and
+        `default_to_null` options apply to each of them, and all of them
+        name the same `columns`. A chunk failing with a transport error or
+        a transient status (see :data:`RETRYABLE_STATUS_CODES`) is sent
+        again up to `retries` times, after `backoff` seconds, doubled on
+        every attempt.
+
+        Rows given to :meth:`SyncRequestBuilder.insert_columns` are only
+        split by `chunk_rows`. CSV documents given to
+        :meth:`SyncRequestBuilder.insert_csv` are split on record
+        boundaries, every chunk repeating the header.
+
+        .. warning::
+            Every chunk is a separate transaction: a failed chunk leaves
+            the other ones written. A chunk that timed out may have been
+            written anyway, so retrying plain inserts can duplicate rows,
+            unlike upserts.
+
+        Args:
+            chunk_rows: The maximum number of rows of a chunk.
+            chunk_bytes: The maximum size of the body of a chunk.
+            concurrency: The maximum number of chunks sent at once.
+            retries: The number of times a failed chunk is sent again.
+            backoff: The time waited before the first retry, in seconds.
+        Returns:
+            :class:`BulkResult`
+        Raises:
+            :class:`ValueError` If the query is not an insert or an upsert
+                of a list of rows, or if no chunk size is given.
+        """
+        if self.http_method != "POST" or not isinstance(
+            self.json, (list, ColumnarRows, CSVSource)
+        ):
+            raise ValueError("Only inserts and upserts of a list can be run in bulk")
+        if chunk_rows is None and chunk_bytes is None:
+            raise ValueError("chunk_rows or chunk_bytes must be given")
+        if retries < 0:
+            raise ValueError("retries must not be negative")
+        if isinstance(self.json, CSVSource):
+            if self.json.is_async:
+                raise ValueError("A CSV document read asynchronously cannot be split")
+            chunks = self.json.chunks(chunk_rows, chunk_bytes)
+            return _execute_chunks(
+                self, chunks, self.headers, concurrency, retries, backoff
+            )
+        if isinstance(self.json, ColumnarRows):
+            if chunk_rows is None or chunk_bytes is not None:
+                raise ValueError("Column-oriented rows are only split by chunk_rows")
+            chunks = encode_column_chunks(self.json, self.json_codec, chunk_rows)
+        else:
+            chunks = encode_chunks(self.json, self.json_codec, chunk_rows, chunk_bytes)
+        headers = json_content_headers(self.headers, self.session)
+        return _execute_chunks(self, chunks, headers, concurrency, retries, backoff)
+
+    def _split_in_filter(
+        self, max_url_length: int
+    ) -> Optional[Tuple[List[QueryParams], int, Optional[int]]]:
+        """Split the query on its largest `in` filter if its URL is longer than
+        `max_url_length`.
+
+        Returns:
+            The parameters of every piece, along with the offset and the
+            limit to apply to their merged rows, or `None` if the URL is
+            short enough.
+        Raises:
+            :class:`ValueError` If the URL is too long and cannot be split.
+        """
+        url = self.session.build_request(
+            self.http_method, self.path, params=self.params
+        ).url
+        if len(str(url).encode()) <= max_url_length:
+            return None
+        found = largest_in_filter(self.params)
+        if (
+            found is None
+            or self.http_method not in ("GET", "HEAD")
+            or response_body_format(self.headers.get("Accept")) != "json"
+        ):
+            raise ValueError(
+                f"The URL of the query is longer than {max_url_length} bytes"
+                " and has no `in` filter that can be split"
+            )
+        position, key, criteria = found
+        items = self.params.multi_items()
+        params = QueryParams(items[:position] + items[position + 1 :])
+        # every piece returns the rows up to the end of the requested window
+        offset = int(params.get("offset", 0))
+        limit = int(params["limit"]) if "limit" in params else None
+        params = params.remove("offset")
+        if limit is not None:
+            params = params.set("limit", str(offset + limit))
+        budget = in_filter_budget(
+            self.session, self.http_method, self.path, params, key, max_url_length
+        )
+        # PostgreSQL ignores duplicates in `in` lists, they would be counted
+        # twice once split
+        values = list(dict.fromkeys(split_in_list(criteria)))
+        pieces = [
+            params.add(key, piece)
+            for _, piece in in_filter_chunks(values, budget, sanitized=True)
+        ]
+        return pieces, offset, limit
+
+    def _execute_split(
+        self, pieces: List[QueryParams], offset: int, limit: Optional[int], raw: bool
+    ) -> Any:
+        def fetch(params: QueryParams) -> RawAPIResponse[List[_ReturnT]]:
+            query = copy(self)
+            query.params = params
+            query.max_url_length = None
+            query.count_cache = None
+            return query.execute(raw=True)
+
+        responses = [
+            response
+            for response in SyncTaskPool(self.split_concurrency).map(fetch, pieces)
+        ]
+        order = self.params.get("order")
+        pages = [response.data for response in responses]
+        if order:
+            rows: Iterable[Any] = merge(*pages, key=order_sort_key(order))
+        else:
+            rows = chain.from_iterable(pages)
+        end = None if limit is None else offset + limit
+        data = list(islice(rows, offset, end))
+        counts = [r.count for r in responses if r.count is not None]
+        count = sum(counts) if counts else None
+        if raw:
+            return RawAPIResponse(data, count, responses[0].headers)
+        return APIResponse[_ReturnT](data=data, count=count)
+
+    def returns(self, model: Type[_ModelT]) -> SyncQueryRequestBuilder[_ModelT]:
+        """Decode the returned rows straight into instances of `model`.
+
+        The response body is validated in a single pass, with pydantic's
+        `TypeAdapter` or with msgspec for `msgspec.Struct` models, without
+        building a dictionary per row first.
+
+        .. tip::
+            This is meant to be called after the filters, right before :meth:`execute`.
+
+        Args:
+            model: A pydantic model, a dataclass, a `TypedDict` or a `msgspec.Struct`.
+        """
+        self.response_model = model
+        return self  # type: ignore
+
 
 class SyncSingleRequestBuilder(Generic[_ReturnT]):
     def __init__(
@@ -89,6 +685,8 @@ class SyncSingleRequestBuilder(Generic[_ReturnT]):
         headers: Headers,
         params: QueryParams,
         json: dict,
+        json_codec: Optional[JSONCodec] = None,
+        compression: Optional[Compression] = None,
     ) -> None:
         self.session = session
         self.path = path
@@ -96,43 +694,144 @@ class SyncSingleRequestBuilder(Generic[_ReturnT]):
         self.headers = headers
         self.params = params
         self.json = json
+        self.json_codec = json_codec or get_default_json_codec()
+        self.compression = compression
+        self.response_model: Optional[Type[Any]] = None
+        self.max_url_length: Optional[int] = None
+        self.count_cache: Optional[CountCache] = None
+
+    @overload
+    def execute(
+        self, *, raw: Literal[False] = False, lazy: Literal[False] = False
+    ) -> SingleAPIResponse[_ReturnT]: ...
+
+    @overload
+    def execute(
+        self, *, raw: Literal[True], lazy: Literal[False] = False
+    ) -> RawAPIResponse[_ReturnT]: ...
 
-    def execute(self) -> SingleAPIResponse[_ReturnT]:
+    @overload
+    def execute(
+        self, *, raw: bool = False, lazy: Literal[True]
+    ) -> LazyAPIResponse[_ReturnT]: ...
+
+    @overload
+    def execute(
+        self, *, raw: bool = False, lazy: bool = False, spool: int
+    ) -> SpooledAPIResponse: ...
+
+    def execute(
+        self, *, raw: bool = False, lazy: bool = False, spool: Optional[int] = None
+    ) -> Union[
+        SingleAPIResponse[_ReturnT],
+        RawAPIResponse[_ReturnT],
+        LazyAPIResponse[_ReturnT],
+        SpooledAPIResponse,
+    ]:
         """Execute the query.
 
         .. tip::
             This is the last method called, after the query is built.
 
+        Args:
+            raw: Return a :class:`RawAPIResponse` holding the decoded body as-is,
+                skipping the validation done when building a :class:`SingleAPIResponse`.
+            lazy: Return a :class:`LazyAPIResponse`, whose body is only decoded
+                when its `data` is first accessed.
+            spool: Spool the body to disk above `spool` bytes and return a
+                :class:`SpooledAPIResponse`, typically for large CSV exports.
         Returns:
             :class:`SingleAPIResponse`
 
         Raises:
             :class:`APIError` If the API raised an error.
         """
+        if spool is not None:
+            return _execute_spooled(self, spool)
+        _check_url_length(self)
+        if self.count_cache is not None:
+            return _execute_with_count_cache(self, self.count_cache, raw=raw, lazy=lazy)
+        content, headers = _encode_body(self)
         r = self.session.request(
             self.http_method,
             self.path,
-            json=self.json,
+            content=content,
             params=self.params,
-            headers=self.headers,
+            headers=headers,
         )
+        if not (
+            200 <= r.status_code <= 299
+        ):  # Response.ok from JS (https://developer.mozilla.org/en-US/docs/Web/API/Response/ok)
+            raise api_error_from_response(r)
+        if lazy:
+            return LazyAPIResponse.from_http_request_response(
+                r,
+                self.json_codec,
+                partial(_decode_model, self.response_model)
+                if self.response_model is not None
+                else None,
+            )
+        if self.response_model is not None and r.content:
+            # validation errors of the response model are left to the caller
+            data = _decode_model(self.response_model, r.content)
+            count = SingleAPIResponse._get_count_from_http_request_response(r)
+            if raw:
+                return RawAPIResponse(data, count, r.headers)
+            return SingleAPIResponse[_ReturnT](data=data, count=count)
+        if raw:
+            return RawAPIResponse.from_http_request_response(r, self.json_codec)
         try:
-            if (
-                200 <= r.status_code <= 299
-            ):  # Response.ok from JS (https://developer.mozilla.org/en-US/docs/Web/API/Response/ok)
-                return SingleAPIResponse[_ReturnT].from_http_request_response(r)
-            else:
-                json_obj = model_validate_json(APIErrorFromJSON, r.content)
-                raise APIError(dict(json_obj))
+            return SingleAPIResponse[_ReturnT].from_http_request_response(
+                r, self.json_codec
+            )
         except ValidationError as e:
             raise APIError(generate_default_error_message(r))
 
+    def returns(self, model: Type[_ModelT]) -> SyncSingleRequestBuilder[_ModelT]:
+        """Decode the returned row(s) straight into instances of `model`.
+
+        The response body is validated in a single pass, with pydantic's
+        `TypeAdapter` or with msgspec for `msgspec.Struct` models. When the
+        body is a JSON array, as for RPCs returning a set of rows, `data` is
+        a list of `model` instances.
+
+        .. tip::
+            This is meant to be called after the filters, right before :meth:`execute`.
+
+        Args:
+            model: A pydantic model, a dataclass, a `TypedDict` or a `msgspec.Struct`.
+        """
+        self.response_model = model
+        return self  # type: ignore
+
 
 class SyncMaybeSingleRequestBuilder(SyncSingleRequestBuilder[_ReturnT]):
-    def execute(self) -> Optional[SingleAPIResponse[_ReturnT]]:
+    @overload  # type: ignore[override]
+    def execute(
+        self, *, raw: Literal[False] = False, lazy: Literal[False] = False
+    ) -> Optional[SingleAPIResponse[_ReturnT]]: ...
+
+    @overload
+    def execute(
+        self, *, raw: Literal[True], lazy: Literal[False] = False
+    ) -> Optional[RawAPIResponse[_ReturnT]]: ...
+
+    @overload
+    def execute(
+        self, *, raw: bool = False, lazy: Literal[True]
+    ) -> Optional[LazyAPIResponse[_ReturnT]]: ...
+
+    def execute(
+        self, *, raw: bool = False, lazy: bool = False
+    ) -> Union[
+        SingleAPIResponse[_ReturnT],
+        RawAPIResponse[_ReturnT],
+        LazyAPIResponse[_ReturnT],
+        None,
+    ]:
         r = None
         try:
-            r = SyncSingleRequestBuilder[_ReturnT].execute(self)
+            r = SyncSingleRequestBuilder[_ReturnT].execute(self, raw=raw, lazy=lazy)
         except APIError as e:
             if e.details and "The result contains 0 rows" in e.details:
                 return None
@@ -160,12 +859,22 @@ class SyncFilterRequestBuilder(
         headers: Headers,
         params: QueryParams,
         json: dict,
+        json_codec: Optional[JSONCodec] = None,
+        compression: Optional[Compression] = None,
     ) -> None:
         get_origin_and_cast(BaseFilterRequestBuilder[_ReturnT]).__init__(
             self, session, headers, params
         )
         get_origin_and_cast(SyncQueryRequestBuilder[_ReturnT]).__init__(
-            self, session, path, http_method, headers, params, json
+            self,
+            session,
+            path,
+            http_method,
+            headers,
+            params,
+            json,
+            json_codec,
+            compression,
         )
 
 
@@ -181,12 +890,22 @@ class SyncRPCFilterRequestBuilder(
         headers: Headers,
         params: QueryParams,
         json: dict,
+        json_codec: Optional[JSONCodec] = None,
+        compression: Optional[Compression] = None,
     ) -> None:
         get_origin_and_cast(BaseFilterRequestBuilder[_ReturnT]).__init__(
             self, session, headers, params
         )
         get_origin_and_cast(SyncSingleRequestBuilder[_ReturnT]).__init__(
-            self, session, path, http_method, headers, params, json
+            self,
+            session,
+            path,
+            http_method,
+            headers,
+            params,
+            json,
+            json_codec,
+            compression,
         )
 
 
@@ -202,13 +921,16 @@ class SyncSelectRequestBuilder(
         headers: Headers,
         params: QueryParams,
         json: dict,
+        json_codec: Optional[JSONCodec] = None,
+        count_cache: Optional[CountCache] = None,
     ) -> None:
         get_origin_and_cast(BaseSelectRequestBuilder[_ReturnT]).__init__(
             self, session, headers, params
         )
         get_origin_and_cast(SyncQueryRequestBuilder[_ReturnT]).__init__(
-            self, session, path, http_method, headers, params, json
+            self, session, path, http_method, headers, params, json, json_codec
         )
+        self.count_cache = count_cache
 
     def single(self) -> SyncSingleRequestBuilder[_ReturnT]:
         """Specify that the query will only return a single row in response.
@@ -217,26 +939,511 @@ class SyncSelectRequestBuilder(
             The API will raise an error if the query returned more than one row.
         """
         self.headers["Accept"] = "application/vnd.pgrst.object+json"
-        return SyncSingleRequestBuilder[_ReturnT](
+        builder = SyncSingleRequestBuilder[_ReturnT](
             headers=self.headers,
             http_method=self.http_method,
             json=self.json,
             params=self.params,
             path=self.path,
             session=self.session,  # type: ignore
+            json_codec=self.json_codec,
         )
+        return self._carry_options(builder, self.response_model)
 
     def maybe_single(self) -> SyncMaybeSingleRequestBuilder[_ReturnT]:
         """Retrieves at most one row from the result. Result must be at most one row (e.g. using `eq` on a UNIQUE column), otherwise this will result in an error."""
         self.headers["Accept"] = "application/vnd.pgrst.object+json"
-        return SyncMaybeSingleRequestBuilder[_ReturnT](
+        builder = SyncMaybeSingleRequestBuilder[_ReturnT](
             headers=self.headers,
             http_method=self.http_method,
             json=self.json,
             params=self.params,
             path=self.path,
             session=self.session,  # type: ignore
+            json_codec=self.json_codec,
+        )
+        return self._carry_options(builder, self.response_model)
+
+    def _carry_options(
+        self, builder: _SingleT, response_model: Optional[Type[Any]]
+    ) -> _SingleT:
+        """Give the builder returned by `single()`, `maybe_single()` or `csv()`
+        the options already set on this query."""
+        builder.response_model = response_model
+        builder.max_url_length = self.max_url_length
+        builder.count_cache = self.count_cache
+        return builder
+
+    def stream(self, chunk_size: Optional[int] = None) -> Iterator[_ReturnT]:
+        """Execute the query and yield the rows as they are received.
+
+        The response body is parsed incrementally instead of being buffered,
+        so only the rows that have not been consumed yet are kept in memory.
+        Exiting the loop early closes the underlying connection once the
+        iterator is closed.
+
+        Args:
+            chunk_size: The size of the chunks read from the network.
+        Yields:
+            The rows returned by the query.
+        Raises:
+            :class:`APIError` If the API raised an error.
+        Example:
+            .. code-block:: python
+
+                for row in client.from_("countries").select("*").stream():
+                    print(row)
+        """
+        with _stream_response(self) as r:
+            if self.http_method == "HEAD":
+                return
+            parser = JSONArrayParser()
+            for chunk in r.iter_text(chunk_size):
+                for row in parser.feed(chunk):
+                    yield row
+            for row in parser.close():
+                yield row
+
+    def stream_csv(
+        self,
+        converters: Optional[Mapping[str, Callable[[str], Any]]] = None,
+        chunk_size: Optional[int] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Execute the query as CSV and yield the rows as they are received.
+
+        The body is decoded and parsed incrementally instead of being buffered.
+
+        Args:
+            converters: Functions converting the values of some columns, by
+                column name. Empty values of these columns are converted to `None`,
+                the values of the other columns are left as strings.
+            chunk_size: The size of the chunks read from the network.
+        Yields:
+            The rows returned by the query, as dictionaries.
+        Raises:
+            :class:`APIError` If the API raised an error.
+        """
+        parser = CSVStreamParser(converters)
+        for row in self._stream_csv_rows(parser, chunk_size):
+            yield dict(zip(parser.columns, row))  # type: ignore[arg-type]
+
+    def stream_csv_chunks(self, chunk_size: Optional[int] = None) -> Iterator[str]:
+        """Execute the query as CSV and yield the body as it is received.
+
+        Each chunk holds complete records only, starting with the header,
+        so it can be handed to a CSV parser on its own.
+
+        Args:
+            chunk_size: The size of the chunks read from the network.
+        Raises:
+            :class:`APIError` If the API raised an error.
+        """
+        self.headers["Accept"] = "text/csv"
+        parser = CSVStreamParser()
+        with _stream_response(self) as r:
+            for chunk in r.iter_text(chunk_size):
+                records = parser.split(chunk)
+                if records:
+                    yield records
+            rest = parser.flush()
+            if rest:
+                yield rest
+
+    def write_csv(
+        self, sink: Union[BinaryIO, TextIO], chunk_size: Optional[int] = None
+    ) -> int:
+        """Execute the query as CSV and write the body to `sink` as it is received.
+
+        Args:
+            sink: A file-like object opened in binary or text mode.
+            chunk_size: The size of the chunks read from the network.
+        Returns:
+            The number of bytes (or characters for text sinks) written.
+        Raises:
+            :class:`APIError` If the API raised an error.
+        """
+        self.headers["Accept"] = "text/csv"
+        written = 0
+        with _stream_response(self) as r:
+            if isinstance(sink, TextIOBase):
+                for text in r.iter_text(chunk_size):
+                    written += sink.write(text)
+            else:
+                for chunk in r.iter_bytes(chunk_size):
+                    sink.write(chunk)  # type: ignore[arg-type]
+                    written += len(chunk)
+        return written
+
+    def _stream_csv_rows(
+        self, parser: CSVStreamParser, chunk_size: Optional[int]
+    ) -> Iterator[List[Any]]:
+        self.headers["Accept"] = "text/csv"
+        with _stream_response(self) as r:
+            for chunk in r.iter_text(chunk_size):
+                for row in parser.feed(chunk):
+                    yield row
+            for row in parser.close():
+                yield row
+
+    def execute_columnar(
+        self,
+        chunk_size: Optional[int] = None,
+        *,
+        csv: bool = False,
+        converters: Optional[Mapping[str, Callable[[str], Any]]] = None,
+    ) -> Dict[str, Column]:
+        """Execute the query and return the result as one sequence per column.
+
+        The rows are read with :meth:`stream` (or :meth:`stream_csv`) and
+        accumulated into a :class:`ColumnarBuilder`, so neither the body nor
+        a dictionary per row is kept in memory: numeric columns end up in
+        compact :class:`array.array` and the others in lists.
+
+        Args:
+            chunk_size: The size of the chunks read from the network.
+            csv: Fetch the rows as CSV instead of JSON.
+            converters: With `csv`, functions converting the values of some
+                columns, by column name. Columns without a converter are strings.
+        Returns:
+            A dictionary mapping each column name to its values.
+        Raises:
+            :class:`APIError` If the API raised an error.
+        """
+        if not csv:
+            builder = ColumnarBuilder()
+            for row in self.stream(chunk_size):
+                builder.append(row)  # type: ignore[arg-type]
+            return builder.build()
+        parser = CSVStreamParser(converters)
+        csv_builder: Optional[ColumnarBuilder] = None
+        for values in self._stream_csv_rows(parser, chunk_size):
+            if csv_builder is None:
+                csv_builder = ColumnarBuilder(parser.columns)
+            csv_builder.append_values(values)
+        if csv_builder is None:
+            csv_builder = ColumnarBuilder(parser.columns)
+        return csv_builder.build()
+
+    def paginate(
+        self,
+        key: Optional[Union[str, Sequence[str]]] = "id",
+        page_size: Union[int, AdaptivePageSize] = 1000,
+        *,
+        desc: bool = False,
+        prefetch: int = 0,
+    ) -> Iterator[List[_ReturnT]]:
+        """Execute the query page by page, using keyset pagination.
+
+        Each page is ordered by `key` and selects the rows coming after the
+        last row of the previous page with a `gt` (or `lt`) filter, instead
+        of an `OFFSET` the server has to scan past. Every page costs the
+        same, however deep into the table. The other filters of the query
+        are kept, and the rows are returned as-is, without validation.
+
+        .. note::
+            The key columns must be selected, not nullable, and unique
+            together, since rows sharing the key of the last row of a page
+            would be skipped.
+
+        Args:
+            key: The column, or the columns of a composite key, to page by.
+                With `None`, the pages are fetched with `offset` and `limit`
+                instead, in the order of the query.
+            page_size: The number of rows per page, or an
+                :class:`AdaptivePageSize` sizing every page from the latency
+                and the size of the previous ones.
+            desc: Page in descending order of the key.
+            prefetch: The number of pages fetched ahead, in the background,
+                while the consumer processes the current one. Fetching pauses
+                once `prefetch` pages are waiting, and the page being fetched
+                is abandoned when the iteration stops early.
+        Yields:
+            The pages of rows, none of them empty.
+        Raises:
+            :class:`APIError` If the API raised an error.
+            :class:`ValueError` If the query has a limit or an offset.
+        Example:
+            .. code-block:: python
+
+                query = client.from_("events").select("*").eq("kind", "click")
+                for page in query.paginate(key=("day", "id"), page_size=500):
+                    ...
+        """
+        pages = self._keyset_pages(key, page_size, desc)
+        with SyncReadAhead(pages, prefetch) as pages:
+            for page in pages:  # noqa: UP028
+                yield page
+
+    def _keyset_pages(
+        self,
+        key: Optional[Union[str, Sequence[str]]],
+        page_size: Union[int, AdaptivePageSize],
+        desc: bool,
+    ) -> Iterator[List[_ReturnT]]:
+        keys = [key] if isinstance(key, str) else list(key or ())
+        if key is not None and not keys:
+            raise ValueError("paginate() needs at least one key column")
+        if isinstance(page_size, int) and page_size < 1:
+            raise ValueError("page_size must be positive")
+        if "limit" in self.params or "offset" in self.params:
+            raise ValueError(
+                "paginate() cannot be combined with limit(), offset() or range()"
+            )
+        # counting the rows on every page would bring back the cost of a scan
+        headers = with_count(self.headers)
+        last: Optional[List[Any]] = None
+        start = 0
+        while True:
+            size = page_size if isinstance(page_size, int) else page_size.size
+            if keys:
+                params = pre_paginate(self.params, keys, size, desc, last)
+            else:
+                params = self._range_params(start, size)
+            started = perf_counter()
+            response = self._fetch_page(headers, params)
+            # the latency of the request alone, the rows being decoded lazily
+            elapsed = perf_counter() - started
+            if not isinstance(page_size, int):
+                page_size.record(len(response.data), len(response.content), elapsed)
+            rows = response.data
+            if rows:
+                yield rows
+            if len(rows) < size:
+                return
+            if keys:
+                last = row_key_values(rows[-1], keys)
+            start += len(rows)
+
+    def fetch_parallel(
+        self,
+        page_size: int = 10_000,
+        concurrency: int = 4,
+        *,
+        ordered: bool = True,
+        count: Optional[CountMethod] = None,
+    ) -> Iterator[List[_ReturnT]]:
+        """Execute the query as concurrent `range()` slices.
+
+        The first slice is fetched along with the total number of rows,
+        which tells the slices left to fetch; these are then requested at
+        most `concurrency` at a time over the client's connection pool
+        (multiplexed over HTTP/2 when the server supports it). With a
+        `planned` or `estimated` count, slices keep being fetched one by one
+        after the estimated end for as long as they come back full. The
+        rows are returned as-is, without validation.
+
+        .. note::
+            The query should be ordered by a unique key, otherwise the rows
+            may be distributed differently between the slices.
+
+        Args:
+            page_size: The number of rows per slice.
+            concurrency: The maximum number of slices fetched at once.
+            ordered: Yield the slices in the order of the query, otherwise
+                as soon as they are received.
+            count: The count method used to size the fan-out, defaults to the
+                one of the query, or `exact`.
+        Yields:
+            The slices of rows, none of them empty.
+        Raises:
+            :class:`APIError` If the API raised an error.
+            :class:`ValueError` If the query has a limit or an offset.
+        Example:
+            .. code-block:: python
+
+                query = client.from_("events").select("*").order("id")
+                for rows in query.fetch_parallel(page_size=50_000):
+                    ...
+        """
+        if page_size < 1:
+            raise ValueError("page_size must be positive")
+        if "limit" in self.params or "offset" in self.params:
+            raise ValueError(
+                "fetch_parallel() cannot be combined with limit(), offset() or range()"
+            )
+        count = count or count_method(self.headers) or CountMethod.exact
+        response = self._fetch_page(
+            with_count(self.headers, count), self._range_params(0, page_size)
+        )
+        rows = response.data
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        total = response.count
+        exact = count == CountMethod.exact and total is not None
+        starts = range(page_size, total or 0, page_size)
+        headers = with_count(self.headers)
+
+        def fetch(start: int) -> Tuple[int, List[_ReturnT]]:
+            params = self._range_params(start, page_size)
+            return start, (self._fetch_page(headers, params)).data
+
+        full = not exact
+        for start, rows in SyncTaskPool(concurrency).map(
+            fetch, starts, ordered=ordered
+        ):
+            if rows:
+                yield rows
+            if not exact and start == starts[-1]:
+                full = len(rows) == page_size
+        # an estimated count may fall short of the actual number of rows
+        start = starts[-1] + page_size if starts else page_size
+        while full:
+            params = self._range_params(start, page_size)
+            rows = (self._fetch_page(headers, params)).data
+            if rows:
+                yield rows
+            full = len(rows) == page_size
+            start += page_size
+
+    def scan_partitioned(
+        self,
+        key: str = "id",
+        partitions: int = 4,
+        page_size: int = 1000,
+        *,
+        concurrency: Optional[int] = None,
+        ordered: bool = True,
+    ) -> Iterator[List[_ReturnT]]:
+        """Execute the query as concurrent scans of disjoint ranges of `key`.
+
+        The minimum and maximum of `key` are first read with two
+        ``order(key).limit(1)`` queries. The key space is then split into
+        `partitions` ranges, filtered with :meth:`gte` and :meth:`lt`, which
+        are read concurrently, each with its own keyset pagination: the next
+        page of a range is requested as soon as its previous one is
+        received, whatever the progress of the other ranges. Unlike
+        :meth:`fetch_parallel`, no request makes the server skip rows. The
+        other filters of the query are kept, and the rows are returned
+        as-is, without validation.
+
+        Since the ranges are disjoint, merging them in key order amounts to
+        yielding them one after the other: with `ordered`, the pages of a
+        range received ahead of their turn are held until the ranges before
+        it are done, so the memory used grows with the skew between ranges.
+        Full-table syncs that don't need the order should pass
+        ``ordered=False``.
+
+        Args:
+            key: A numeric column increasing with the rows, typically the
+                primary key. It must be selected, not nullable and unique.
+            partitions: The number of ranges the key space is split into.
+            page_size: The number of rows per page of every range.
+            concurrency: The maximum number of pages fetched at once,
+                defaults to `partitions`.
+            ordered: Yield the pages in key order, otherwise as soon as they
+                are received.
+        Yields:
+            The pages of rows, none of them empty.
+        Raises:
+            :class:`APIError` If the API raised an error.
+            :class:`ValueError` If the query has a limit or an offset, or if
+                `key` is not numeric.
+        """
+        if page_size < 1 or partitions < 1:
+            raise ValueError("partitions and page_size must be positive")
+        if "limit" in self.params or "offset" in self.params:
+            raise ValueError(
+                "scan_partitioned() cannot be combined with limit(), offset() or range()"
+            )
+        headers = with_count(self.headers)
+        bounds = self._key_bounds(key, headers)
+        if bounds is None:
+            return
+        scans: List[QueryParams] = []
+        for start, end, inclusive in partition_key_range(*bounds, partitions):
+            scan = copy(self).gte(key, start)
+            scans.append((scan.lte if inclusive else scan.lt)(key, end).params)
+        done = [False] * len(scans)
+        buffers: List[Deque[List[_ReturnT]]] = [deque() for _ in scans]
+        current = 0
+
+        def fetch(
+            page: Tuple[int, Optional[List[Any]]],
+        ) -> Tuple[Tuple[int, List[_ReturnT], bool], Optional[Tuple[int, List[Any]]]]:
+            i, last = page
+            params = pre_paginate(scans[i], [key], page_size, False, last)
+            rows = (self._fetch_page(headers, params)).data
+            if len(rows) < page_size:
+                return (i, rows, True), None
+            return (i, rows, False), (i, row_key_values(rows[-1], [key]))
+
+        pages = SyncTaskPool(concurrency or len(scans)).chain_map(
+            fetch, [(i, None) for i in range(len(scans))]
         )
+        for i, rows, finished in pages:
+            done[i] = finished
+            if not ordered:
+                if rows:
+                    yield rows
+                continue
+            if rows:
+                buffers[i].append(rows)
+            # a range can be flushed once the ranges before it are done
+            while current < len(scans):
+                while buffers[current]:
+                    yield buffers[current].popleft()
+                if not done[current]:
+                    break
+                current += 1
+
+    def _key_bounds(self, key: str, headers: Headers) -> Optional[Tuple[Any, Any]]:
+        bounds = []
+        for desc in (False, True):
+            query = copy(self)
+            query.params = self.params.set("select", key).remove("order")
+            query = query.order(key, desc=desc).limit(1)
+            rows = (query._fetch_page(headers, query.params)).data
+            if not rows:
+                return None
+            bounds.append(row_key_values(rows[0], [key])[0])
+        return bounds[0], bounds[1]
+
+    def _range_params(self, start: int, size: int) -> QueryParams:
+        return self.params.set("offset", start).set("limit", size)
+
+    def _fetch_page(
+        self, headers: Headers, params: QueryParams
+    ) -> LazyAPIResponse[List[_ReturnT]]:
+        page = copy(self)
+        page.headers = headers
+        page.params = params
+        # the counts used to plan the pages must come from the server
+        page.count_cache = None
+        return page.execute(lazy=True)
+
+    def split_in(
+        self,
+        max_url_length: int = DEFAULT_MAX_URL_LENGTH,
+        concurrency: int = 4,
+    ) -> SyncSelectRequestBuilder[_ReturnT]:
+        """Split the query on its largest `in` filter when its URL would be
+        longer than `max_url_length`, running the pieces concurrently.
+
+        The rows of the pieces are merged, following the order given to
+        :meth:`order` if any, and the `limit` and `offset` of the query are
+        applied to the merged rows; the counts of the pieces are summed.
+        The call to :meth:`execute` stays the same. The rows must include
+        the ordered columns, and strings are merged by code point order,
+        which may differ from the collation of the database.
+
+        A query split into pieces cannot be executed with ``lazy=True`` or
+        ``spool``, nor through :meth:`paginate`, :meth:`fetch_parallel`,
+        :meth:`scan_partitioned`, :meth:`stream`, :meth:`single`,
+        :meth:`maybe_single` or the CSV and columnar helpers: these raise a :class:`ValueError` rather than sending a URL
+        above the limit, as :meth:`execute` does when the URL has no `in`
+        filter to split.
+
+        Args:
+            max_url_length: The length of the longest URL sent, in bytes.
+            concurrency: The maximum number of pieces run at once.
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency must be positive")
+        self.max_url_length = max_url_length
+        self.split_concurrency = concurrency
+        return self
 
     def text_search(
         self, column: str, query: str, options: dict[str, Any] = {}
@@ -259,25 +1466,38 @@ class SyncSelectRequestBuilder(
             params=self.params,
             path=self.path,
             session=self.session,  # type: ignore
+            json_codec=self.json_codec,
         )
 
     def csv(self) -> SyncSingleRequestBuilder[str]:
         """Specify that the query must retrieve data as a single CSV string."""
         self.headers["Accept"] = "text/csv"
-        return SyncSingleRequestBuilder[str](
+        builder = SyncSingleRequestBuilder[str](
             session=self.session,  # type: ignore
             path=self.path,
             http_method=self.http_method,
             headers=self.headers,
             params=self.params,
             json=self.json,
+            json_codec=self.json_codec,
         )
+        return self._carry_options(builder, None)
 
 
 class SyncRequestBuilder(Generic[_ReturnT]):
-    def __init__(self, session: Client, path: str) -> None:
+    def __init__(
+        self,
+        session: Client,
+        path: str,
+        json_codec: Optional[JSONCodec] = None,
+        count_cache: Optional[CountCache] = None,
+        compression: Optional[Compression] = None,
+    ) -> None:
         self.session = session
         self.path = path
+        self.json_codec = json_codec or get_default_json_codec()
+        self.count_cache = count_cache
+        self.compression = compression
 
     def select(
         self,
@@ -295,30 +1515,47 @@ class SyncRequestBuilder(Generic[_ReturnT]):
         """
         method, params, headers, json = pre_select(*columns, count=count, head=head)
         return SyncSelectRequestBuilder[_ReturnT](
-            self.session, self.path, method, headers, params, json
+            self.session,
+            self.path,
+            method,
+            headers,
+            params,
+            json,
+            self.json_codec,
+            self.count_cache,
         )
 
     def insert(
         self,
-        json: Union[dict, list],
+        json: Union[dict, list, Iterable[dict], Iterable[dict]],
         *,
         count: Optional[CountMethod] = None,
         returning: ReturnMethod = ReturnMethod.representation,
         upsert: bool = False,
         default_to_null: bool = True,
+        columns: Optional[Sequence[str]] = None,
     ) -> SyncQueryRequestBuilder[_ReturnT]:
         """Run an INSERT query.
 
         Args:
-            json: The row to be inserted.
+            json: The row to be inserted, a list of rows, or an iterator of
+                rows (a generator) to be streamed.
             count: The method to use to get the count of rows returned.
             returning: Either 'minimal' or 'representation'
             upsert: Whether the query should be an upsert.
             default_to_null: Make missing fields default to `null`.
                 Otherwise, use the default value for the column.
                 Only applies for bulk inserts.
+            columns: The columns to insert. They are found by scanning the
+                rows of a list otherwise; the rows of an iterator cannot be
+                scanned, so PostgREST takes the keys of the first one.
         Returns:
             :class:`SyncQueryRequestBuilder`
+
+        .. note::
+            The rows of an iterator are encoded as they are produced and
+            streamed with a chunked transfer encoding, so they don't need to
+            fit in memory. The query can only be executed once.
         """
         method, params, headers, json = pre_insert(
             json,
@@ -326,25 +1563,36 @@ class SyncRequestBuilder(Generic[_ReturnT]):
             returning=returning,
             upsert=upsert,
             default_to_null=default_to_null,
+            columns=columns,
         )
         return SyncQueryRequestBuilder[_ReturnT](
-            self.session, self.path, method, headers, params, json
+            self.session,
+            self.path,
+            method,
+            headers,
+            params,
+            json,
+            self.json_codec,
+            self.compression,
         )
 
     def upsert(
         self,
-        json: Union[dict, list],
+        json: Union[dict, list, Iterable[dict], Iterable[dict]],
         *,
         count: Optional[CountMethod] = None,
         returning: ReturnMethod = ReturnMethod.representation,
         ignore_duplicates: bool = False,
         on_conflict: str = "",
         default_to_null: bool = True,
+        columns: Optional[Sequence[str]] = None,
+        dedupe: Union[bool, Callable[[dict, dict], dict]] = False,
     ) -> SyncQueryRequestBuilder[_ReturnT]:
         """Run an upsert (INSERT ... ON CONFLICT DO UPDATE) query.
 
         Args:
-            json: The row to be inserted.
+            json: The row to be inserted, a list of rows, or an iterator of
+                rows to be streamed, see :meth:`insert`.
             count: The method to use to get the count of rows returned.
             returning: Either 'minimal' or 'representation'
             ignore_duplicates: Whether duplicate rows should be ignored.
@@ -353,19 +1601,263 @@ class SyncRequestBuilder(Generic[_ReturnT]):
                 default value for the column. This only applies when inserting new rows,
                 not when merging with existing rows under `ignoreDuplicates: false`.
                 This also only applies when doing bulk upserts.
+            columns: The columns to insert, see :meth:`insert`.
+            dedupe: Collapse the rows sharing the same `on_conflict` values
+                before sending them, as PostgreSQL cannot affect a row twice
+                in an upsert. The last row wins, unless a function merging
+                the previous row with the next one is given. With
+                `ignore_duplicates`, the first row wins instead, as it would
+                in the table, and no merging function can be given. The
+                number of rows dropped is exposed by the `collapsed_rows`
+                attribute of the returned builder. Rows given as an iterator
+                are read at once, keeping one row per key.
+        Returns:
+            :class:`SyncQueryRequestBuilder`
+        Raises:
+            :class:`ValueError` If `dedupe` is set without `on_conflict`, or
+                is a merging function with `ignore_duplicates`.
+        """
+        collapsed = 0
+        if dedupe and (isinstance(json, list) or is_row_stream(json)):
+            if not on_conflict:
+                raise ValueError("Deduplicating rows requires on_conflict")
+            if ignore_duplicates and dedupe is not True:
+                raise ValueError(
+                    "Rows cannot be merged when duplicates are ignored:"
+                    " the first row of each key is kept"
+                )
+            json, collapsed = dedupe_rows(
+                json,  # type: ignore[arg-type]
+                conflict_columns(on_conflict),
+                None if dedupe is True else dedupe,
+                keep_first=ignore_duplicates,
+            )
+        method, params, headers, json = pre_upsert(
+            json,
+            count=count,
+            returning=returning,
+            ignore_duplicates=ignore_duplicates,
+            on_conflict=on_conflict,
+            default_to_null=default_to_null,
+            columns=columns,
+        )
+        query = SyncQueryRequestBuilder[_ReturnT](
+            self.session,
+            self.path,
+            method,
+            headers,
+            params,
+            json,
+            self.json_codec,
+            self.compression,
+        )
+        query.collapsed_rows = collapsed
+        return query
+
+    def insert_columns(
+        self,
+        data: Union[Mapping[str, Sequence[Any]], Iterable[Sequence[Any]]],
+        columns: Optional[Sequence[str]] = None,
+        *,
+        count: Optional[CountMethod] = None,
+        returning: ReturnMethod = ReturnMethod.representation,
+        upsert: bool = False,
+        default_to_null: bool = True,
+    ) -> SyncQueryRequestBuilder[_ReturnT]:
+        """Run an INSERT query of rows given as sequences of values, or as
+        sequences of values per column.
+
+        The rows are serialized straight into the body, without building a
+        dictionary per row, and the `columns` query parameter is set from
+        the declared columns, see :class:`ColumnarRows`.
+
+        Args:
+            data: The rows, as tuples of values in the order of `columns`,
+                or a mapping of column names to their values.
+            columns: The names of the columns, required when `data` holds
+                rows. It defaults to the keys of a mapping.
+            count: The method to use to get the count of rows returned.
+            returning: Either 'minimal' or 'representation'
+            upsert: Whether the query should be an upsert.
+            default_to_null: Make missing fields default to `null`.
+                Otherwise, use the default value for the column.
+        Returns:
+            :class:`SyncQueryRequestBuilder`
+
+        Example:
+            .. code-block:: python
+
+                client.from_("points").insert_columns(
+                    [(1, 0.5, 2.0), (2, 1.5, 3.0)], columns=["id", "x", "y"]
+                ).execute()
+        """
+        rows = ColumnarRows(data, columns)
+        method, params, headers, json = pre_insert(
+            rows,
+            count=count,
+            returning=returning,
+            upsert=upsert,
+            default_to_null=default_to_null,
+            columns=rows.columns,
+        )
+        return SyncQueryRequestBuilder[_ReturnT](
+            self.session,
+            self.path,
+            method,
+            headers,
+            params,
+            json,
+            self.json_codec,
+            self.compression,
+        )
+
+    def upsert_columns(
+        self,
+        data: Union[Mapping[str, Sequence[Any]], Iterable[Sequence[Any]]],
+        columns: Optional[Sequence[str]] = None,
+        *,
+        count: Optional[CountMethod] = None,
+        returning: ReturnMethod = ReturnMethod.representation,
+        ignore_duplicates: bool = False,
+        on_conflict: str = "",
+        default_to_null: bool = True,
+    ) -> SyncQueryRequestBuilder[_ReturnT]:
+        """Run an upsert query of rows given as sequences of values, or as
+        sequences of values per column, see :meth:`insert_columns`.
+
+        Args:
+            data: The rows, as tuples of values in the order of `columns`,
+                or a mapping of column names to their values.
+            columns: The names of the columns, required when `data` holds
+                rows. It defaults to the keys of a mapping.
+            count: The method to use to get the count of rows returned.
+            returning: Either 'minimal' or 'representation'
+            ignore_duplicates: Whether duplicate rows should be ignored.
+            on_conflict: Specified columns to be made to work with UNIQUE constraint.
+            default_to_null: Make missing fields default to `null`. Otherwise, use the
+                default value for the column.
         Returns:
             :class:`SyncQueryRequestBuilder`
         """
+        rows = ColumnarRows(data, columns)
         method, params, headers, json = pre_upsert(
+            rows,
+            count=count,
+            returning=returning,
+            ignore_duplicates=ignore_duplicates,
+            on_conflict=on_conflict,
+            default_to_null=default_to_null,
+            columns=rows.columns,
+        )
+        return SyncQueryRequestBuilder[_ReturnT](
+            self.session,
+            self.path,
+            method,
+            headers,
+            params,
+            json,
+            self.json_codec,
+            self.compression,
+        )
+
+    def insert_csv(
+        self,
+        source: Union[str, PathLike, BinaryIO, Iterable[bytes], Iterable[bytes]],
+        *,
+        count: Optional[CountMethod] = None,
+        returning: ReturnMethod = ReturnMethod.representation,
+        upsert: bool = False,
+        default_to_null: bool = True,
+    ) -> SyncQueryRequestBuilder[_ReturnT]:
+        """Run an INSERT query of the rows of a CSV document.
+
+        The document is streamed as it is read, with the `text/csv` content
+        type; its first line names the columns. Use
+        :meth:`SyncQueryRequestBuilder.execute_bulk` to split it into
+        chunks of whole records, uploaded concurrently.
+
+        Args:
+            source: The path of the document, a file object opened in binary
+                mode, or an iterator of bytes.
+            count: The method to use to get the count of rows returned.
+            returning: Either 'minimal' or 'representation'
+            upsert: Whether the query should be an upsert.
+            default_to_null: Make missing fields default to `null`.
+                Otherwise, use the default value for the column.
+        Returns:
+            :class:`SyncQueryRequestBuilder`
+
+        Example:
+            .. code-block:: python
+
+                result = (
+                    client.from_("events")
+                    .insert_csv("events.csv", returning=ReturnMethod.minimal)
+                    .execute_bulk(chunk_rows=None, chunk_bytes=8 * 1024 * 1024)
+                )
+        """
+        method, params, headers, json = pre_insert(
+            CSVSource(source),
+            count=count,
+            returning=returning,
+            upsert=upsert,
+            default_to_null=default_to_null,
+        )
+        headers["Content-Type"] = "text/csv"
+        return SyncQueryRequestBuilder[_ReturnT](
+            self.session,
+            self.path,
+            method,
+            headers,
+            params,
             json,
+            self.json_codec,
+            self.compression,
+        )
+
+    def upsert_csv(
+        self,
+        source: Union[str, PathLike, BinaryIO, Iterable[bytes], Iterable[bytes]],
+        *,
+        count: Optional[CountMethod] = None,
+        returning: ReturnMethod = ReturnMethod.representation,
+        ignore_duplicates: bool = False,
+        on_conflict: str = "",
+        default_to_null: bool = True,
+    ) -> SyncQueryRequestBuilder[_ReturnT]:
+        """Run an upsert query of the rows of a CSV document, see
+        :meth:`insert_csv`.
+
+        Args:
+            source: The path of the document, a file object opened in binary
+                mode, or an iterator of bytes.
+            count: The method to use to get the count of rows returned.
+            returning: Either 'minimal' or 'representation'
+            ignore_duplicates: Whether duplicate rows should be ignored.
+            on_conflict: Specified columns to be made to work with UNIQUE constraint.
+            default_to_null: Make missing fields default to `null`. Otherwise, use the
+                default value for the column.
+        Returns:
+            :class:`SyncQueryRequestBuilder`
+        """
+        method, params, headers, json = pre_upsert(
+            CSVSource(source),
             count=count,
             returning=returning,
             ignore_duplicates=ignore_duplicates,
             on_conflict=on_conflict,
             default_to_null=default_to_null,
         )
+        headers["Content-Type"] = "text/csv"
         return SyncQueryRequestBuilder[_ReturnT](
-            self.session, self.path, method, headers, params, json
+            self.session,
+            self.path,
+            method,
+            headers,
+            params,
+            json,
+            self.json_codec,
+            self.compression,
         )
 
     def update(
@@ -390,7 +1882,180 @@ class SyncRequestBuilder(Generic[_ReturnT]):
             returning=returning,
         )
         return SyncFilterRequestBuilder[_ReturnT](
-            self.session, self.path, method, headers, params, json
+            self.session,
+            self.path,
+            method,
+            headers,
+            params,
+            json,
+            self.json_codec,
+            self.compression,
+        )
+
+    def update_many(
+        self,
+        updates: Iterable[Tuple[Any, dict]],
+        key: str = "id",
+        *,
+        count: Optional[CountMethod] = None,
+        returning: ReturnMethod = ReturnMethod.representation,
+        concurrency: int = 4,
+        retries: int = 2,
+        backoff: float = 0.5,
+        max_url_length: int = DEFAULT_MAX_URL_LENGTH,
+    ) -> BulkResult:
+        """Run UPDATE queries of many rows, each given by its `key` value
+        and the patch to apply to it.
+
+        The rows getting the same patch are updated together, with an `in`
+        filter on `key`: one request is sent per distinct patch, split so
+        that no URL is longer than `max_url_length`, and the requests are
+        sent concurrently, see :meth:`SyncQueryRequestBuilder.execute_bulk`.
+        The patches of a key given several times are merged in order, as if
+        they were applied one after the other.
+
+        Args:
+            updates: The `(key value, patch)` pairs.
+            key: The column identifying the rows.
+            count: The method to use to get the count of rows returned.
+            returning: Either 'minimal' or 'representation'
+            concurrency: The maximum number of requests sent at once.
+            retries: The number of times a failed request is sent again.
+            backoff: The time waited before the first retry, in seconds.
+            max_url_length: The length of the longest URL sent, in bytes.
+        Returns:
+            :class:`BulkResult`, with a chunk per request. The `start` of
+            a chunk is the position of its first update in `updates`.
+
+        Example:
+            .. code-block:: python
+
+                result = client.from_("tasks").update_many(
+                    [(1, {"status": "done"}), (2, {"status": "done"})]
+                )
+        """
+        query = self.update({}, count=count, returning=returning)
+        budget = self._in_filter_budget(query, key, max_url_length)
+        latest: Dict[Any, Tuple[int, dict]] = {}
+        for position, (value, patch) in enumerate(updates):
+            _, previous = latest.pop(value, (position, {}))
+            latest[value] = (position, {**previous, **patch})
+        groups: Dict[bytes, List[Tuple[int, Any]]] = {}
+        for value, (position, patch) in latest.items():
+            body = self.json_codec.dumps(dict(sorted(patch.items())))
+            groups.setdefault(body, []).append((position, value))
+
+        def chunks() -> Iterator[BulkChunk]:
+            index = 0
+            for body, group in groups.items():
+                positions = {value: position for position, value in group}
+                for values, criteria in in_filter_chunks(positions, budget):
+                    params = QueryParams({sanitize_param(key): criteria})
+                    start = positions[values[0]]
+                    yield BulkChunk(index, start, len(values), body, params)
+                    index += 1
+
+        headers = json_content_headers(query.headers, self.session)
+        return _execute_chunks(query, chunks(), headers, concurrency, retries, backoff)
+
+    def delete_many(
+        self,
+        keys: Iterable[Any],
+        key: str = "id",
+        *,
+        count: Optional[CountMethod] = None,
+        returning: ReturnMethod = ReturnMethod.representation,
+        concurrency: int = 4,
+        retries: int = 2,
+        backoff: float = 0.5,
+        max_url_length: int = DEFAULT_MAX_URL_LENGTH,
+    ) -> BulkResult:
+        """Run DELETE queries of the rows whose `key` is in `keys`.
+
+        The keys are split into `in` filters so that no URL is longer than
+        `max_url_length`, and the requests are sent concurrently, see
+        :meth:`SyncQueryRequestBuilder.execute_bulk`. The count of the
+        result sums the counts of every request.
+
+        Args:
+            keys: The values of `key` of the rows to delete.
+            key: The column identifying the rows.
+            count: The method to use to get the count of rows returned.
+            returning: Either 'minimal' or 'representation'
+            concurrency: The maximum number of requests sent at once.
+            retries: The number of times a failed request is sent again.
+            backoff: The time waited before the first retry, in seconds.
+            max_url_length: The length of the longest URL sent, in bytes.
+        Returns:
+            :class:`BulkResult`
+        """
+        query = self.delete(count=count, returning=returning)
+        chunks = self._key_chunks(query, keys, key, max_url_length)
+        return _execute_chunks(
+            query, chunks, query.headers, concurrency, retries, backoff
+        )
+
+    def stream_delete_many(
+        self,
+        keys: Iterable[Any],
+        key: str = "id",
+        *,
+        concurrency: int = 4,
+        retries: int = 2,
+        backoff: float = 0.5,
+        max_url_length: int = DEFAULT_MAX_URL_LENGTH,
+    ) -> Iterator[_ReturnT]:
+        """Run DELETE queries of the rows whose `key` is in `keys`, like
+        :meth:`delete_many`, and yield the deleted rows as every request
+        completes.
+
+        Yields:
+            The deleted rows, in the order the requests complete.
+        Raises:
+            :class:`APIError` If a request failed, after its retries. The
+                requests still running are cancelled.
+        """
+        query = self.delete(returning=ReturnMethod.representation)
+        chunks = self._key_chunks(query, keys, key, max_url_length)
+        results = _send_chunks(
+            query, chunks, query.headers, concurrency, retries, backoff, ordered=False
+        )
+        try:
+            for result in results:
+                if result.error is not None:
+                    raise result.error
+                for row in result.data:  # noqa: UP028
+                    yield row
+        finally:
+            # cancel the requests still running on an error or an early exit
+            results.close()  # type: ignore[attr-defined]
+
+    def _key_chunks(
+        self,
+        query: SyncFilterRequestBuilder[Any],
+        keys: Iterable[Any],
+        key: str,
+        max_url_length: int,
+    ) -> Iterator[BulkChunk]:
+        budget = self._in_filter_budget(query, key, max_url_length)
+        start = 0
+        for index, (values, criteria) in enumerate(in_filter_chunks(keys, budget)):
+            params = query.params.add(sanitize_param(key), criteria)
+            yield BulkChunk(index, start, len(values), None, params)
+            start += len(values)
+
+    def _in_filter_budget(
+        self, query: SyncFilterRequestBuilder[Any], key: str, max_url_length: int
+    ) -> int:
+        """Tell how many bytes of the URL of `query` are left for an `in`
+        filter on `key`."""
+        return in_filter_budget(
+            self.session,
+            query.http_method,
+            query.path,
+            query.params,
+            sanitize_param(key),
+            max_url_length,
         )
 
     def delete(
@@ -412,5 +2077,12 @@ class SyncRequestBuilder(Generic[_ReturnT]):
             returning=returning,
         )
         return SyncFilterRequestBuilder[_ReturnT](
-            self.session, self.path, method, headers, params, json
+            self.session,
+            self.path,
+            method,
+            headers,
+            params,
+            json,
+            self.json_codec,
+            self.compression,
         )
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import re
 from abc import ABC, abstractmethod
 from typing import Dict, Optional, Union
 
@@ -7,6 +8,13 @@ from httpx import AsyncClient, BasicAuth, Client, Timeout
 
 from .utils import is_http_url
 
+# a type name, possibly with a modifier, as in `varchar(64)` or `numeric(10, 2)`
+_SQL_TYPE = re.compile(r"[A-Za-z_][A-Za-z0-9_. ]*(\([0-9, ]+\))?")
+
+
+def _quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
 
 class BasePostgrestClient(ABC):
     """Base PostgREST client."""
@@ -79,3 +87,45 @@ class BasePostgrestClient(ABC):
                 "Neither bearer token or basic authentication scheme is provided"
             )
         return self
+
+    @staticmethod
+    def rpc_in_sql(
+        func: str,
+        table: str,
+        key: str = "id",
+        key_type: str = "bigint",
+        *,
+        param: str = "keys",
+        schema: str = "public",
+    ) -> str:
+        """Generate the SQL of a function returning the rows of `table` whose
+        `key` is in an array, to be called with :meth:`rpc_in`.
+
+        The function returns ``setof`` the table, so that PostgREST can
+        apply filters, order, limit and embedding to its result set. It is
+        `stable`, which allows it to be called with `GET` and to be inlined
+        by the planner.
+
+        Args:
+            func: The name of the function.
+            table: The name of the table to read.
+            key: The column looked up.
+            key_type: The type of `key`.
+            param: The name of the array argument.
+            schema: The schema of the table and of the function.
+        """
+        if not _SQL_TYPE.fullmatch(key_type):
+            raise ValueError(f"Invalid key type: {key_type!r}")
+        function = f"{_quote_identifier(schema)}.{_quote_identifier(func)}"
+        relation = f"{_quote_identifier(schema)}.{_quote_identifier(table)}"
+        argument = _quote_identifier(param)
+        return (
+            f"create or replace function {function}({argument} {key_type}[])\n"
+            f"returns setof {relation}\n"
+            "language sql\n"
+            "stable\n"
+            "as $$\n"
+            f"  select * from {relation}\n"
+            f"  where {_quote_identifier(key)} = any({_quote_identifier(func)}.{argument})\n"
+            "$$;\n"
+        )
@@ -1,22 +1,29 @@
 from __future__ import annotations
 
 import json
+from functools import cmp_to_key
 from json import JSONDecodeError
 from re import search
 from typing import (
     Any,
+    AsyncIterable,
+    Callable,
     Dict,
     Generic,
     Iterable,
+    Iterator,
     List,
     Literal,
+    Mapping,
     NamedTuple,
     Optional,
+    Sequence,
     Tuple,
     Type,
     TypeVar,
     Union,
 )
+from urllib.parse import quote_plus
 
 from httpx import AsyncClient, Client, Headers, QueryParams
 from httpx import Response as RequestResponse
@@ -34,6 +41,9 @@ except ImportError:
     # < 2.0.0
     from pydantic import validator as field_validator
 
+from .bulk import CSVSource
+from .codec import JSONCodec, get_default_json_codec
+from .columnar import ColumnarRows
 from .types import CountMethod, Filters, RequestMethod, ReturnMethod
 from .utils import get_origin_and_cast, sanitize_param
 
@@ -46,6 +56,38 @@ class QueryArgs(NamedTuple):
     json: Dict[Any, Any]
 
 
+def encode_json_body(
+    json: Any,
+    headers: Headers,
+    session: Union[AsyncClient, Client],
+    json_codec: JSONCodec,
+) -> Tuple[Optional[bytes], Headers]:
+    """Serialize the body of a request with the client's JSON codec.
+
+    Returns the encoded body and the headers to send it with; a JSON
+    Content-Type is added unless one is already set on the request or
+    on the session.
+    """
+    if json is None:
+        return None, headers
+    if isinstance(json, ColumnarRows):
+        content = json_codec.dumps_rows(json.columns, json)
+    else:
+        content = json_codec.dumps(json)
+    return content, json_content_headers(headers, session)
+
+
+def json_content_headers(
+    headers: Headers, session: Union[AsyncClient, Client]
+) -> Headers:
+    """Add a JSON Content-Type to `headers`, unless one is already set on
+    the request or on the session."""
+    if "content-type" not in headers and "content-type" not in session.headers:
+        headers = headers.copy()
+        headers["Content-Type"] = "application/json"
+    return headers
+
+
 def _unique_columns(json: List[Dict]):
     unique_keys = {key for row in json for key in row.keys()}
     columns = ",".join([f'"{k}"' for k in unique_keys])
@@ -82,14 +124,48 @@ def pre_select(
     return QueryArgs(method, params, headers, {})
 
 
+def is_row_stream(json: Any) -> bool:
+    """Tell whether the body of a request is an iterable of rows to be
+    streamed, rather than a JSON document encoded at once.
+
+    Raises:
+        :class:`TypeError` If the body is neither a JSON document nor an
+            iterable of rows, as strings, bytes, pydantic models and mappings
+            other than dictionaries are not.
+    """
+    if json is None or isinstance(json, (dict, list, ColumnarRows, CSVSource)):
+        return False
+    if isinstance(json, (str, bytes, Mapping, BaseModel)) or not isinstance(
+        json, (Iterable, AsyncIterable)
+    ):
+        raise TypeError(
+            "The rows must be given as a dict, a list or an iterable of dicts,"
+            f" not {type(json).__name__}"
+        )
+    return True
+
+
+def _columns_param(
+    json: Union[dict, list, Iterable[dict], AsyncIterable[dict]],
+    columns: Optional[Sequence[str]],
+) -> Optional[str]:
+    if columns is not None:
+        return ",".join(f'"{column}"' for column in columns)
+    if isinstance(json, list):
+        return _unique_columns(json)
+    return None
+
+
 def pre_insert(
-    json: Union[dict, list],
+    json: Union[dict, list, Iterable[dict], AsyncIterable[dict]],
     *,
     count: Optional[CountMethod],
     returning: ReturnMethod,
     upsert: bool,
     default_to_null: bool = True,
+    columns: Optional[Sequence[str]] = None,
 ) -> QueryArgs:
+    is_row_stream(json)  # refuse the bodies that cannot be sent before execute()
     prefer_headers = [f"return={returning}"]
     if count:
         prefer_headers.append(f"count={count}")
@@ -100,20 +176,23 @@ def pre_insert(
     headers = Headers({"Prefer": ",".join(prefer_headers)})
     # Adding 'columns' query parameters
     query_params = {}
-    if isinstance(json, list):
-        query_params = {"columns": _unique_columns(json)}
+    columns_param = _columns_param(json, columns)
+    if columns_param is not None:
+        query_params = {"columns": columns_param}
     return QueryArgs(RequestMethod.POST, QueryParams(query_params), headers, json)
 
 
 def pre_upsert(
-    json: Union[dict, list],
+    json: Union[dict, list, Iterable[dict], AsyncIterable[dict]],
     *,
     count: Optional[CountMethod],
     returning: ReturnMethod,
     ignore_duplicates: bool,
     on_conflict: str = "",
     default_to_null: bool = True,
+    columns: Optional[Sequence[str]] = None,
 ) -> QueryArgs:
+    is_row_stream(json)  # refuse the bodies that cannot be sent before execute()
     query_params = {}
     prefer_headers = [f"return={returning}"]
     if count:
@@ -126,11 +205,53 @@ def pre_upsert(
     if on_conflict:
         query_params["on_conflict"] = on_conflict
     # Adding 'columns' query parameters
-    if isinstance(json, list):
-        query_params["columns"] = _unique_columns(json)
+    columns_param = _columns_param(json, columns)
+    if columns_param is not None:
+        query_params["columns"] = columns_param
     return QueryArgs(RequestMethod.POST, QueryParams(query_params), headers, json)
 
 
+def conflict_columns(on_conflict: str) -> List[str]:
+    """Split the `on_conflict` parameter of an upsert into column names."""
+    return [column.strip().strip('"') for column in on_conflict.split(",")]
+
+
+def dedupe_rows(
+    rows: Iterable[Mapping[str, Any]],
+    keys: Sequence[str],
+    merge: Optional[Callable[[Any, Any], Any]] = None,
+    keep_first: bool = False,
+) -> Tuple[List[Any], int]:
+    """Collapse the rows sharing the same values for the `keys` columns.
+
+    PostgreSQL refuses an upsert affecting a row twice, so the rows of a
+    batch must be unique on the conflict columns. The rows are collapsed
+    in a single pass, keeping one row per key: the last one, the first one
+    with `keep_first` as `ON CONFLICT DO NOTHING` would, or the result of
+    `merge(previous, row)`. A collapsed row keeps the position of the
+    first row with its key. Rows with a `null` or missing key value never
+    conflict, and are kept as they are.
+
+    Returns:
+        The collapsed rows and the number of rows that were dropped.
+    """
+    unique: Dict[Any, Any] = {}
+    seen = 0
+    for row in rows:
+        seen += 1
+        values = tuple(row.get(key) for key in keys)
+        if None in values:
+            # a key of its own, as NULL is distinct from every value
+            unique[object()] = row
+        elif values in unique:
+            if keep_first:
+                continue
+            unique[values] = row if merge is None else merge(unique[values], row)
+        else:
+            unique[values] = row
+    return list(unique.values()), seen - len(unique)
+
+
 def pre_update(
     json: dict,
     *,
@@ -156,6 +277,290 @@ def pre_delete(
     return QueryArgs(RequestMethod.DELETE, QueryParams(), headers, {})
 
 
+def keyset_condition(
+    keys: Sequence[str], values: Sequence[Any], desc: bool = False
+) -> Tuple[str, str]:
+    """Build the filter selecting the rows that come after `values` when
+    ordering by `keys`.
+
+    A single key is a plain `gt`/`lt` filter, a composite key is expanded to
+    ``or=(a.gt.1,and(a.eq.1,b.gt.2))`` since PostgREST has no row comparison.
+
+    Returns:
+        The name and the value of the query parameter.
+    """
+    operator = Filters.LT if desc else Filters.GT
+    if len(keys) == 1:
+        return sanitize_param(keys[0]), f"{operator}.{values[0]}"
+    terms = []
+    for i, key in enumerate(keys):
+        conditions = [
+            f"{k}.{Filters.EQ}.{sanitize_param(v)}" for k, v in zip(keys[:i], values)
+        ]
+        conditions.append(f"{key}.{operator}.{sanitize_param(values[i])}")
+        terms.append(conditions[0] if i == 0 else f"and({','.join(conditions)})")
+    return "or", f"({','.join(terms)})"
+
+
+def pre_paginate(
+    params: QueryParams,
+    keys: Sequence[str],
+    page_size: int,
+    desc: bool,
+    last: Optional[Sequence[Any]],
+) -> QueryParams:
+    """Return the query parameters of the page following the row whose keys
+    are `last`, or of the first page, keeping the filters of `params`."""
+    params = params.set(
+        "order", ",".join(f"{key}.{'desc' if desc else 'asc'}" for key in keys)
+    ).set("limit", page_size)
+    if last is None:
+        return params
+    key, value = keyset_condition(keys, last, desc)
+    if key == "or" and "or" in params:
+        # the user's own `or` filter is kept as is, both are and-ed
+        if "and" in params:
+            raise ValueError(
+                "paginate() with a composite key cannot be combined with"
+                " both `or` and `and` filters"
+            )
+        key, value = "and", f"(or{value})"
+    return params.add(key, value)
+
+
+DEFAULT_MAX_URL_LENGTH = 8000
+"""The length in bytes of the longest URL sent by the bulk helpers, below the
+8 KiB limit of common proxies."""
+
+
+def in_filter_budget(
+    session: Union[AsyncClient, Client],
+    method: str,
+    path: str,
+    params: QueryParams,
+    key: str,
+    max_url_length: int,
+) -> int:
+    """Tell how many bytes of the URL of a request are left for an `in`
+    filter on the parameter `key`.
+
+    Raises:
+        :class:`ValueError` If fewer than 64 bytes are left.
+    """
+    url = session.build_request(method, path, params=params).url
+    # the separator before the filter, its encoded key and `=`
+    used = len(str(url).encode()) + len(quote_plus(key)) + 2
+    if max_url_length - used < 64:
+        raise ValueError(f"max_url_length must be above {used + 64}")
+    return max_url_length - used
+
+
+def in_filter_chunks(
+    values: Iterable[Any], budget: int, *, sanitized: bool = False
+) -> Iterator[Tuple[List[Any], str]]:
+    """Split values into `in.(...)` filters whose URL encoding takes at most
+    `budget` bytes.
+
+    A value too long to fit in the budget by itself gets a filter of its own.
+
+    Args:
+        values: The values of the filters.
+        budget: The number of bytes a filter can take in the URL.
+        sanitized: Whether the values were already sanitized, as the items
+            returned by :func:`split_in_list`.
+    Yields:
+        The values of every filter, and the filter.
+    """
+    # the encoded `in.(` and `)`, and the encoded `,` between values
+    overhead = len(quote_plus("in.()", safe=""))
+    separator = len(quote_plus(",", safe=""))
+    chunk: List[Any] = []
+    params: List[str] = []
+    size = overhead
+    for value in values:
+        param = value if sanitized else sanitize_param(value)
+        length = len(quote_plus(param, safe=""))
+        if chunk and size + separator + length > budget:
+            yield chunk, f"{Filters.IN}.({','.join(params)})"
+            chunk, params, size = [], [], overhead
+        size += (separator if chunk else 0) + length
+        chunk.append(value)
+        params.append(param)
+    if chunk:
+        yield chunk, f"{Filters.IN}.({','.join(params)})"
+
+
+def split_in_list(criteria: str) -> List[str]:
+    """Split the list of an `in.(...)` filter into its sanitized items."""
+    body = criteria[len("in.(") : -1]
+    items: List[str] = []
+    start = 0
+    quoted = False
+    for pos, char in enumerate(body):
+        if char == '"':
+            quoted = not quoted
+        elif char == "," and not quoted:
+            items.append(body[start:pos])
+            start = pos + 1
+    if body:
+        items.append(body[start:])
+    return items
+
+
+def largest_in_filter(params: QueryParams) -> Optional[Tuple[int, str, str]]:
+    """Find the longest `in` filter of a query.
+
+    Negated filters are left out, as they cannot be split into queries
+    whose results add up.
+
+    Returns:
+        The position of the filter among the items of `params`, its key and
+        its value, or `None` if the query has no `in` filter.
+    """
+    found: Optional[Tuple[int, str, str]] = None
+    for position, (key, value) in enumerate(params.multi_items()):
+        if value.startswith(f"{Filters.IN}.(") and value.endswith(")"):
+            if found is None or len(value) > len(found[2]):
+                found = (position, key, value)
+    return found
+
+
+def order_sort_key(order: str) -> Callable[[Any], Any]:
+    """Build a sort key ordering rows like the `order` parameter of a query.
+
+    Like PostgreSQL, nulls come last in ascending order and first in
+    descending order, unless specified otherwise. Strings are compared by
+    code point, which matches the `C` collation only.
+
+    Raises:
+        :class:`ValueError` If a row lacks one of the ordered columns.
+    """
+    terms: List[Tuple[str, bool, bool]] = []
+    for term in order.split(","):
+        column, *modifiers = term.split(".")
+        desc = "desc" in modifiers
+        if "nullsfirst" in modifiers:
+            nulls_first = True
+        elif "nullslast" in modifiers:
+            nulls_first = False
+        else:
+            nulls_first = desc
+        terms.append((column, desc, nulls_first))
+    columns = [column for column, _, _ in terms]
+
+    def compare(a: Any, b: Any) -> int:
+        for (_, desc, nulls_first), x, y in zip(
+            terms, row_key_values(a, columns), row_key_values(b, columns)
+        ):
+            if x == y:
+                continue
+            if x is None or y is None:
+                return (-1 if nulls_first else 1) * (1 if x is None else -1)
+            result = -1 if x < y else 1
+            return -result if desc else result
+        return 0
+
+    return cmp_to_key(compare)
+
+
+def partition_key_range(
+    lower: Any, upper: Any, partitions: int
+) -> List[Tuple[Any, Any, bool]]:
+    """Split the range of keys from `lower` to `upper`, both included, into
+    at most `partitions` disjoint ranges of about the same width.
+
+    Returns:
+        The ranges, as their start (included), their end, and whether the
+        end is included, which is only the case for the last range.
+    Raises:
+        :class:`ValueError` If the keys are not numbers.
+    """
+    if not all(
+        isinstance(bound, (int, float)) and not isinstance(bound, bool)
+        for bound in (lower, upper)
+    ):
+        raise ValueError(
+            f"Only numeric keys can be partitioned, got {lower!r} and {upper!r}"
+        )
+    width = upper - lower
+    if isinstance(width, int):
+        partitions = max(1, min(partitions, width + 1))
+        bounds = [lower + width * i // partitions for i in range(partitions)]
+    else:
+        bounds = [lower + width * i / partitions for i in range(partitions)]
+    bounds = sorted(set(bounds))
+    return [(start, end, False) for start, end in zip(bounds, bounds[1:])] + [
+        (bounds[-1], upper, True)
+    ]
+
+
+def row_key_values(row: Any, keys: Sequence[str]) -> List[Any]:
+    """Read the values of the `keys` columns of a row, given as a mapping
+    or as a model instance."""
+    try:
+        if isinstance(row, Mapping):
+            return [row[key] for key in keys]
+        return [getattr(row, key) for key in keys]
+    except (KeyError, AttributeError) as e:
+        raise ValueError(
+            f"The rows must include the key columns {list(keys)}, add them to select()"
+        ) from e
+
+
+def with_count(headers: Headers, count: Optional[CountMethod] = None) -> Headers:
+    """Return a copy of `headers` whose `Prefer` header asks for the `count`
+    method, or for no count."""
+    headers = Headers(headers)
+    prefer = headers.get("Prefer")
+    preferences = [
+        p for p in (prefer.split(",") if prefer else []) if not p.startswith("count=")
+    ]
+    if count:
+        preferences.append(f"count={count}")
+    if preferences:
+        headers["Prefer"] = ",".join(preferences)
+    elif prefer is not None:
+        del headers["Prefer"]
+    return headers
+
+
+def count_method(headers: Headers) -> Optional[CountMethod]:
+    """Return the count method the `Prefer` header of `headers` asks for."""
+    match = search(r"count=(\w+)", headers.get("Prefer", ""))
+    return CountMethod(match.group(1)) if match else None
+
+
+def response_body_format(accept: Optional[str]) -> Literal["csv", "text", "json"]:
+    """Tell the format of the body of a response given the `Accept` header
+    the request was sent with."""
+    if accept == "text/csv":
+        return "csv"
+    if accept and "application/vnd.pgrst.plan" in accept and "+json" not in accept:
+        return "text"
+    return "json"
+
+
+def decode_response_body(
+    request_response: RequestResponse, json_codec: Optional[JSONCodec] = None
+) -> Any:
+    """Decode the body of a successful response in a single pass over its bytes.
+
+    JSON bodies are handed to the codec as bytes, without being decoded to
+    text first; CSV and text plans, or bodies that turn out not to be JSON,
+    are decoded to text once.
+    """
+    content = request_response.content
+    if not content:
+        return []
+    accept = request_response.request.headers.get("accept")
+    if response_body_format(accept) == "json":
+        try:
+            return (json_codec or get_default_json_codec()).loads(content)
+        except JSONDecodeError:
+            pass
+    return request_response.text
+
+
 _ReturnT = TypeVar("_ReturnT")
 
 
@@ -208,13 +613,12 @@ class APIResponse(BaseModel, Generic[_ReturnT]):
 
     @classmethod
     def from_http_request_response(
-        cls: Type[Self], request_response: RequestResponse
+        cls: Type[Self],
+        request_response: RequestResponse,
+        json_codec: Optional[JSONCodec] = None,
     ) -> Self:
         count = cls._get_count_from_http_request_response(request_response)
-        try:
-            data = request_response.json()
-        except JSONDecodeError:
-            data = request_response.text if len(request_response.text) > 0 else []
+        data = decode_response_body(request_response, json_codec)
         # the type-ignore here is as pydantic needs us to pass the type parameter
         # here explicitly, but pylance already knows that cls is correctly parametrized
         return cls[_ReturnT](data=data, count=count)  # type: ignore
@@ -234,13 +638,12 @@ class SingleAPIResponse(APIResponse[_ReturnT], Generic[_ReturnT]):
 
     @classmethod
     def from_http_request_response(
-        cls: Type[Self], request_response: RequestResponse
+        cls: Type[Self],
+        request_response: RequestResponse,
+        json_codec: Optional[JSONCodec] = None,
     ) -> Self:
         count = cls._get_count_from_http_request_response(request_response)
-        try:
-            data = request_response.json()
-        except JSONDecodeError:
-            data = request_response.text if len(request_response.text) > 0 else []
+        data = decode_response_body(request_response, json_codec)
         return cls[_ReturnT](data=data, count=count)  # type: ignore
 
     @classmethod
@@ -252,6 +655,115 @@ class SingleAPIResponse(APIResponse[_ReturnT], Generic[_ReturnT]):
         )
 
 
+_DataT = TypeVar("_DataT")
+
+
+class RawAPIResponse(Generic[_DataT]):
+    """A lightweight alternative to :class:`APIResponse`, returned by
+    ``execute(raw=True)``.
+
+    The body is decoded with the client's JSON codec and exposed as-is:
+    pydantic is not involved at all, so the rows are not validated.
+    """
+
+    __slots__ = ("data", "count", "headers")
+
+    data: _DataT
+    """The data returned by the query."""
+    count: Optional[int]
+    """The number of rows returned."""
+    headers: Headers
+    """The headers of the HTTP response."""
+
+    def __init__(self, data: _DataT, count: Optional[int], headers: Headers) -> None:
+        self.data = data
+        self.count = count
+        self.headers = headers
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(data={self.data!r}, count={self.count!r})"
+
+    @classmethod
+    def from_http_request_response(
+        cls,
+        request_response: RequestResponse,
+        json_codec: Optional[JSONCodec] = None,
+    ) -> RawAPIResponse[Any]:
+        count = APIResponse._get_count_from_http_request_response(request_response)
+        data = decode_response_body(request_response, json_codec)
+        return cls(data, count, request_response.headers)
+
+
+class LazyAPIResponse(Generic[_DataT]):
+    """A response whose body is only decoded when :attr:`data` is first
+    accessed, returned by ``execute(lazy=True)``.
+
+    The raw bytes of the body are kept as received and :attr:`count` is read
+    from the `Content-Range` header, so paths that only need the count, or
+    that ignore the returned rows, never pay for decoding the body. Like
+    :class:`RawAPIResponse`, the decoded body is not validated by pydantic.
+    """
+
+    __slots__ = ("count", "headers", "_response", "_json_codec", "_decoder", "_data")
+
+    count: Optional[int]
+    """The number of rows returned."""
+    headers: Headers
+    """The headers of the HTTP response."""
+
+    def __init__(
+        self,
+        request_response: RequestResponse,
+        count: Optional[int],
+        json_codec: Optional[JSONCodec] = None,
+        decoder: Optional[Callable[[bytes], Any]] = None,
+    ) -> None:
+        self.count = count
+        self.headers = request_response.headers
+        self._response = request_response
+        self._json_codec = json_codec
+        self._decoder = decoder
+        self._data: Any = _NOT_DECODED
+
+    def __repr__(self) -> str:
+        data = "<not decoded>" if self._data is _NOT_DECODED else repr(self._data)
+        return f"{type(self).__name__}(data={data}, count={self.count!r})"
+
+    @property
+    def content(self) -> bytes:
+        """The body of the HTTP response, as received."""
+        return self._response.content
+
+    @property
+    def is_decoded(self) -> bool:
+        """Whether :attr:`data` has been accessed yet."""
+        return self._data is not _NOT_DECODED
+
+    @property
+    def data(self) -> _DataT:
+        """The data returned by the query, decoded on first access."""
+        if self._data is _NOT_DECODED:
+            content = self._response.content
+            if self._decoder is not None and content:
+                self._data = self._decoder(content)
+            else:
+                self._data = decode_response_body(self._response, self._json_codec)
+        return self._data  # type: ignore[no-any-return]
+
+    @classmethod
+    def from_http_request_response(
+        cls,
+        request_response: RequestResponse,
+        json_codec: Optional[JSONCodec] = None,
+        decoder: Optional[Callable[[bytes], Any]] = None,
+    ) -> LazyAPIResponse[Any]:
+        count = APIResponse._get_count_from_http_request_response(request_response)
+        return cls(request_response, count, json_codec, decoder)
+
+
+_NOT_DECODED: Any = object()
+
+
 class BaseFilterRequestBuilder(Generic[_ReturnT]):
     def __init__(
         self,
@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+from itertools import islice
+from os import PathLike
+from typing import (
+    IO,
+    Any,
+    AsyncIterable,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Union,
+)
+
+from httpx import HTTPError, QueryParams
+
+from .codec import JSONCodec
+from .columnar import ColumnarRows
+from .exceptions import APIError
+from .streaming import CSVChunker
+
+RETRYABLE_STATUS_CODES = frozenset((408, 429, 500, 502, 503, 504))
+"""The statuses of the responses after which a chunk is sent again."""
+
+
+class BulkChunk(NamedTuple):
+    """A part of a bulk write, ready to be sent."""
+
+    index: int
+    """The position of the chunk in the bulk write."""
+    start: int
+    """The position of the first row of the chunk in the input."""
+    rows: int
+    """The number of rows of the chunk."""
+    body: Optional[bytes]
+    """The encoded rows, or patch."""
+    params: Optional[QueryParams] = None
+    """The query parameters of the chunk, those of the query otherwise."""
+
+
+class BulkChunkResult(NamedTuple):
+    """The outcome of sending a chunk of a bulk write."""
+
+    index: int
+    """The position of the chunk in the bulk write."""
+    start: int
+    """The position of the first row of the chunk in the input."""
+    rows: int
+    """The number of rows sent."""
+    count: Optional[int]
+    """The count returned by the server, if one was asked for."""
+    data: Any
+    """The rows returned by the server, empty unless `returning=representation`."""
+    error: Optional[Union[APIError, HTTPError]]
+    """The error of the last attempt, if the chunk failed."""
+    attempts: int
+    """The number of times the chunk was sent."""
+    elapsed: float
+    """The time spent sending the chunk, retries included, in seconds."""
+
+    @property
+    def ok(self) -> bool:
+        """Whether the chunk was written."""
+        return self.error is None
+
+
+class BulkResult:
+    """The aggregated outcome of a bulk write, returned by
+    :meth:`AsyncQueryRequestBuilder.execute_bulk`.
+
+    A chunk failing doesn't stop the other ones from being sent: check
+    :attr:`ok`, or call :meth:`raise_for_errors`, before relying on
+    :attr:`data` or :attr:`count`.
+    """
+
+    def __init__(self, chunks: List[BulkChunkResult], elapsed: float) -> None:
+        self.chunks = chunks
+        """The outcome of every chunk, in the order of the input."""
+        self.elapsed = elapsed
+        """The time spent on the whole bulk write, in seconds."""
+
+    def __repr__(self) -> str:
+        return (
+            f"{type(self).__name__}(chunks={len(self.chunks)!r}, rows={self.rows!r},"
+            f" failed={len(self.errors)!r}, elapsed={self.elapsed:.3f})"
+        )
+
+    @property
+    def ok(self) -> bool:
+        """Whether every chunk was written."""
+        return all(chunk.ok for chunk in self.chunks)
+
+    @property
+    def rows(self) -> int:
+        """The number of rows sent."""
+        return sum(chunk.rows for chunk in self.chunks)
+
+    @property
+    def data(self) -> List[Any]:
+        """The rows returned for the chunks that were written, in order."""
+        data: List[Any] = []
+        for chunk in self.chunks:
+            if chunk.ok and isinstance(chunk.data, list):
+                data.extend(chunk.data)
+        return data
+
+    @property
+    def count(self) -> Optional[int]:
+        """The sum of the counts of the chunks that were written, if a count
+        was asked for."""
+        counts = [chunk.count for chunk in self.chunks if chunk.count is not None]
+        return sum(counts) if counts else None
+
+    @property
+    def errors(self) -> List[BulkChunkResult]:
+        """The chunks that failed."""
+        return [chunk for chunk in self.chunks if not chunk.ok]
+
+    def raise_for_errors(self) -> None:
+        """Raise the error of the first chunk that failed, if any."""
+        for chunk in self.chunks:
+            if chunk.error is not None:
+                raise chunk.error
+
+
+def encode_chunks(
+    rows: Iterable[Any],
+    json_codec: JSONCodec,
+    max_rows: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+) -> Iterator[BulkChunk]:
+    """Split rows into JSON arrays of at most `max_rows` rows and
+    `max_bytes` bytes.
+
+    Every row is encoded once, and only the rows of the chunk being built
+    are held, so `rows` can be consumed lazily. A row larger than
+    `max_bytes` by itself is sent alone.
+    """
+    if max_rows is not None and max_rows < 1:
+        raise ValueError("max_rows must be positive")
+    if max_bytes is not None and max_bytes < 3:
+        raise ValueError("max_bytes is too small to hold a row")
+    index = start = 0
+    encoded: List[bytes] = []
+    size = 2  # the brackets of the array
+    for position, row in enumerate(rows):
+        row_bytes = json_codec.dumps(row)
+        separator = 1 if encoded else 0
+        if encoded and (
+            (max_rows is not None and len(encoded) >= max_rows)
+            or (max_bytes is not None and size + separator + len(row_bytes) > max_bytes)
+        ):
+            yield BulkChunk(index, start, len(encoded), _json_array(encoded))
+            index += 1
+            start = position
+            encoded = []
+            size, separator = 2, 0
+        encoded.append(row_bytes)
+        size += separator + len(row_bytes)
+    if encoded:
+        yield BulkChunk(index, start, len(encoded), _json_array(encoded))
+
+
+def encode_column_chunks(
+    rows: ColumnarRows, json_codec: JSONCodec, max_rows: int
+) -> Iterator[BulkChunk]:
+    """Split column-oriented rows into JSON arrays of at most `max_rows`
+    rows, encoded with :meth:`JSONCodec.dumps_rows`."""
+    if max_rows < 1:
+        raise ValueError("max_rows must be positive")
+    iterator = iter(rows)
+    index = start = 0
+    while True:
+        batch = list(islice(iterator, max_rows))
+        if not batch:
+            return
+        body = json_codec.dumps_rows(rows.columns, batch)
+        yield BulkChunk(index, start, len(batch), body)
+        index += 1
+        start += len(batch)
+
+
+class CSVSource:
+    """A CSV document to be sent as the body of an insert, see
+    :meth:`AsyncRequestBuilder.insert_csv`.
+
+    Args:
+        source: The path of a file, a file object opened in binary mode, or
+            an iterator of bytes (an async iterator with the async client).
+        read_size: The size of the parts read from a file.
+    """
+
+    def __init__(
+        self,
+        source: Union[str, PathLike, IO[bytes], Iterable[bytes], AsyncIterable[bytes]],
+        read_size: int = 1024 * 1024,
+    ) -> None:
+        self.source = source
+        self.read_size = read_size
+
+    @property
+    def is_async(self) -> bool:
+        """Whether the document is read from an async iterator."""
+        return hasattr(self.source, "__aiter__")
+
+    def iter_bytes(self) -> Iterator[bytes]:
+        """Read the document, in parts."""
+        if isinstance(self.source, (str, PathLike)):
+            with open(self.source, "rb") as file:
+                yield from self._read(file)
+        elif hasattr(self.source, "read"):
+            yield from self._read(self.source)  # type: ignore[arg-type]
+        elif self.is_async:
+            raise TypeError("An async iterator can only be read asynchronously")
+        else:
+            for data in self.source:  # type: ignore[union-attr]
+                yield data.encode() if isinstance(data, str) else data
+
+    def chunks(
+        self, max_rows: Optional[int] = None, max_bytes: Optional[int] = None
+    ) -> Iterator[BulkChunk]:
+        """Split the document into chunks of whole records, each one
+        starting with the header, see :class:`CSVChunker`."""
+        chunker = CSVChunker(max_rows, max_bytes)
+        index = start = 0
+        for data in self.iter_bytes():
+            for rows, body in chunker.feed(data):
+                yield BulkChunk(index, start, rows, body)
+                index += 1
+                start += rows
+        for rows, body in chunker.close():
+            yield BulkChunk(index, start, rows, body)
+            index += 1
+            start += rows
+
+    def _read(self, file: IO[Any]) -> Iterator[bytes]:
+        while True:
+            data = file.read(self.read_size)
+            if not data:
+                return
+            yield data.encode() if isinstance(data, str) else data
+
+
+def _json_array(encoded: List[bytes]) -> bytes:
+    return b"[" + b",".join(encoded) + b"]"
@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import json
+import re
+from abc import ABC, abstractmethod
+from datetime import date, datetime, time
+from decimal import Decimal
+from functools import lru_cache
+from json import JSONDecodeError
+from typing import Any, Iterable, List, Optional, Sequence, Tuple, Type, Union
+from uuid import UUID
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None  # type: ignore
+
+
+def _encode_default(obj: Any) -> Any:
+    """Fallback used by the codecs for values JSON has no native type for."""
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, (Decimal, UUID)):
+        # Decimal is sent as a string so that no precision is lost,
+        # PostgreSQL casts it back to numeric on its side.
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class JSONCodec(ABC):
+    """Base class of the JSON codecs used for request and response bodies."""
+
+    name: str
+
+    @abstractmethod
+    def dumps(self, obj: Any) -> bytes:
+        """Serialize `obj` into a JSON document.
+
+        Raises:
+            `TypeError`: If `obj` contains a value that cannot be serialized.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def loads(self, data: Union[bytes, str]) -> Any:
+        """Deserialize a JSON document.
+
+        Raises:
+            :class:`json.JSONDecodeError`: If `data` is not a valid JSON document.
+        """
+        raise NotImplementedError()
+
+    def dumps_rows(
+        self, columns: Sequence[str], rows: Iterable[Sequence[Any]]
+    ) -> bytes:
+        """Serialize rows given as sequences of values, in the order of
+        `columns`, into a JSON array of objects.
+
+        A dictionary is built for every row by default; codecs able to encode
+        the rows without it override this method.
+
+        Raises:
+            `ValueError`: If a row doesn't have one value per column.
+            `TypeError`: If a row contains a value that cannot be serialized.
+        """
+        width = len(columns)
+        objects: List[Any] = []
+        for row in rows:
+            if len(row) != width:
+                raise _row_width_error(width, row)
+            objects.append(dict(zip(columns, row)))
+        return self.dumps(objects)
+
+
+class StdlibJSONCodec(JSONCodec):
+    """JSON codec based on the :mod:`json` module of the standard library."""
+
+    name = "json"
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(
+            obj,
+            default=_encode_default,
+            ensure_ascii=False,
+            separators=(",", ":"),
+            allow_nan=False,
+        ).encode("utf-8")
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return json.loads(data)
+
+
+# orjson only handles 64-bit integers: it refuses to encode larger ones, and
+# decodes them as floats. Any integer out of that range has 19 digits or more.
+_LONG_NUMBER = re.compile(rb"[0-9]{19}")
+_LONG_NUMBER_STR = re.compile(r"[0-9]{19}")
+
+
+class OrjsonJSONCodec(JSONCodec):
+    """JSON codec based on `orjson <https://github.com/ijl/orjson>`_.
+
+    orjson only supports 64-bit integers, while PostgreSQL `numeric` values
+    can be larger: the documents holding such integers are handled by the
+    standard library instead, so that no precision is lost.
+    """
+
+    name = "orjson"
+
+    def __init__(self) -> None:
+        if orjson is None:
+            raise ImportError("orjson must be installed to use OrjsonJSONCodec")
+        self._fallback = StdlibJSONCodec()
+
+    def dumps(self, obj: Any) -> bytes:
+        try:
+            return orjson.dumps(
+                obj, default=_encode_default, option=orjson.OPT_NON_STR_KEYS
+            )
+        except orjson.JSONEncodeError as e:
+            if str(e) != "Integer exceeds 64-bit range":
+                raise
+            return self._fallback.dumps(obj)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        pattern = _LONG_NUMBER_STR if isinstance(data, str) else _LONG_NUMBER
+        if pattern.search(data):  # type: ignore[arg-type]
+            return self._fallback.loads(data)
+        return orjson.loads(data)
+
+
+class MsgspecJSONCodec(JSONCodec):
+    """JSON codec based on `msgspec <https://jcristharif.com/msgspec/>`_."""
+
+    name = "msgspec"
+
+    def __init__(self) -> None:
+        if msgspec is None:
+            raise ImportError("msgspec must be installed to use MsgspecJSONCodec")
+        self._encoder = msgspec.json.Encoder(enc_hook=_encode_default)
+        self._decoder = msgspec.json.Decoder()
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._encoder.encode(obj)
+
+    def dumps_rows(
+        self, columns: Sequence[str], rows: Iterable[Sequence[Any]]
+    ) -> bytes:
+        # structs are encoded as objects, at a fraction of the cost of dicts
+        struct = _row_struct(tuple(columns))
+        width = len(columns)
+        objects: List[Any] = []
+        for row in rows:
+            if len(row) != width:
+                raise _row_width_error(width, row)
+            objects.append(struct(*row))
+        return self._encoder.encode(objects)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        try:
+            return self._decoder.decode(data)
+        except msgspec.DecodeError as e:
+            raise JSONDecodeError(str(e), "", 0) from e
+
+
+def _row_width_error(width: int, row: Sequence[Any]) -> ValueError:
+    return ValueError(f"Expected rows of {width} values, got {len(row)} values")
+
+
+@lru_cache(maxsize=64)
+def _row_struct(columns: Tuple[str, ...]) -> Type[Any]:
+    # the fields are renamed, as column names need not be identifiers
+    fields = [f"c{i}" for i in range(len(columns))]
+    return msgspec.defstruct(  # type: ignore[no-any-return]
+        "Row", fields, rename=dict(zip(fields, columns)), omit_defaults=False
+    )
+
+
+def get_default_json_codec() -> JSONCodec:
+    """Return the default JSON codec.
+
+    `msgspec` is used when installed, being faster than the standard
+    library, which is used otherwise; both handle integers of any size.
+    `orjson` is only used when passed explicitly, see
+    :class:`OrjsonJSONCodec`.
+    """
+    global _default_json_codec
+    if _default_json_codec is None:
+        if msgspec is not None:
+            _default_json_codec = MsgspecJSONCodec()
+        else:
+            _default_json_codec = StdlibJSONCodec()
+    return _default_json_codec
+
+
+_default_json_codec: Optional[JSONCodec] = None
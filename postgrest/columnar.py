@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+from array import array
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+Column = Union[List[Any], array]
+"""The values of a column: an :class:`array.array` for numeric columns, a list otherwise."""
+
+
+class ColumnarBuilder:
+    """Accumulate rows into one sequence per column.
+
+    Integer columns are stored in ``array("q")`` and floating point columns
+    in ``array("d")``, every other column in a list. A numeric column falls
+    back to a list as soon as it receives a value the array cannot hold
+    (a ``null``, a string, a boolean, an integer above 64 bits...). A column
+    mixing integers and floats is stored as floats.
+
+    Args:
+        columns: The names of the columns, required by :meth:`append_values`.
+            Columns found in the rows passed to :meth:`append` are added as
+            they are seen.
+
+    Example:
+        .. code-block:: python
+
+            builder = ColumnarBuilder()
+            for row in rows:
+                builder.append(row)
+            columns = builder.build()
+    """
+
+    def __init__(self, columns: Optional[Iterable[str]] = None) -> None:
+        self._columns: Dict[str, Column] = {}
+        self._names: List[str] = []
+        self._length = 0
+        for name in columns or ():
+            self._add_column(name)
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def columns(self) -> List[str]:
+        """The names of the columns, in the order they were first seen."""
+        return list(self._names)
+
+    def append(self, row: Mapping[str, Any]) -> None:
+        """Add a row given as a mapping of column names to values."""
+        for name, value in row.items():
+            if name not in self._columns:
+                self._add_column(name)
+            self._append_value(name, value)
+        if len(row) != len(self._names):
+            for name in self._names:
+                if name not in row:
+                    self._append_value(name, None)
+        self._length += 1
+
+    def append_values(self, values: Sequence[Any]) -> None:
+        """Add a row given as a sequence of values, in the order of the columns."""
+        if len(values) != len(self._names):
+            raise ValueError(
+                f"Expected {len(self._names)} values, got {len(values)} instead"
+            )
+        for name, value in zip(self._names, values):
+            self._append_value(name, value)
+        self._length += 1
+
+    def extend(self, rows: Iterable[Mapping[str, Any]]) -> None:
+        """Add several rows given as mappings."""
+        for row in rows:
+            self.append(row)
+
+    def build(self) -> Dict[str, Column]:
+        """Return the columns accumulated so far."""
+        return dict(self._columns)
+
+    def _add_column(self, name: str) -> None:
+        self._names.append(name)
+        # the rows added before the column appeared had no value for it
+        self._columns[name] = [None] * self._length
+
+    def _append_value(self, name: str, value: Any) -> None:
+        column = self._columns[name]
+        kind = type(value)
+        if type(column) is list:
+            if not column and (kind is int or kind is float):
+                self._columns[name] = column = array("q" if kind is int else "d")
+            else:
+                column.append(value)
+                return
+        if column.typecode == "q":  # type: ignore[union-attr]
+            if kind is int:
+                try:
+                    column.append(value)
+                    return
+                except OverflowError:
+                    pass
+            elif kind is float:
+                self._columns[name] = column = array("d", column)
+                column.append(value)
+                return
+        elif kind is float or kind is int:
+            column.append(value)
+            return
+        self._columns[name] = column = list(column)
+        column.append(value)
+
+
+class ColumnarRows:
+    """Rows given as sequences of values sharing a fixed list of columns,
+    the body of :meth:`AsyncRequestBuilder.insert_columns`.
+
+    The rows are serialized straight into a JSON array of objects by
+    :meth:`JSONCodec.dumps_rows`, without a dictionary per row, and the
+    `columns` query parameter is set from the declared columns instead of
+    scanning the keys of every row.
+
+    Args:
+        data: The rows, as sequences of values in the order of `columns`, or
+            the columns, as a mapping of column names to sequences of values
+            (such as the result of :meth:`ColumnarBuilder.build`).
+        columns: The names of the columns, required when `data` holds rows.
+    Raises:
+        :class:`ValueError` If the columns are missing, or don't have the
+            same length.
+    """
+
+    def __init__(
+        self,
+        data: Union[Mapping[str, Sequence[Any]], Iterable[Sequence[Any]]],
+        columns: Optional[Sequence[str]] = None,
+    ) -> None:
+        self._columns_data: Optional[List[Sequence[Any]]] = None
+        self._rows: Optional[Iterable[Sequence[Any]]] = None
+        if isinstance(data, Mapping):
+            if columns is None:
+                columns = list(data)
+            self._columns_data = [data[name] for name in columns]
+            if len({len(values) for values in self._columns_data}) > 1:
+                raise ValueError("The columns must all have the same length")
+        elif columns is None:
+            raise ValueError("The columns of the rows must be given")
+        else:
+            self._rows = data
+        self.columns: Tuple[str, ...] = tuple(columns)
+        """The names of the columns."""
+
+    def __iter__(self) -> Iterator[Sequence[Any]]:
+        if self._columns_data is not None:
+            return zip(*self._columns_data)
+        return iter(self._rows)  # type: ignore[arg-type]
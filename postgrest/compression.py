@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import re
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None  # type: ignore
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # type: ignore
+
+# the levels used when none is given: fast ones, as bodies are compressed
+# while the request is being sent
+_DEFAULT_LEVELS: Dict[str, int] = {"gzip": 6, "br": 4, "zstd": 3}
+_LEVEL_RANGES: Dict[str, Tuple[int, int]] = {
+    "gzip": (0, 9),
+    "br": (0, 11),
+    "zstd": (-7, 22),
+}
+
+DEFAULT_COMPRESSION_THRESHOLD = 1024
+"""The size of the smallest request body compressed, in bytes."""
+
+# the first release of httpx decoding zstd responses
+_HTTPX_ZSTD_VERSION = (0, 27, 1)
+
+
+def _httpx_decodes_zstd() -> bool:
+    """Whether the installed httpx decodes zstd, `zstandard` being installed."""
+    version = tuple(int(part) for part in re.findall(r"\d+", httpx.__version__)[:3])
+    return zstandard is not None and version >= _HTTPX_ZSTD_VERSION
+
+
+class _BrotliCompressor:
+    """Expose a brotli compressor with the API of :func:`zlib.compressobj`,
+    the `brotli` and `brotlicffi` packages sharing `process` and `finish`."""
+
+    def __init__(self, quality: int) -> None:
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)  # type: ignore[no-any-return]
+
+    def flush(self) -> bytes:
+        return self._compressor.finish()  # type: ignore[no-any-return]
+
+
+class Compression:
+    """The compression of the bodies exchanged with PostgREST.
+
+    Request bodies of at least `threshold` bytes are compressed with
+    `codec` and sent with a `Content-Encoding` header, which PostgREST
+    itself doesn't understand: a proxy in front of it has to decompress
+    them. Bodies streamed from an iterator or a CSV file are always
+    compressed, their size being unknown in advance.
+
+    The client also sends an `Accept-Encoding` header preferring `codec`,
+    along with the other encodings httpx can decode, and the responses
+    are decoded as they are read, streamed ones included.
+
+    Args:
+        codec: `gzip`, `br` (requires `brotli` or `brotlicffi`) or `zstd`
+            (requires `zstandard`).
+        level: The compression level, a default suited to the codec
+            otherwise.
+        threshold: The size of the smallest request body compressed, in
+            bytes.
+
+    Example:
+        .. code-block:: python
+
+            client = AsyncPostgrestClient(url, compression=Compression("zstd"))
+    """
+
+    def __init__(
+        self,
+        codec: str = "gzip",
+        level: Optional[int] = None,
+        *,
+        threshold: int = DEFAULT_COMPRESSION_THRESHOLD,
+    ) -> None:
+        if codec not in _DEFAULT_LEVELS:
+            raise ValueError(f"Unknown compression codec: {codec!r}")
+        if codec == "br" and brotli is None:
+            raise ImportError("brotli or brotlicffi must be installed to use br")
+        if codec == "zstd" and zstandard is None:
+            raise ImportError("zstandard must be installed to use zstd")
+        if level is None:
+            level = _DEFAULT_LEVELS[codec]
+        low, high = _LEVEL_RANGES[codec]
+        if not low <= level <= high:
+            raise ValueError(f"The level of {codec} must be in [{low}, {high}]")
+        if threshold < 0:
+            raise ValueError("threshold must not be negative")
+        self.codec = codec
+        self.level = level
+        self.threshold = threshold
+
+    def __repr__(self) -> str:
+        return (
+            f"{type(self).__name__}({self.codec!r}, level={self.level!r},"
+            f" threshold={self.threshold!r})"
+        )
+
+    @property
+    def accept_encoding(self) -> str:
+        """The value of the `Accept-Encoding` header: `codec` first, then the
+        other encodings that can be decoded, with a lower preference.
+
+        httpx decodes `gzip` and `deflate`, and `br` and `zstd` when the
+        same packages as the ones needed to compress them are installed,
+        `zstd` only from httpx 0.27.1: with an older one, request bodies can
+        still be compressed with it but the responses are not.
+        """
+        encodings = ["gzip", "deflate"]
+        if brotli is not None:
+            encodings.append("br")
+        if _httpx_decodes_zstd():
+            encodings.append("zstd")
+        preferred = [self.codec] if self.codec in encodings else []
+        others = [
+            f"{encoding};q=0.8" for encoding in encodings if encoding != self.codec
+        ]
+        return ", ".join([*preferred, *others])
+
+    def compressor(self) -> Any:
+        """Return a new incremental compressor, with the `compress` and
+        `flush` methods of :func:`zlib.compressobj`."""
+        if self.codec == "gzip":
+            return zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        if self.codec == "br":
+            return _BrotliCompressor(self.level)
+        return zstandard.ZstdCompressor(level=self.level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        """Compress a whole body."""
+        compressor = self.compressor()
+        return compressor.compress(data) + compressor.flush()  # type: ignore[no-any-return]
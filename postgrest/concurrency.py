@@ -0,0 +1,408 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from queue import Empty, Queue
+from threading import Event, Thread
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Deque,
+    Generic,
+    Iterable,
+    Iterator,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+_T = TypeVar("_T")
+_R = TypeVar("_R")
+
+
+def _check_concurrency(concurrency: int) -> None:
+    if concurrency < 1:
+        raise ValueError("concurrency must be positive")
+
+
+class AsyncTaskPool:
+    """Run coroutines with a bounded concurrency on the running event loop.
+
+    The async and sync request builders share their code, the sync one
+    being generated from the async one; this class and :class:`SyncTaskPool`
+    expose the same API so that fan-outs translate to a thread pool.
+
+    Args:
+        concurrency: The maximum number of coroutines running at once.
+    """
+
+    sleep = staticmethod(asyncio.sleep)
+    """Wait between retries without blocking the event loop."""
+
+    def __init__(self, concurrency: int) -> None:
+        _check_concurrency(concurrency)
+        self.concurrency = concurrency
+
+    async def map(
+        self,
+        fn: Callable[[_T], Awaitable[_R]],
+        items: Iterable[_T],
+        *,
+        ordered: bool = True,
+    ) -> AsyncIterator[_R]:
+        """Apply `fn` to every item and yield the results.
+
+        Items are only taken from `items` when a slot is free, and no more
+        than `concurrency` results are held before being consumed. The
+        tasks still running are cancelled when the iterator is closed or
+        when one of them fails.
+
+        Args:
+            fn: The coroutine function to apply.
+            items: The arguments of `fn`.
+            ordered: Yield the results in the order of `items`, otherwise
+                as soon as they are available.
+        """
+        items = iter(items)
+        pending: Deque[asyncio.Task[_R]] = deque()
+        try:
+            for item in items:
+                pending.append(asyncio.ensure_future(fn(item)))
+                if len(pending) < self.concurrency:
+                    continue
+                if ordered:
+                    yield await pending.popleft()
+                else:
+                    for result in await self._completed(pending):
+                        yield result
+            while pending:
+                if ordered:
+                    yield await pending.popleft()
+                else:
+                    for result in await self._completed(pending):
+                        yield result
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def chain_map(
+        self,
+        fn: Callable[[_T], Awaitable[Tuple[_R, Optional[_T]]]],
+        items: Iterable[_T],
+    ) -> AsyncIterator[_R]:
+        """Apply `fn` to every item, then to the item it returns next, until
+        it returns `None`, and yield the results as soon as they are
+        available.
+
+        Every item starts a chain of calls, such as the pages of a keyset
+        pagination: a chain is continued as soon as its last call returns,
+        independently of the other chains, and no more than `concurrency`
+        calls run at once, the chains waiting for a slot being continued in
+        turn. The running tasks are cancelled when the iterator is closed or
+        when one of them fails.
+        """
+        waiting: Deque[_T] = deque(items)
+        running: Set[asyncio.Task[Tuple[_R, Optional[_T]]]] = set()
+        try:
+            while waiting or running:
+                while waiting and len(running) < self.concurrency:
+                    running.add(asyncio.ensure_future(fn(waiting.popleft())))
+                done, running = await asyncio.wait(
+                    running, return_when=asyncio.FIRST_COMPLETED
+                )
+                results = []
+                for task in done:
+                    result, following = task.result()
+                    if following is not None:
+                        waiting.append(following)
+                    results.append(result)
+                # continue the chains before handing the results over
+                while waiting and len(running) < self.concurrency:
+                    running.add(asyncio.ensure_future(fn(waiting.popleft())))
+                for result in results:
+                    yield result
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+    @staticmethod
+    async def _completed(pending: Deque[asyncio.Task[_R]]) -> Iterator[_R]:
+        done: Set[asyncio.Task[_R]]
+        done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            pending.remove(task)
+        return (task.result() for task in done)
+
+
+class SyncTaskPool:
+    """Run functions with a bounded concurrency in a thread pool.
+
+    Args:
+        concurrency: The maximum number of threads running at once.
+    """
+
+    sleep = staticmethod(time.sleep)
+    """Wait between retries, blocking the calling thread."""
+
+    def __init__(self, concurrency: int) -> None:
+        _check_concurrency(concurrency)
+        self.concurrency = concurrency
+
+    def map(
+        self,
+        fn: Callable[[_T], _R],
+        items: Iterable[_T],
+        *,
+        ordered: bool = True,
+    ) -> Iterator[_R]:
+        """Apply `fn` to every item and yield the results.
+
+        Same as :meth:`AsyncTaskPool.map`, the functions being run by a
+        thread pool; `httpx.Client` can be shared between the threads.
+        Functions that have not started yet are cancelled when the iterator
+        is closed or when one of them fails.
+        """
+        pending: Deque[Future[_R]] = deque()
+        executor = ThreadPoolExecutor(self.concurrency)
+        try:
+            for item in items:
+                pending.append(executor.submit(fn, item))
+                if len(pending) < self.concurrency:
+                    continue
+                if ordered:
+                    yield pending.popleft().result()
+                else:
+                    yield from self._completed(pending)
+            while pending:
+                if ordered:
+                    yield pending.popleft().result()
+                else:
+                    yield from self._completed(pending)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def chain_map(
+        self,
+        fn: Callable[[_T], Tuple[_R, Optional[_T]]],
+        items: Iterable[_T],
+    ) -> Iterator[_R]:
+        """Apply `fn` to every item, then to the item it returns next, until
+        it returns `None`, and yield the results as soon as they are
+        available.
+
+        Same as :meth:`AsyncTaskPool.chain_map`, the functions being run by
+        a thread pool.
+        """
+        waiting: Deque[_T] = deque(items)
+        running: Set[Future[Tuple[_R, Optional[_T]]]] = set()
+        executor = ThreadPoolExecutor(self.concurrency)
+        try:
+            while waiting or running:
+                while waiting and len(running) < self.concurrency:
+                    running.add(executor.submit(fn, waiting.popleft()))
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                results = []
+                for future in done:
+                    result, following = future.result()
+                    if following is not None:
+                        waiting.append(following)
+                    results.append(result)
+                # continue the chains before handing the results over
+                while waiting and len(running) < self.concurrency:
+                    running.add(executor.submit(fn, waiting.popleft()))
+                yield from results
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    @staticmethod
+    def _completed(pending: Deque[Future[_R]]) -> Iterator[_R]:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            pending.remove(future)
+        return (future.result() for future in done)
+
+
+# marks the end of the items produced by a read-ahead
+_DONE: Any = object()
+
+
+class AsyncReadAhead(Generic[_T]):
+    """Consume an async iterator ahead of its consumer.
+
+    A background task keeps pulling items from `iterator`, holding up to
+    `size` of them until they are consumed: the next page is fetched while
+    the consumer processes the current one, and fetching pauses when the
+    consumer falls behind. Leaving the ``async with`` block cancels the
+    background task, along with the request it is waiting for.
+
+    Args:
+        iterator: The iterator to consume.
+        size: The maximum number of items read ahead; with 0, `iterator` is
+            consumed as it is iterated, without any background task.
+
+    Example:
+        .. code-block:: python
+
+            async with AsyncReadAhead(pages, 2) as pages:
+                async for page in pages:
+                    ...
+    """
+
+    def __init__(self, iterator: AsyncIterator[_T], size: int) -> None:
+        if size < 0:
+            raise ValueError("size must not be negative")
+        self.size = size
+        self._iterator = iterator
+        self._queue: Optional[asyncio.Queue[Tuple[Any, Optional[BaseException]]]] = None
+        self._task: Optional[asyncio.Task[None]] = None
+        self._finished = False
+
+    async def __aenter__(self) -> AsyncReadAhead[_T]:
+        if self.size:
+            self._queue = asyncio.Queue(self.size)
+            self._task = asyncio.ensure_future(self._produce())
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        aclose = getattr(self._iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+    def __aiter__(self) -> AsyncReadAhead[_T]:
+        return self
+
+    async def __anext__(self) -> _T:
+        if self._queue is None:
+            return await self._iterator.__anext__()
+        if self._finished:
+            raise StopAsyncIteration
+        item, error = await self._queue.get()
+        if item is _DONE:
+            self._finished = True
+            if error is not None:
+                raise error
+            raise StopAsyncIteration
+        return item  # type: ignore[no-any-return]
+
+    async def _produce(self) -> None:
+        assert self._queue is not None
+        try:
+            async for item in self._iterator:
+                await self._queue.put((item, None))
+        except Exception as e:
+            await self._queue.put((_DONE, e))
+        else:
+            await self._queue.put((_DONE, None))
+
+
+class SyncReadAhead(Generic[_T]):
+    """Consume an iterator ahead of its consumer, in a background thread.
+
+    Same as :class:`AsyncReadAhead`. A request already sent by the thread
+    cannot be interrupted: leaving the ``with`` block stops the thread from
+    reading further, and waits for it to finish the item in progress.
+    """
+
+    def __init__(self, iterator: Iterator[_T], size: int) -> None:
+        if size < 0:
+            raise ValueError("size must not be negative")
+        self.size = size
+        self._iterator = iterator
+        self._queue: Optional[Queue[Tuple[Any, Optional[BaseException]]]] = None
+        self._thread: Optional[Thread] = None
+        self._stop = Event()
+        self._finished = False
+
+    def __enter__(self) -> SyncReadAhead[_T]:
+        if self.size:
+            self._queue = Queue(self.size)
+            self._thread = Thread(target=self._produce, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            # unblock the thread if it waits for room in the queue
+            try:
+                while True:
+                    self._queue.get_nowait()  # type: ignore[union-attr]
+            except Empty:
+                pass
+            self._thread.join()
+        else:
+            close = getattr(self._iterator, "close", None)
+            if close is not None:
+                close()
+
+    def __iter__(self) -> SyncReadAhead[_T]:
+        return self
+
+    def __next__(self) -> _T:
+        if self._queue is None:
+            return next(self._iterator)
+        if self._finished:
+            raise StopIteration
+        item, error = self._queue.get()
+        if item is _DONE:
+            self._finished = True
+            if error is not None:
+                raise error
+            raise StopIteration
+        return item  # type: ignore[no-any-return]
+
+    def _produce(self) -> None:
+        assert self._queue is not None
+        try:
+            for item in self._iterator:
+                if self._stop.is_set():
+                    break
+                self._queue.put((item, None))
+                if self._stop.is_set():
+                    break
+            else:
+                self._queue.put((_DONE, None))
+        except Exception as e:
+            self._queue.put((_DONE, e))
+        finally:
+            # the iterator can only be closed by the thread running it
+            close = getattr(self._iterator, "close", None)
+            if close is not None:
+                close()
+
+
+class AsyncBackgroundTasks:
+    """Run coroutines in the background, without waiting for them.
+
+    References to the running tasks are kept, so that they are not garbage
+    collected before completion.
+    """
+
+    def __init__(self) -> None:
+        self._tasks: Set[asyncio.Task[Any]] = set()
+
+    def spawn(self, fn: Callable[[], Awaitable[Any]]) -> None:
+        """Start running `fn` on the running event loop."""
+        task = asyncio.ensure_future(fn())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+class SyncBackgroundTasks:
+    """Run functions in the background, each in a daemon thread."""
+
+    def spawn(self, fn: Callable[[], Any]) -> None:
+        """Start running `fn` in a new thread."""
+        Thread(target=fn, daemon=True).start()
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from hashlib import sha256
+from threading import Lock
+from time import monotonic
+from typing import Callable, Hashable, Optional, Set, Tuple
+
+from httpx import Headers, QueryParams
+
+from .types import CountMethod
+
+# parameters that change the rows returned but not how many rows match
+_IGNORED_PARAMS = frozenset(("limit", "offset", "order", "columns"))
+
+CountKey = Tuple[Hashable, ...]
+
+
+class CountCache:
+    """A client-side cache of the counts returned by PostgREST.
+
+    Counts are cached per path, filters, schema, role and count method.
+    They expire after `ttl` seconds, and the least recently used ones are
+    evicted beyond `max_entries`. A query served from the cache does not ask
+    the server for a count at all: its `count` is filled in from the cache.
+
+    With `fallback` set to `planned` or `estimated`, a query asking for an
+    `exact` count that is not cached gets the cheap `fallback` count from the
+    server right away, while the exact count is refreshed in the background
+    for the next queries.
+
+    Args:
+        ttl: The number of seconds a count stays valid.
+        max_entries: The maximum number of counts cached.
+        fallback: The count method served while an exact count is refreshed.
+        clock: The function giving the current time, in seconds.
+
+    Example:
+        .. code-block:: python
+
+            cache = CountCache(ttl=30, fallback=CountMethod.planned)
+            client = AsyncPostgrestClient(url, count_cache=cache)
+    """
+
+    def __init__(
+        self,
+        ttl: float = 60.0,
+        max_entries: int = 1024,
+        *,
+        fallback: Optional[CountMethod] = None,
+        clock: Callable[[], float] = monotonic,
+    ) -> None:
+        if fallback == CountMethod.exact:
+            raise ValueError("The fallback must be `planned` or `estimated`")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.fallback = fallback
+        self.hits = 0
+        """The number of counts served from the cache."""
+        self.misses = 0
+        """The number of counts that were not cached, or had expired."""
+        self._clock = clock
+        self._entries: OrderedDict[CountKey, Tuple[int, float]] = OrderedDict()
+        self._refreshing: Set[CountKey] = set()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(
+        path: str, params: QueryParams, headers: Headers, method: CountMethod
+    ) -> CountKey:
+        """Build the key of a count.
+
+        The filters are normalized, so that their order doesn't matter, and
+        the parameters that don't change the count (`limit`, `offset`,
+        `order`) are left out. The role is identified by a digest of the
+        `Authorization` header: row level security may give different users
+        different counts.
+        """
+        filters = tuple(
+            sorted(
+                (key, value)
+                for key, value in params.multi_items()
+                if key not in _IGNORED_PARAMS
+            )
+        )
+        authorization = headers.get("Authorization", "")
+        return (
+            path,
+            filters,
+            headers.get("Accept-Profile") or headers.get("Content-Profile"),
+            sha256(authorization.encode()).hexdigest() if authorization else None,
+            str(method),
+        )
+
+    def get(self, key: CountKey) -> Optional[int]:
+        """Return the cached count of `key`, if it has not expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= self._clock():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: CountKey, count: int) -> None:
+        """Cache the count of `key`."""
+        with self._lock:
+            self._entries[key] = (count, self._clock() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        """Forget the counts of `path`, typically after writing to it, or
+        every count."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if key[0] == path]:
+                del self._entries[key]
+
+    def start_refresh(self, key: CountKey) -> bool:
+        """Mark the count of `key` as being refreshed.
+
+        Returns:
+            `False` if it was already being refreshed.
+        """
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def end_refresh(self, key: CountKey, count: Optional[int]) -> None:
+        """Store the refreshed count of `key`, if any."""
+        if count is not None:
+            self.set(key, count)
+        with self._lock:
+            self._refreshing.discard(key)
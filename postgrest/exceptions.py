@@ -1,6 +1,9 @@
 from typing import Any, Dict, Optional
 
-from pydantic import BaseModel
+from httpx import Response
+from pydantic import BaseModel, ValidationError
+
+from .utils import model_validate_json
 
 
 class APIErrorFromJSON(BaseModel):
@@ -66,3 +69,12 @@ def generate_default_error_message(r):
         "hint": "Refer to full message for details",
         "details": str(r.content),
     }
+
+
+def api_error_from_response(r: Response) -> APIError:
+    """Build the :class:`APIError` matching an unsuccessful response."""
+    try:
+        json_obj = model_validate_json(APIErrorFromJSON, r.content)
+    except ValidationError:
+        return APIError(generate_default_error_message(r))
+    return APIError(dict(json_obj))
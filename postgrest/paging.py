@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+from typing import List, NamedTuple, Optional
+
+
+class PageStats(NamedTuple):
+    """What was observed for a page, and the size chosen for the next one."""
+
+    size: int
+    """The `limit` the page was requested with."""
+    rows: int
+    """The number of rows received."""
+    bytes: int
+    """The size of the response body."""
+    elapsed: float
+    """The time taken by the request, in seconds."""
+    next_size: int
+    """The `limit` chosen for the next page."""
+
+
+class AdaptivePageSize:
+    """Choose the size of every page from the latency and the size of the
+    previous ones.
+
+    After each page, the time and bytes spent per row are smoothed with an
+    exponential moving average, and the next page is sized to take about
+    `target_latency` seconds and `target_bytes` bytes, whichever is reached
+    first. A page grows at most by `max_growth` at once, so that a few fast
+    pages don't lead to a sudden oversized request, while it shrinks as
+    much as needed right away. Pass it as the `page_size` of
+    :meth:`AsyncSelectRequestBuilder.paginate`.
+
+    Args:
+        initial: The size of the first page.
+        min_size: The smallest page size.
+        max_size: The largest page size.
+        target_latency: The time a page should take, in seconds.
+        target_bytes: The size a page should have, in bytes.
+        max_growth: The factor by which a page can grow at most.
+        smoothing: The weight of the last page in the moving averages,
+            between 0 (excluded) and 1.
+
+    Example:
+        .. code-block:: python
+
+            sizer = AdaptivePageSize(initial=500, target_latency=0.5)
+            async for page in query.paginate(page_size=sizer):
+                ...
+            print(sizer.history[-1])
+    """
+
+    def __init__(
+        self,
+        initial: int = 1000,
+        *,
+        min_size: int = 100,
+        max_size: int = 50_000,
+        target_latency: float = 1.0,
+        target_bytes: int = 8 * 1024 * 1024,
+        max_growth: float = 2.0,
+        smoothing: float = 0.5,
+    ) -> None:
+        if not 1 <= min_size <= max_size:
+            raise ValueError("Expected 1 <= min_size <= max_size")
+        if target_latency <= 0 or target_bytes <= 0:
+            raise ValueError("The targets must be positive")
+        if max_growth < 1:
+            raise ValueError("max_growth must be at least 1")
+        if not 0 < smoothing <= 1:
+            raise ValueError("smoothing must be in (0, 1]")
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_latency = target_latency
+        self.target_bytes = target_bytes
+        self.max_growth = max_growth
+        self.smoothing = smoothing
+        self.size = self._clamp(initial)
+        """The size of the next page."""
+        self.seconds_per_row: Optional[float] = None
+        """The smoothed time spent per row."""
+        self.bytes_per_row: Optional[float] = None
+        """The smoothed number of bytes per row."""
+        self.history: List[PageStats] = []
+        """The observations and decisions made for every page so far."""
+
+    def __repr__(self) -> str:
+        return (
+            f"{type(self).__name__}(size={self.size!r}, pages={len(self.history)!r},"
+            f" rows={self.rows!r})"
+        )
+
+    @property
+    def rows(self) -> int:
+        """The number of rows received so far."""
+        return sum(page.rows for page in self.history)
+
+    @property
+    def bytes(self) -> int:
+        """The number of bytes received so far."""
+        return sum(page.bytes for page in self.history)
+
+    @property
+    def elapsed(self) -> float:
+        """The time spent in requests so far, in seconds."""
+        return sum(page.elapsed for page in self.history)
+
+    def record(self, rows: int, bytes: int, elapsed: float) -> int:
+        """Record what was observed for a page requested with :attr:`size`.
+
+        Args:
+            rows: The number of rows received.
+            bytes: The size of the response body.
+            elapsed: The time taken by the request, in seconds.
+        Returns:
+            The size of the next page, also available as :attr:`size`.
+        """
+        size = self.size
+        if rows:
+            self.seconds_per_row = self._smooth(self.seconds_per_row, elapsed / rows)
+            self.bytes_per_row = self._smooth(self.bytes_per_row, bytes / rows)
+            wanted = min(
+                self.target_latency / max(self.seconds_per_row, 1e-9),
+                self.target_bytes / max(self.bytes_per_row, 1e-9),
+                size * self.max_growth,
+            )
+            self.size = self._clamp(int(wanted))
+        self.history.append(PageStats(size, rows, bytes, elapsed, self.size))
+        return self.size
+
+    def _smooth(self, average: Optional[float], value: float) -> float:
+        if average is None:
+            return value
+        return self.smoothing * value + (1 - self.smoothing) * average
+
+    def _clamp(self, size: int) -> int:
+        return max(self.min_size, min(self.max_size, size))
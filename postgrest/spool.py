@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+from codecs import getincrementaldecoder
+from io import BytesIO
+from mmap import ACCESS_READ, mmap
+from tempfile import TemporaryFile
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    Literal,
+    Mapping,
+    Optional,
+    Union,
+)
+
+from httpx import Headers
+
+from .streaming import CSVStreamParser, JSONArrayParser
+
+DEFAULT_SPOOL_THRESHOLD = 64 * 1024 * 1024
+"""Size above which a spooled response body is moved to disk (64 MiB)."""
+
+_READ_SIZE = 1024 * 1024
+
+
+class SpooledBody:
+    """A response body kept in memory up to `threshold` bytes, then spilled
+    to an anonymous temporary file.
+
+    Args:
+        threshold: The number of bytes kept in memory before spilling to disk.
+        directory: The directory of the temporary file, the platform's
+            default temporary directory otherwise.
+    """
+
+    def __init__(
+        self, threshold: int = DEFAULT_SPOOL_THRESHOLD, directory: Optional[str] = None
+    ) -> None:
+        self.threshold = threshold
+        self.directory = directory
+        self.size = 0
+        """The number of bytes written so far."""
+        self._file: IO[bytes] = BytesIO()
+        self._on_disk = False
+        self._map: Optional[mmap] = None
+
+    @property
+    def on_disk(self) -> bool:
+        """Whether the body was spilled to a temporary file."""
+        return self._on_disk
+
+    def write(self, chunk: bytes) -> None:
+        """Append a chunk of the body."""
+        if not self._on_disk and self.size + len(chunk) > self.threshold:
+            file = TemporaryFile(dir=self.directory)
+            file.write(self._file.getbuffer())  # type: ignore[attr-defined]
+            self._file = file
+            self._on_disk = True
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    @property
+    def buffer(self) -> Union[memoryview, mmap]:
+        """The whole body, without copying it: a read-only memory map of the
+        temporary file once spilled to disk, a view of the memory otherwise."""
+        if not self._on_disk:
+            return self._file.getbuffer()  # type: ignore[attr-defined]
+        if self._map is None:
+            self._file.flush()
+            self._map = mmap(self._file.fileno(), 0, access=ACCESS_READ)
+        return self._map
+
+    def iter_bytes(self, chunk_size: int = _READ_SIZE) -> Iterator[bytes]:
+        """Read the body again from the start, in chunks."""
+        buffer = self.buffer
+        for start in range(0, self.size, chunk_size):
+            yield bytes(buffer[start : start + chunk_size])
+
+    def iter_text(self, chunk_size: int = _READ_SIZE) -> Iterator[str]:
+        """Read the body again from the start, decoded from UTF-8, in chunks."""
+        decoder = getincrementaldecoder("utf-8")()
+        for chunk in self.iter_bytes(chunk_size):
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        text = decoder.decode(b"", final=True)
+        if text:
+            yield text
+
+    def close(self) -> None:
+        """Release the memory map and delete the temporary file."""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._on_disk:
+            self._file.close()
+        # views of an in-memory body may still be alive, so it is only dropped
+        self._file = BytesIO()
+        self._on_disk = False
+        self.size = 0
+
+
+class SpooledAPIResponse:
+    """A response whose body was spooled to a :class:`SpooledBody` as it was
+    received, returned by ``execute(spool=...)``.
+
+    The rows are decoded one by one when iterating, so the result never has
+    to fit in memory. Like :class:`RawAPIResponse`, the rows are not
+    validated. The temporary file is deleted by :meth:`close`, or when
+    leaving the ``with`` block.
+
+    Example:
+        .. code-block:: python
+
+            with await query.execute(spool=64 * 1024 * 1024) as response:
+                for row in response:
+                    ...
+    """
+
+    def __init__(
+        self,
+        body: SpooledBody,
+        count: Optional[int],
+        headers: Headers,
+        format: Literal["csv", "text", "json"] = "json",
+    ) -> None:
+        self.body = body
+        """The spooled body of the response."""
+        self.count = count
+        """The number of rows returned."""
+        self.headers = headers
+        """The headers of the HTTP response."""
+        self.format = format
+        """The format of the body, `json`, `csv` or `text` for query plans."""
+
+    def __repr__(self) -> str:
+        return (
+            f"{type(self).__name__}(size={self.body.size!r},"
+            f" on_disk={self.body.on_disk!r}, count={self.count!r})"
+        )
+
+    def __enter__(self) -> SpooledAPIResponse:
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[Any]:
+        return self.rows()
+
+    @property
+    def buffer(self) -> Union[memoryview, mmap]:
+        """The raw body, memory-mapped once it was spilled to disk."""
+        return self.body.buffer
+
+    def rows(
+        self, converters: Optional[Mapping[str, Callable[[str], Any]]] = None
+    ) -> Iterator[Any]:
+        """Iterate over the rows of the body.
+
+        Args:
+            converters: For CSV bodies, functions converting the values of
+                some columns, by column name.
+        Yields:
+            The rows of a JSON body as-is, the rows of a CSV body as dictionaries.
+        Raises:
+            :class:`ValueError` If the body is a query plan in text format.
+        """
+        if self.format == "csv":
+            yield from self._csv_rows(converters)
+        elif self.format == "json":
+            if not self.body.size:
+                return
+            parser = JSONArrayParser()
+            for text in self.body.iter_text():
+                yield from parser.feed(text)
+            yield from parser.close()
+        else:
+            raise ValueError("The body of a text query plan has no rows")
+
+    def _csv_rows(
+        self, converters: Optional[Mapping[str, Callable[[str], Any]]]
+    ) -> Iterator[Dict[str, Any]]:
+        parser = CSVStreamParser(converters)
+        for text in self.body.iter_text():
+            for row in parser.feed(text):
+                yield dict(zip(parser.columns, row))  # type: ignore[arg-type]
+        for row in parser.close():
+            yield dict(zip(parser.columns, row))  # type: ignore[arg-type]
+
+    def close(self) -> None:
+        """Delete the spooled body."""
+        self.body.close()
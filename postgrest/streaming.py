@@ -0,0 +1,484 @@
+from __future__ import annotations
+
+from csv import reader
+from io import StringIO
+from json import JSONDecodeError, JSONDecoder
+from re import compile
+from typing import Any, Callable, Iterator, List, Mapping, Optional, Tuple
+
+from .codec import JSONCodec
+
+_WHITESPACE = compile(r"[ \t\n\r]*")
+# what the end of an element is looked for with, see JSONArrayParser._scan
+_STRUCTURE = compile(r'["{}\[\]]')
+_STRING_END = compile(r'["\\]')
+_SCALAR_END = compile(r"[,\] \t\n\r]")
+
+# parser states
+_START = 0
+_FIRST_VALUE = 1
+_VALUE = 2
+_SEPARATOR = 3
+_END = 4
+
+
+class JSONArrayParser:
+    """Incremental parser for the elements of a top-level JSON array.
+
+    Text chunks are fed as they arrive from the network and every element
+    that has been completely received is returned. Only the bytes of the
+    element currently being received are kept in memory, and every chunk is
+    scanned once, however large the elements.
+
+    Example:
+        .. code-block:: python
+
+            parser = JSONArrayParser()
+            for chunk in chunks:
+                for row in parser.feed(chunk):
+                    ...
+            parser.close()
+    """
+
+    def __init__(self) -> None:
+        self._decoder = JSONDecoder()
+        self._state = _START
+        # the chunks of the element being received, and where its scan is
+        self._pending: List[str] = []
+        self._scalar = False
+        self._depth = 0
+        self._in_string = False
+        self._skip = 0
+
+    def feed(self, chunk: str) -> List[Any]:
+        """Feed a chunk of text to the parser.
+
+        Args:
+            chunk: The next piece of the JSON document.
+        Returns:
+            The elements that were completed by this chunk.
+        Raises:
+            :class:`json.JSONDecodeError` If the document is not a JSON array.
+        """
+        if self._pending:
+            self._pending.append(chunk)
+            if not self._scan(chunk):
+                return []
+            chunk = "".join(self._pending)
+            self._pending = []
+        return self._parse(chunk, final=False)
+
+    def close(self) -> List[Any]:
+        """Signal the end of the document.
+
+        Returns:
+            The elements that were still pending.
+        Raises:
+            :class:`json.JSONDecodeError` If the document is truncated.
+        """
+        buffer = "".join(self._pending)
+        self._pending = []
+        items = self._parse(buffer, final=True)
+        if self._state != _END:
+            raise JSONDecodeError("Unterminated JSON array", buffer, len(buffer))
+        return items
+
+    def _parse(self, buffer: str, final: bool) -> List[Any]:
+        items: List[Any] = []
+        pos = 0
+        end = len(buffer)
+        while True:
+            pos = _WHITESPACE.match(buffer, pos).end()  # type: ignore
+            if pos == end:
+                break
+            char = buffer[pos]
+            if self._state == _START:
+                if char != "[":
+                    raise JSONDecodeError("Expecting '['", buffer, pos)
+                self._state = _FIRST_VALUE
+                pos += 1
+            elif self._state == _FIRST_VALUE and char == "]":
+                self._state = _END
+                pos += 1
+            elif self._state in (_FIRST_VALUE, _VALUE):
+                scalar = char not in '{["'
+                if scalar and not final:
+                    # a number or a literal may have been cut anywhere, as
+                    # in `1.` of `1.5`: wait for what follows it
+                    delimiter = _SCALAR_END.search(buffer, pos)
+                    if delimiter is None:
+                        self._wait(buffer, pos, scalar)
+                        break
+                try:
+                    value, value_end = self._decoder.raw_decode(buffer, pos)
+                except JSONDecodeError:
+                    if final or scalar or self._wait(buffer, pos, scalar):
+                        raise
+                    # the element has not been fully received yet
+                    break
+                if scalar and not final and value_end != delimiter.start():
+                    raise JSONDecodeError("Expecting ',' delimiter", buffer, value_end)
+                items.append(value)
+                self._state = _SEPARATOR
+                pos = value_end
+            elif self._state == _SEPARATOR:
+                if char == ",":
+                    self._state = _VALUE
+                elif char == "]":
+                    self._state = _END
+                else:
+                    raise JSONDecodeError("Expecting ',' delimiter", buffer, pos)
+                pos += 1
+            else:
+                raise JSONDecodeError("Extra data", buffer, pos)
+        return items
+
+    def _wait(self, buffer: str, pos: int, scalar: bool) -> bool:
+        """Keep the start of an element that has not been fully received.
+
+        Returns:
+            Whether the element is complete after all, which makes it
+            invalid since it could not be decoded.
+        """
+        self._pending = [buffer[pos:]]
+        self._scalar = scalar
+        self._depth = 0
+        self._in_string = False
+        self._skip = 0
+        return self._scan(buffer, pos)
+
+    def _scan(self, text: str, pos: int = 0) -> bool:
+        """Look for the end of the pending element in `text`, resuming the
+        scan of the previous chunks.
+
+        Returns:
+            Whether the end of the element was found.
+        """
+        if self._scalar:
+            return _SCALAR_END.search(text, pos) is not None
+        pos += self._skip
+        self._skip = 0
+        end = len(text)
+        while pos < end:
+            if self._in_string:
+                match = _STRING_END.search(text, pos)
+                if match is None:
+                    return False
+                if match.group() == "\\":
+                    # the escaped character may be in the next chunk
+                    pos = match.end() + 1
+                    continue
+                self._in_string = False
+            else:
+                match = _STRUCTURE.search(text, pos)
+                if match is None:
+                    return False
+                char = match.group()
+                if char == '"':
+                    self._in_string = True
+                elif char in "{[":
+                    self._depth += 1
+                else:
+                    self._depth -= 1
+            pos = match.end()
+            if not self._in_string and self._depth == 0:
+                return True
+        self._skip = pos - end
+        return False
+
+
+class JSONArrayEncoder:
+    """Incremental encoder of a top-level JSON array, the counterpart of
+    :class:`JSONArrayParser` for request bodies.
+
+    Rows are encoded one by one as they are fed, and the encoded bytes are
+    handed out in chunks of about `chunk_size` bytes, so that a body can be
+    streamed without ever being held in memory as a whole.
+
+    Args:
+        json_codec: The codec encoding every row.
+        chunk_size: The size above which the encoded rows are handed out.
+
+    Example:
+        .. code-block:: python
+
+            encoder = JSONArrayEncoder(codec)
+            for row in rows:
+                chunk = encoder.feed(row)
+                if chunk:
+                    send(chunk)
+            send(encoder.close())
+    """
+
+    def __init__(self, json_codec: JSONCodec, chunk_size: int = 64 * 1024) -> None:
+        self.json_codec = json_codec
+        self.chunk_size = chunk_size
+        self.rows = 0
+        """The number of rows encoded so far."""
+        self._parts: List[bytes] = [b"["]
+        self._size = 1
+
+    def feed(self, row: Any) -> bytes:
+        """Encode a row.
+
+        Returns:
+            The bytes encoded so far once they reach `chunk_size`, `b""`
+            otherwise.
+        """
+        if self.rows:
+            self._parts.append(b",")
+            self._size += 1
+        encoded = self.json_codec.dumps(row)
+        self._parts.append(encoded)
+        self._size += len(encoded)
+        self.rows += 1
+        if self._size < self.chunk_size:
+            return b""
+        return self._flush()
+
+    def close(self) -> bytes:
+        """Signal the end of the array.
+
+        Returns:
+            The bytes that were still pending, closing the array.
+        """
+        self._parts.append(b"]")
+        return self._flush()
+
+    def _flush(self) -> bytes:
+        chunk = b"".join(self._parts)
+        self._parts = []
+        self._size = 0
+        return chunk
+
+
+class CSVStreamParser:
+    """Incremental parser for CSV documents.
+
+    Text chunks are fed as they arrive from the network; records are only
+    parsed once they have been completely received, including the ones
+    holding line breaks inside quoted fields. The first record is the
+    header and is exposed by :attr:`columns`.
+
+    Args:
+        converters: Functions converting the values of some columns, by
+            column name. Empty values of these columns are converted to `None`.
+    """
+
+    def __init__(
+        self, converters: Optional[Mapping[str, Callable[[str], Any]]] = None
+    ) -> None:
+        self.columns: Optional[List[str]] = None
+        """The names of the columns, once the header has been received."""
+        self._converters = converters or {}
+        self._row_converters: List[Optional[Callable[[str], Any]]] = []
+        self._buffer = ""
+        # position up to which the buffer was scanned for quotes,
+        # and whether that position is inside a quoted field
+        self._scanned = 0
+        self._quoted = False
+
+    def split(self, chunk: str) -> str:
+        """Feed a chunk of text to the parser without parsing it.
+
+        Returns:
+            The text of the records completed by this chunk; it is either
+            empty or ends with a line break.
+        """
+        buffer = self._buffer + chunk
+        boundary = -1
+        pos = self._scanned
+        quoted = self._quoted
+        while True:
+            quote = buffer.find('"', pos)
+            if not quoted:
+                line_break = buffer.rfind(
+                    "\n", pos, len(buffer) if quote == -1 else quote
+                )
+                if line_break != -1:
+                    boundary = line_break
+            if quote == -1:
+                break
+            # escaped quotes are doubled, so they don't change the parity
+            quoted = not quoted
+            pos = quote + 1
+        self._quoted = quoted
+        self._buffer = buffer[boundary + 1 :]
+        self._scanned = len(self._buffer)
+        return buffer[: boundary + 1]
+
+    def feed(self, chunk: str) -> List[List[Any]]:
+        """Feed a chunk of text to the parser.
+
+        Returns:
+            The rows completed by this chunk, without the header.
+        """
+        return self._parse(self.split(chunk))
+
+    def flush(self) -> str:
+        """Signal the end of the document without parsing it.
+
+        Returns:
+            The text of the last record, if the document doesn't end with a
+            line break.
+        """
+        rest, self._buffer, self._scanned, self._quoted = self._buffer, "", 0, False
+        return rest
+
+    def close(self) -> List[List[Any]]:
+        """Signal the end of the document.
+
+        Returns:
+            The last row, if the document doesn't end with a line break.
+        """
+        return self._parse(self.flush())
+
+    def _parse(self, text: str) -> List[List[Any]]:
+        if not text:
+            return []
+        rows = list(reader(StringIO(text, newline="")))
+        if self.columns is None:
+            self.columns = rows.pop(0)
+            self._row_converters = [self._converters.get(c) for c in self.columns]
+        if not self._converters:
+            return rows
+        converters = self._row_converters
+        return [
+            [
+                (None if value == "" else convert(value)) if convert else value
+                for convert, value in zip(converters, row)
+            ]
+            for row in rows
+        ]
+
+
+class CSVChunker:
+    """Split a CSV document, received as bytes, into chunks of whole records.
+
+    Every chunk starts with the header of the document, so that it can be
+    sent as a CSV document on its own. Line breaks inside quoted fields
+    don't end a record. Quotes and line breaks are ASCII, so the document
+    is split without being decoded.
+
+    Args:
+        max_rows: The maximum number of records of a chunk, header excluded.
+        max_bytes: The maximum size of a chunk, header included. A record
+            larger than that by itself is sent alone.
+    """
+
+    def __init__(
+        self, max_rows: Optional[int] = None, max_bytes: Optional[int] = None
+    ) -> None:
+        if max_rows is not None and max_rows < 1:
+            raise ValueError("max_rows must be positive")
+        if max_bytes is not None and max_bytes < 1:
+            raise ValueError("max_bytes must be positive")
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.header: Optional[bytes] = None
+        """The first record of the document, once received."""
+        self._buffer = bytearray()
+        # the start of the chunk being built, the end of its last record,
+        # and its number of records
+        self._start = 0
+        self._boundary = 0
+        self._rows = 0
+        # position up to which the buffer was scanned, and whether that
+        # position is inside a quoted field
+        self._scanned = 0
+        self._quoted = False
+
+    def feed(self, data: bytes) -> List[Tuple[int, bytes]]:
+        """Feed a part of the document.
+
+        Returns:
+            The chunks completed by this part, with their number of records.
+        """
+        self._buffer += data
+        chunks: List[Tuple[int, bytes]] = []
+        for end in self._record_ends():
+            if self.header is None:
+                self.header = bytes(self._buffer[:end])
+                self._start = self._boundary = end
+                continue
+            if (
+                self.max_bytes is not None
+                and self._rows
+                and len(self.header) + end - self._start > self.max_bytes
+            ):
+                chunks.append(self._cut())
+            self._rows += 1
+            self._boundary = end
+            if self.max_rows is not None and self._rows >= self.max_rows:
+                chunks.append(self._cut())
+        # drop the records handed out
+        del self._buffer[: self._start]
+        self._scanned -= self._start
+        self._boundary -= self._start
+        self._start = 0
+        return chunks
+
+    def close(self) -> List[Tuple[int, bytes]]:
+        """Signal the end of the document.
+
+        Returns:
+            The last chunks, the last record possibly lacking a line break.
+        """
+        chunks: List[Tuple[int, bytes]] = []
+        if self.header is None:
+            self.header, self._buffer = bytes(self._buffer), bytearray()
+            return chunks
+        if (
+            len(self._buffer) > self._boundary
+            and self._buffer[self._boundary :].strip()
+        ):
+            if (
+                self.max_bytes is not None
+                and self._rows
+                and len(self.header) + len(self._buffer) - self._start > self.max_bytes
+            ):
+                chunks.append(self._cut())
+            self._rows += 1
+            self._boundary = len(self._buffer)
+        if self._rows:
+            chunks.append(self._cut())
+        self._buffer = bytearray()
+        self._start = self._boundary = self._scanned = 0
+        self._quoted = False
+        return chunks
+
+    def _cut(self) -> Tuple[int, bytes]:
+        chunk = (
+            self._rows,
+            self.header + self._buffer[self._start : self._boundary],  # type: ignore[operator]
+        )
+        self._start = self._boundary
+        self._rows = 0
+        return chunk
+
+    def _record_ends(self) -> Iterator[int]:
+        buffer = self._buffer
+        pos = self._scanned
+        size = len(buffer)
+        while pos < size:
+            quote = buffer.find(b'"', pos)
+            if self._quoted:
+                if quote == -1:
+                    pos = size
+                    break
+                # escaped quotes are doubled, so they don't change the parity
+                self._quoted = False
+                pos = quote + 1
+                continue
+            end = size if quote == -1 else quote
+            line_break = buffer.find(b"\n", pos, end)
+            while line_break != -1:
+                self._scanned = line_break + 1
+                yield line_break + 1
+                line_break = buffer.find(b"\n", line_break + 1, end)
+            if quote == -1:
+                pos = size
+                break
+            self._quoted = True
+            pos = quote + 1
+        self._scanned = pos
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from typing import Any, Type, TypeVar, cast, get_origin
+from functools import cache, partial
+from typing import Any, Callable, List, Type, TypeVar, cast, get_origin
 from urllib.parse import urlparse
 
 from deprecation import deprecated
@@ -10,6 +11,20 @@ from pydantic import BaseModel
 
 from .version import __version__
 
+try:
+    # >= 2.0.0
+    from pydantic import TypeAdapter
+except ImportError:
+    # < 2.0.0
+    from pydantic import parse_raw_as
+
+    TypeAdapter = None  # type: ignore
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None  # type: ignore
+
 
 class SyncClient(BaseClient):
     @deprecated(
@@ -70,3 +85,24 @@ def model_validate_json(model: Type[TBaseModel], contents) -> TBaseModel:
     except AttributeError:
         # pydantic < 2
         return model.parse_raw(contents)
+
+
+@cache
+def json_model_decoder(model: Type[Any], many: bool) -> Callable[[bytes], Any]:
+    """Build a function decoding a JSON document straight into instances of
+    `model` (or a list of them when `many` is set), without going through
+    intermediate dictionaries.
+
+    msgspec is used for `msgspec.Struct` models, pydantic for everything else.
+    """
+    typ = List[model] if many else model  # type: ignore[valid-type]
+    if (
+        msgspec is not None
+        and isinstance(model, type)
+        and issubclass(model, msgspec.Struct)
+    ):
+        return msgspec.json.Decoder(typ).decode
+    if TypeAdapter is not None:
+        return TypeAdapter(typ).validate_json
+    # pydantic < 2
+    return partial(parse_raw_as, typ)
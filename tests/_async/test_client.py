@@ -7,15 +7,26 @@ from httpx import (
     BasicAuth,
     Headers,
     Limits,
+    MockTransport,
     Request,
     Response,
     Timeout,
 )
+from pydantic import BaseModel
 
-from postgrest import AsyncPostgrestClient
+from postgrest import (
+    AsyncPostgrestClient,
+    Compression,
+    CountCache,
+    StdlibJSONCodec,
+)
 from postgrest.exceptions import APIError
 
 
+class Point(BaseModel):
+    x: int
+
+
 @pytest.fixture
 async def postgrest_client():
     async with AsyncPostgrestClient("https://example.com") as client:
@@ -107,6 +118,104 @@ def test_schema(postgrest_client: AsyncPostgrestClient):
     assert subheaders.items() < dict(session.headers).items()
 
 
+@pytest.mark.asyncio
+async def test_json_codec():
+    codec = StdlibJSONCodec()
+    async with AsyncPostgrestClient("https://example.com", json_codec=codec) as client:
+        assert client.from_("test").json_codec is codec
+        assert client.from_("test").select("a").single().json_codec is codec
+        assert client.rpc("foo", {"a": 1}).json_codec is codec
+        assert client.schema("private").json_codec is codec
+
+
+@pytest.mark.asyncio
+async def test_count_cache():
+    cache = CountCache()
+    async with AsyncPostgrestClient("https://example.com", count_cache=cache) as client:
+        assert client.from_("test").select("a").count_cache is cache
+        assert client.schema("private").count_cache is cache
+
+
+@pytest.mark.asyncio
+async def test_compression():
+    compression = Compression(threshold=0)
+    async with AsyncPostgrestClient(
+        "https://example.com", compression=compression
+    ) as client:
+        assert client.session.headers["Accept-Encoding"].startswith("gzip")
+        assert client.from_("test").insert({"a": 1}).compression is compression
+        assert client.rpc("foo", {"a": 1}).compression is compression
+        assert client.schema("private").compression is compression
+    async with AsyncPostgrestClient("https://example.com") as client:
+        assert client.from_("test").insert({"a": 1}).compression is None
+
+
+@pytest.mark.asyncio
+async def test_rpc_returns_models():
+    transport = MockTransport(lambda request: Response(200, json=[{"x": 1}, {"x": 2}]))
+    http_client = AsyncClient(transport=transport)
+    async with AsyncPostgrestClient(
+        "https://example.com", http_client=http_client
+    ) as client:
+        result = await client.rpc("points", {}).returns(Point).execute()
+    assert result.data == [Point(x=1), Point(x=2)]
+
+
+@pytest.mark.asyncio
+async def test_rpc_in_sends_keys_in_body():
+    requests = []
+
+    def handler(request: Request) -> Response:
+        requests.append(request)
+        return Response(200, json=[{"id": 2, "name": "b"}])
+
+    http_client = AsyncClient(transport=MockTransport(handler))
+    async with AsyncPostgrestClient(
+        "https://example.com", http_client=http_client
+    ) as client:
+        result = await (
+            client.rpc_in("users_by_id", range(100_000), params={"active": True})
+            .select("id", "name")
+            .gt("id", 1)
+            .order("name")
+            .limit(10)
+            .execute()
+        )
+    assert result.data == [{"id": 2, "name": "b"}]
+    (request,) = requests
+    assert request.method == "POST"
+    assert request.url.path == "/rpc/users_by_id"
+    assert request.url.params["id"] == "gt.1"
+    assert request.url.params["order"] == "name.asc"
+    assert request.url.params["limit"] == "10"
+    assert len(str(request.url)) < 200
+    body = client.json_codec.loads(request.content)
+    assert body["active"] is True
+    assert body["keys"] == list(range(100_000))
+
+
+def test_rpc_in_sql():
+    sql = AsyncPostgrestClient.rpc_in_sql(
+        "users_by_id", "users", "user_id", "uuid", param="ids", schema="app"
+    )
+    assert sql == (
+        'create or replace function "app"."users_by_id"("ids" uuid[])\n'
+        'returns setof "app"."users"\n'
+        "language sql\n"
+        "stable\n"
+        "as $$\n"
+        '  select * from "app"."users"\n'
+        '  where "user_id" = any("users_by_id"."ids")\n'
+        "$$;\n"
+    )
+    assert '"we""ird"' in AsyncPostgrestClient.rpc_in_sql("f", 'we"ird')
+    assert "numeric(10, 2)[]" in AsyncPostgrestClient.rpc_in_sql(
+        "f", "t", key_type="numeric(10, 2)"
+    )
+    with pytest.raises(ValueError):
+        AsyncPostgrestClient.rpc_in_sql("f", "t", key_type="int); drop table t; --")
+
+
 @pytest.mark.asyncio
 async def test_params_purged_after_execute(postgrest_client: AsyncPostgrestClient):
     assert len(postgrest_client.session.params) == 0
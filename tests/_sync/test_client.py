@@ -7,15 +7,26 @@ from httpx import (
     Headers,
     HTTPTransport,
     Limits,
+    MockTransport,
     Request,
     Response,
     Timeout,
 )
+from pydantic import BaseModel
 
-from postgrest import SyncPostgrestClient
+from postgrest import (
+    Compression,
+    CountCache,
+    StdlibJSONCodec,
+    SyncPostgrestClient,
+)
 from postgrest.exceptions import APIError
 
 
+class Point(BaseModel):
+    x: int
+
+
 @pytest.fixture
 def postgrest_client():
     with SyncPostgrestClient("https://example.com") as client:
@@ -105,6 +116,93 @@ def test_schema(postgrest_client: SyncPostgrestClient):
     assert subheaders.items() < dict(session.headers).items()
 
 
+def test_json_codec():
+    codec = StdlibJSONCodec()
+    with SyncPostgrestClient("https://example.com", json_codec=codec) as client:
+        assert client.from_("test").json_codec is codec
+        assert client.from_("test").select("a").single().json_codec is codec
+        assert client.rpc("foo", {"a": 1}).json_codec is codec
+        assert client.schema("private").json_codec is codec
+
+
+def test_count_cache():
+    cache = CountCache()
+    with SyncPostgrestClient("https://example.com", count_cache=cache) as client:
+        assert client.from_("test").select("a").count_cache is cache
+        assert client.schema("private").count_cache is cache
+
+
+def test_compression():
+    compression = Compression(threshold=0)
+    with SyncPostgrestClient("https://example.com", compression=compression) as client:
+        assert client.session.headers["Accept-Encoding"].startswith("gzip")
+        assert client.from_("test").insert({"a": 1}).compression is compression
+        assert client.rpc("foo", {"a": 1}).compression is compression
+        assert client.schema("private").compression is compression
+    with SyncPostgrestClient("https://example.com") as client:
+        assert client.from_("test").insert({"a": 1}).compression is None
+
+
+def test_rpc_returns_models():
+    transport = MockTransport(lambda request: Response(200, json=[{"x": 1}, {"x": 2}]))
+    http_client = Client(transport=transport)
+    with SyncPostgrestClient("https://example.com", http_client=http_client) as client:
+        result = client.rpc("points", {}).returns(Point).execute()
+    assert result.data == [Point(x=1), Point(x=2)]
+
+
+def test_rpc_in_sends_keys_in_body():
+    requests = []
+
+    def handler(request: Request) -> Response:
+        requests.append(request)
+        return Response(200, json=[{"id": 2, "name": "b"}])
+
+    http_client = Client(transport=MockTransport(handler))
+    with SyncPostgrestClient("https://example.com", http_client=http_client) as client:
+        result = (
+            client.rpc_in("users_by_id", range(100_000), params={"active": True})
+            .select("id", "name")
+            .gt("id", 1)
+            .order("name")
+            .limit(10)
+            .execute()
+        )
+    assert result.data == [{"id": 2, "name": "b"}]
+    (request,) = requests
+    assert request.method == "POST"
+    assert request.url.path == "/rpc/users_by_id"
+    assert request.url.params["id"] == "gt.1"
+    assert request.url.params["order"] == "name.asc"
+    assert request.url.params["limit"] == "10"
+    assert len(str(request.url)) < 200
+    body = client.json_codec.loads(request.content)
+    assert body["active"] is True
+    assert body["keys"] == list(range(100_000))
+
+
+def test_rpc_in_sql():
+    sql = SyncPostgrestClient.rpc_in_sql(
+        "users_by_id", "users", "user_id", "uuid", param="ids", schema="app"
+    )
+    assert sql == (
+        'create or replace function "app"."users_by_id"("ids" uuid[])\n'
+        'returns setof "app"."users"\n'
+        "language sql\n"
+        "stable\n"
+        "as $$\n"
+        '  select * from "app"."users"\n'
+        '  where "user_id" = any("users_by_id"."ids")\n'
+        "$$;\n"
+    )
+    assert '"we""ird"' in SyncPostgrestClient.rpc_in_sql("f", 'we"ird')
+    assert "numeric(10, 2)[]" in SyncPostgrestClient.rpc_in_sql(
+        "f", "t", key_type="numeric(10, 2)"
+    )
+    with pytest.raises(ValueError):
+        SyncPostgrestClient.rpc_in_sql("f", "t", key_type="int); drop table t; --")
+
+
 def test_params_purged_after_execute(postgrest_client: SyncPostgrestClient):
     assert len(postgrest_client.session.params) == 0
     with pytest.raises(APIError):
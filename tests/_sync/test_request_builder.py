@@ -1,11 +1,40 @@
-from typing import Any, Dict, List
+import json
+import re
+import time
+import zlib
+from array import array
+from datetime import datetime
+from decimal import Decimal
+from io import BytesIO, StringIO
+from types import MappingProxyType
+from typing import Any, Dict, List, Optional
+from uuid import UUID
 
 import pytest
-from httpx import Client, Request, Response
+from httpx import Client, MockTransport, QueryParams, Request, Response
+from pydantic import BaseModel, ValidationError
 
 from postgrest import SyncRequestBuilder, SyncSingleRequestBuilder
-from postgrest.base_request_builder import APIResponse, SingleAPIResponse
-from postgrest.types import CountMethod
+from postgrest.base_request_builder import (
+    APIResponse,
+    LazyAPIResponse,
+    RawAPIResponse,
+    SingleAPIResponse,
+    decode_response_body,
+    in_filter_chunks,
+    largest_in_filter,
+    order_sort_key,
+    response_body_format,
+    split_in_list,
+)
+from postgrest.codec import StdlibJSONCodec
+from postgrest.compression import Compression
+from postgrest.count_cache import CountCache
+from postgrest.exceptions import APIError
+from postgrest.paging import AdaptivePageSize
+from postgrest.spool import SpooledAPIResponse
+from postgrest.types import CountMethod, ReturnMethod
+from postgrest.utils import sanitize_param
 
 
 @pytest.fixture
@@ -128,6 +157,181 @@ class TestInsert:
             '"key1","key2","key3"'.split(",")
         )
 
+    def test_upsert_dedupe(self, request_builder: SyncRequestBuilder):
+        rows = [
+            {"id": 1, "name": "a"},
+            {"id": 2, "name": "b"},
+            {"id": 1, "name": "c"},
+            {"id": None, "name": "d"},
+            {"id": None, "name": "e"},
+        ]
+        builder = request_builder.upsert(rows, on_conflict="id", dedupe=True)
+        assert builder.json == [
+            {"id": 1, "name": "c"},
+            {"id": 2, "name": "b"},
+            {"id": None, "name": "d"},
+            {"id": None, "name": "e"},
+        ]
+        assert builder.collapsed_rows == 1
+
+    def test_upsert_dedupe_with_merge(self, request_builder: SyncRequestBuilder):
+        rows = iter(
+            [
+                {"a": 1, "b": "x", "tags": ["t1"]},
+                {"a": 1, "b": "y", "tags": ["t2"]},
+                {"a": 1, "b": "x", "tags": ["t3"]},
+            ]
+        )
+        builder = request_builder.upsert(
+            rows,
+            on_conflict='a, "b"',
+            dedupe=lambda old, new: {**new, "tags": old["tags"] + new["tags"]},
+        )
+        assert builder.json == [
+            {"a": 1, "b": "x", "tags": ["t1", "t3"]},
+            {"a": 1, "b": "y", "tags": ["t2"]},
+        ]
+        assert builder.collapsed_rows == 1
+        assert builder.params["on_conflict"] == 'a, "b"'
+
+    def test_upsert_dedupe_ignoring_duplicates(
+        self, request_builder: SyncRequestBuilder
+    ):
+        rows = [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}, {"id": 1, "name": "c"}]
+        builder = request_builder.upsert(
+            rows, on_conflict="id", ignore_duplicates=True, dedupe=True
+        )
+        assert builder.json == [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}]
+        assert builder.collapsed_rows == 1
+        with pytest.raises(ValueError):
+            request_builder.upsert(
+                rows,
+                on_conflict="id",
+                ignore_duplicates=True,
+                dedupe=lambda old, new: new,
+            )
+
+    def test_invalid_rows(self, request_builder: SyncRequestBuilder):
+        bodies = [
+            "id=1",
+            b"[]",
+            MappingProxyType({"id": 1}),
+            1,
+            Country(id=1, name="x", iso2="XX"),
+        ]
+        for body in bodies:
+            with pytest.raises(TypeError):
+                request_builder.insert(body)  # type: ignore[arg-type]
+            with pytest.raises(TypeError):
+                request_builder.upsert(body, on_conflict="id", dedupe=True)  # type: ignore[arg-type]
+
+    def test_upsert_dedupe_requires_on_conflict(
+        self, request_builder: SyncRequestBuilder
+    ):
+        with pytest.raises(ValueError):
+            request_builder.upsert([{"id": 1}], dedupe=True)
+        assert request_builder.upsert({"id": 1}).collapsed_rows == 0
+
+    def test_insert_with_columns(self, request_builder: SyncRequestBuilder):
+        builder = request_builder.upsert(
+            [{"key1": "val1"}], columns=["key1", "key2"], on_conflict="key1"
+        )
+        assert builder.params["columns"] == '"key1","key2"'
+        assert builder.params["on_conflict"] == "key1"
+
+    def test_insert_streamed_rows(self):
+        requests: List[Request] = []
+
+        def handler(request: Request) -> Response:
+            requests.append(request)
+            return Response(201, content=request.content)
+
+        def rows():
+            for i in range(3):
+                yield {"id": i}
+
+        with Client(
+            base_url="http://example.com", transport=MockTransport(handler)
+        ) as client:
+            response = (
+                SyncRequestBuilder(client, "/t")
+                .insert(rows(), columns=["id"])
+                .execute()
+            )
+        assert response.data == [{"id": 0}, {"id": 1}, {"id": 2}]
+        assert requests[0].headers["transfer-encoding"] == "chunked"
+        assert requests[0].headers["content-type"] == "application/json"
+        assert requests[0].url.params["columns"] == '"id"'
+
+    def test_insert_streamed_rows_from_iterator(self):
+        requests: List[Request] = []
+
+        def handler(request: Request) -> Response:
+            requests.append(request)
+            return Response(201)
+
+        with Client(
+            base_url="http://example.com", transport=MockTransport(handler)
+        ) as client:
+            (
+                SyncRequestBuilder(client, "/t")
+                .insert(iter([]), returning=ReturnMethod.minimal)
+                .execute()
+            )
+        assert json.loads(requests[0].content) == []
+        assert "columns" not in requests[0].url.params
+
+    def test_insert_csv(self):
+        requests: List[Request] = []
+
+        def handler(request: Request) -> Response:
+            requests.append(request)
+            return Response(201, json=[{"id": 1}, {"id": 2}])
+
+        def document():
+            yield b"id\n1\n"
+            yield b"2\n"
+
+        with Client(
+            base_url="http://example.com", transport=MockTransport(handler)
+        ) as client:
+            builder = SyncRequestBuilder(client, "/t").insert_csv(document())
+            response = builder.execute()
+        assert response.data == [{"id": 1}, {"id": 2}]
+        assert requests[0].content == b"id\n1\n2\n"
+        assert requests[0].headers["content-type"] == "text/csv"
+        assert requests[0].headers["transfer-encoding"] == "chunked"
+        assert "columns" not in requests[0].url.params
+
+    def test_insert_columns(self, request_builder: SyncRequestBuilder):
+        builder = request_builder.insert_columns(
+            [(1, "a"), (2, "b")], ["id", "name"], default_to_null=False
+        )
+        assert builder.headers.get_list("prefer", True) == [
+            "return=representation",
+            "missing=default",
+        ]
+        assert builder.params["columns"] == '"id","name"'
+
+    def test_insert_columns_body(self):
+        requests: List[Request] = []
+
+        def handler(request: Request) -> Response:
+            requests.append(request)
+            return Response(201, content=request.content)
+
+        with Client(
+            base_url="http://example.com", transport=MockTransport(handler)
+        ) as client:
+            builder = SyncRequestBuilder(client, "/t")
+            response = builder.upsert_columns(
+                {"id": array("q", [1, 2]), "name": ["a", None]}, on_conflict="id"
+            ).execute()
+        assert response.data == [{"id": 1, "name": "a"}, {"id": 2, "name": None}]
+        assert requests[0].headers["content-type"] == "application/json"
+        assert requests[0].url.params["on_conflict"] == "id"
+        assert requests[0].url.params["columns"] == '"id","name"'
+
 
 class TestUpdate:
     def test_update(self, request_builder: SyncRequestBuilder):
@@ -490,3 +694,1449 @@ class TestApiResponse:
         )
         assert isinstance(result.data, str)
         assert result.data == csv_api_response
+
+
+class TestStream:
+    def test_stream_yields_rows(self, api_response: List[Dict[str, Any]]):
+        transport = MockTransport(lambda request: Response(200, json=api_response))
+        with Client(base_url="http://example.com", transport=transport) as client:
+            builder = SyncRequestBuilder(client, "/countries").select("*")
+            rows = [row for row in builder.stream(chunk_size=7)]
+        assert rows == api_response
+
+    def test_stream_reads_body_lazily(self):
+        pulled = []
+
+        def body():
+            yield b"["
+            for i in range(100):
+                pulled.append(i)
+                yield f'{"," if i else ""}{{"id": {i}}}'.encode()
+            yield b"]"
+
+        transport = MockTransport(lambda request: Response(200, content=body()))
+        with Client(base_url="http://example.com", transport=transport) as client:
+            builder = SyncRequestBuilder(client, "/countries").select("*")
+            for row in builder.stream():
+                if row["id"] == 2:
+                    break
+        assert len(pulled) < 100
+
+    def test_stream_raises_api_error(self):
+        error = {"message": "denied", "code": "42501", "hint": None, "details": None}
+        transport = MockTransport(lambda request: Response(403, json=error))
+        with Client(base_url="http://example.com", transport=transport) as client:
+            builder = SyncRequestBuilder(client, "/countries").select("*")
+            with pytest.raises(APIError) as exc_info:
+                for _ in builder.stream():
+                    pass
+        assert exc_info.value.code == "42501"
+
+
+class RecordingJSONCodec(StdlibJSONCodec):
+    def __init__(self) -> None:
+        self.calls: List[str] = []
+
+    def dumps(self, obj: Any) -> bytes:
+        self.calls.append("dumps")
+        return super().dumps(obj)
+
+    def loads(self, data: Any) -> Any:
+        self.calls.append("loads")
+        return super().loads(data)
+
+
+class TestJSONCodec:
+    def test_insert_encodes_rich_types(self):
+        requests = []
+
+        def handler(request: Request) -> Response:
+            requests.append(request)
+            return Response(201, json=[{"id": 1}])
+
+        with Client(
+            base_url="http://example.com", transport=MockTransport(handler)
+        ) as client:
+            (
+                SyncRequestBuilder(client, "/events")
+                .insert(
+                    {
+                        "at": datetime(2024, 1, 2, 3, 4, 5),
+                        "amount": Decimal("1.50"),
+                        "uuid": UUID("12345678-1234-5678-1234-567812345678"),
+                    }
+                )
+                .execute()
+            )
+        assert requests[0].headers["content-type"] == "application/json"
+        assert json.loads(requests[0].content) == {
+            "at": "2024-01-02T03:04:05",
+            "amount": "1.50",
+            "uuid": "12345678-1234-5678-1234-567812345678",
+        }
+
+    def test_custom_codec_is_used(self, api_response: List[Dict[str, Any]]):
+        codec = RecordingJSONCodec()
+        transport = MockTransport(lambda request: Response(200, json=api_response))
+        with Client(base_url="http://example.com", transport=transport) as client:
+            builder = SyncRequestBuilder(client, "/countries", codec)
+            result = builder.update({"name": "x"}).eq("id", 1).execute()
+            single = builder.select("*").single().execute()
+        assert result.data == api_response
+        assert single.data == api_response
+        assert codec.calls == ["dumps", "loads", "loads"]
+
+
+class TestRawResponse:
+    def test_from_http_request_response(
+        self, request_response_with_data: Response, api_response: List[Dict[str, Any]]
+    ):
+        result = RawAPIResponse.from_http_request_response(request_response_with_data)
+        assert result.data == api_response
+        assert result.count == 2
+        assert result.headers["content-range"] == "0-1/2"
+        assert not hasattr(result, "__dict__")
+
+    def test_from_http_request_response_with_csv_data(
+        self, request_response_with_csv_data: Response, csv_api_response: str
+    ):
+        result = RawAPIResponse.from_http_request_response(
+            request_response_with_csv_data
+        )
+        assert result.data == csv_api_response
+
+    def test_execute_raw(self, api_response: List[Dict[str, Any]]):
+        transport = MockTransport(
+            lambda request: Response(
+                200, json=api_response, headers={"content-range": "0-1/2"}
+            )
+        )
+        with Client(base_url="http://example.com", transport=transport) as client:
+            builder = SyncRequestBuilder(client, "/countries")
+            result = builder.select("*", count=CountMethod.exact).execute(raw=True)
+            single = builder.select("*").single().execute(raw=True)
+            maybe_single = builder.select("*").maybe_single().execute(raw=True)
+        assert isinstance(result, RawAPIResponse)
+        assert result.data == api_response
+        assert result.count == 2
+        assert isinstance(single, RawAPIResponse)
+        assert isinstance(maybe_single, RawAPIResponse)
+
+
+class TestLazyResponse:
+    def test_from_http_request_response(
+        self, request_response_with_data: Response, api_response: List[Dict[str, Any]]
+    ):
+        codec = RecordingJSONCodec()
+        result = LazyAPIResponse.from_http_request_response(
+            request_response_with_data, codec
+        )
+        assert result.count == 2
+        assert result.headers["content-range"] == "0-1/2"
+        assert not result.is_decoded
+        assert codec.calls == []
+        assert "<not decoded>" in repr(result)
+        assert result.data == api_response
+        assert result.data == api_response
+        assert result.is_decoded
+        assert codec.calls == ["loads"]
+        assert not hasattr(result, "__dict__")
+
+    def test_from_http_request_response_with_csv_data(
+        self, request_response_with_csv_data: Response, csv_api_response: str
+    ):
+        result = LazyAPIResponse.from_http_request_response(
+            request_response_with_csv_data
+        )
+        assert result.content == csv_api_response.encode()
+        assert result.data == csv_api_response
+
+    def test_execute_lazy(self, api_response: List[Dict[str, Any]]):
+        transport = MockTransport(
+            lambda request: Response(
+                200, json=api_response, headers={"content-range": "0-1/2"}
+            )
+        )
+        codec = RecordingJSONCodec()
+        with Client(base_url="http://example.com", transport=transport) as client:
+            builder = SyncRequestBuilder(client, "/countries", codec)
+            result = builder.select("*", count=CountMethod.exact).execute(lazy=True)
+            single = builder.select("*").single().execute(lazy=True)
+            maybe_single = builder.select("*").maybe_single().execute(lazy=True)
+            models = builder.select("*").returns(Country).execute(lazy=True)
+        assert isinstance(result, LazyAPIResponse)
+        assert isinstance(single, LazyAPIResponse)
+        assert isinstance(maybe_single, LazyAPIResponse)
+        assert result.count == 2
+        assert codec.calls == []
+        assert result.data == api_response
+        assert codec.calls == ["loads"]
+        assert isinstance(models.data[0], Country)
+
+    def test_execute_lazy_write(self):
+        transport = MockTransport(
+            lambda request: Response(201, headers={"content-range": "*/3"})
+        )
+        with Client(base_url="http://example.com", transport=transport) as client:
+            builder = SyncRequestBuilder(client, "/countries")
+            result = builder.insert(
+                [{"id": 1}, {"id": 2}, {"id": 3}],
+                count=CountMethod.exact,
+                returning=ReturnMethod.minimal,
+            ).execute(lazy=True)
+        assert result.count == 3
+        assert result.data == []
+
+
+class TestSpool:
+    def test_execute_spooled(self, api_response: List[Dict[str, Any]]):
+        transport = MockTransport(
+            lambda request: Response(
+                200, json=api_response, headers={"content-range": "0-1/2"}
+            )
+        )
+        with Client(base_url="http://example.com", transport=transport) as client:
+            builder = SyncRequestBuilder(client, "/countries")
+            response = builder.select("*", count=CountMethod.exact).execute(spool=16)
+        with response:
+            assert isinstance(response, SpooledAPIResponse)
+            assert response.body.on_disk
+            assert response.count == 2
+            assert json.loads(response.buffer[:]) == api_response
+            assert list(response) == api_response
+
+    def test_execute_spooled_csv(self, csv_api_response: str):
+        transport = MockTransport(lambda request: Response(200, text=csv_api_response))
+        with Client(base_url="http://example.com", transport=transport) as client:
+            builder = SyncRequestBuilder(client, "/countries")
+            response = builder.select("*").csv().execute(spool=1 << 20)
+        with response:
+            assert not response.body.on_disk
+            rows = list(response)
+        assert rows == [{"id": "1", "name": "foo"}]
+
+    def test_execute_spooled_error(self):
+        transport = MockTransport(
+            lambda request: Response(400, json={"message": "bad", "code": "400"})
+        )
+        with Client(base_url="http://example.com", transport=transport) as client:
+            builder = SyncRequestBuilder(client, "/countries")
+            with pytest.raises(APIError):
+                builder.select("*").execute(spool=0)
+
+
+def paged_transport(rows: List[Dict[str, Any]], requests: List[Request]):
+    def handler(request: Request) -> Response:
+        requests.append(request)
+        params = request.url.params
+        after = params.get("id")
+        selected = [row for row in rows if after is None or row["id"] > int(after[3:])]
+        return Response(200, json=selected[: int(params["limit"])])
+
+    return MockTransport(handler)
+
+
+class TestPaginate:
+    def test_paginate(self):
+        requests: List[Request] = []
+        rows = [{"id": i} for i in range(1, 6)]
+        with Client(
+            base_url="http://example.com", transport=paged_transport(rows, requests)
+        ) as client:
+            builder = SyncRequestBuilder(client, "/countries")
+            query = builder.select("id", count=CountMethod.exact).eq("kind", "x")
+            pages = [page for page in query.paginate(page_size=2)]
+        assert pages == [rows[0:2], rows[2:4], rows[4:5]]
+        assert [r.url.params.get("id") for r in requests] == [None, "gt.2", "gt.4"]
+        for request in requests:
+            assert request.url.params["kind"] == "eq.x"
+            assert request.url.params["order"] == "id.asc"
+            assert "count" not in request.headers.get("prefer", "")
+
+    def test_paginate_prefetch(self):
+        requests: List[Request] = []
+        rows = [{"id": i} for i in range(1, 21)]
+        with Client(
+            base_url="http://example.com", transport=paged_transport(rows, requests)
+        ) as client:
+            query = SyncRequestBuilder(client, "/countries").select("id")
+            pages = [page for page in query.paginate(page_size=3, prefetch=2)]
+            assert [row for page in pages for row in page] == rows
+            requests.clear()
+            for page in query.paginate(page_size=3, prefetch=2):
+                break
+        assert page == rows[:3]
+        # the first page, at most two pages ahead and the one being fetched
+        assert len(requests) <= 4
+
+    def test_paginate_with_offsets(self):
+        requests: List[Request] = []
+        rows = [{"id": i} for i in range(7)]
+        with Client(
+            base_url="http://example.com",
+            transport=range_transport(rows, requests, reported=7),
+        ) as client:
+            query = SyncRequestBuilder(client, "/countries").select("*")
+            pages = [page for page in query.paginate(None, page_size=3)]
+        assert pages == [rows[0:3], rows[3:6], rows[6:7]]
+        assert [r.url.params["offset"] for r in requests] == ["0", "3", "6"]
+        assert all("order" not in r.url.params for r in requests)
+
+    @pytest.mark.parametrize("key", ["id", None])
+    def test_paginate_adaptive_page_size(self, key):
+        requests: List[Request] = []
+        rows = [{"id": i} for i in range(1, 101)]
+        transport = (
+            paged_transport(rows, requests)
+            if key
+            else range_transport(rows, requests, reported=100)
+        )
+        sizer = AdaptivePageSize(5, min_size=5, max_size=40)
+        with Client(base_url="http://example.com", transport=transport) as client:
+            query = SyncRequestBuilder(client, "/countries").select("id")
+            pages = [page for page in query.paginate(key, page_size=sizer)]
+        assert [row for page in pages for row in page] == rows
+        sizes = [page.size for page in sizer.history]
+        assert sizes[:4] == [5, 10, 20, 40]
+        assert [r.url.params["limit"] for r in requests] == [str(s) for s in sizes]
+        assert sizer.rows == 100
+        assert all(page.bytes > 0 for page in sizer.history)
+
+    def test_paginate_stops_on_empty_page(self):
+        requests: List[Request] = []
+        rows = [{"id": i} for i in range(1, 5)]
+        with Client(
+            base_url="http://example.com", transport=paged_transport(rows, requests)
+        ) as client:
+            builder = SyncRequestBuilder(client, "/countries")
+            pages = [page for page in builder.select("*").paginate("id", 2)]
+        assert pages == [rows[0:2], rows[2:4]]
+        assert len(requests) == 3
+
+    def test_paginate_composite_key_desc(self):
+        requests: List[Request] = []
+
+        def handler(request: Request) -> Response:
+            requests.append(request)
+            if len(requests) == 1:
+                return Response(200, json=[{"day": "2024-01-02", "id": 7}])
+            return Response(200, json=[])
+
+        with Client(
+            base_url="http://example.com", transport=MockTransport(handler)
+        ) as client:
+            builder = SyncRequestBuilder(client, "/events")
+            query = builder.select("*").or_("kind.eq.a,kind.eq.b")
+            pages = [
+                page for page in query.paginate(("day", "id"), page_size=1, desc=True)
+            ]
+        assert len(pages) == 1
+        params = requests[1].url.params
+        assert params["order"] == "day.desc,id.desc"
+        assert params["or"] == "(kind.eq.a,kind.eq.b)"
+        assert params["and"] == (
+            "(or(day.lt.2024-01-02,and(day.eq.2024-01-02,id.lt.7)))"
+        )
+
+    def test_paginate_with_limit(self):
+        with Client(base_url="http://example.com") as client:
+            builder = SyncRequestBuilder(client, "/countries")
+            with pytest.raises(ValueError):
+                for _ in builder.select("*").limit(10).paginate():
+                    pass
+
+    def test_paginate_without_key_column(self):
+        transport = MockTransport(lambda request: Response(200, json=[{"name": "a"}]))
+        with Client(base_url="http://example.com", transport=transport) as client:
+            builder = SyncRequestBuilder(client, "/countries")
+            with pytest.raises(ValueError):
+                for _ in builder.select("name").paginate(page_size=1):
+                    pass
+
+
+def range_transport(
+    rows: List[Dict[str, Any]], requests: List[Request], reported: int
+) -> MockTransport:
+    def handler(request: Request) -> Response:
+        requests.append(request)
+        offset = int(request.url.params["offset"])
+        limit = int(request.url.params["limit"])
+        selected = rows[offset : offset + limit]
+        headers = {}
+        if "count=" in request.headers.get("prefer", ""):
+            headers["content-range"] = (
+                f"{offset}-{offset + len(selected) - 1}/{reported}"
+            )
+        return Response(200, json=selected, headers=headers)
+
+    return MockTransport(handler)
+
+
+class TestFetchParallel:
+    def test_fetch_parallel(self):
+        requests: List[Request] = []
+        rows = [{"id": i} for i in range(10)]
+        with Client(
+            base_url="http://example.com",
+            transport=range_transport(rows, requests, reported=10),
+        ) as client:
+            query = SyncRequestBuilder(client, "/t").select("*").order("id")
+            pages = [page for page in query.fetch_parallel(3, concurrency=2)]
+        assert pages == [rows[0:3], rows[3:6], rows[6:9], rows[9:10]]
+        assert len(requests) == 4
+        assert "count=exact" in requests[0].headers["prefer"]
+        assert all("prefer" not in r.headers for r in requests[1:])
+        assert all(r.url.params["order"] == "id.asc" for r in requests)
+
+    def test_fetch_parallel_arrival_order(self):
+        requests: List[Request] = []
+        rows = [{"id": i} for i in range(10)]
+        with Client(
+            base_url="http://example.com",
+            transport=range_transport(rows, requests, reported=10),
+        ) as client:
+            query = SyncRequestBuilder(client, "/t").select("*")
+            pages = [page for page in query.fetch_parallel(4, ordered=False)]
+        assert sorted(row["id"] for page in pages for row in page) == list(range(10))
+
+    def test_fetch_parallel_with_underestimated_count(self):
+        requests: List[Request] = []
+        rows = [{"id": i} for i in range(10)]
+        with Client(
+            base_url="http://example.com",
+            transport=range_transport(rows, requests, reported=5),
+        ) as client:
+            query = SyncRequestBuilder(client, "/t").select(
+                "*", count=CountMethod.planned
+            )
+            pages = [page for page in query.fetch_parallel(3)]
+        assert [row for page in pages for row in page] == rows
+        assert "count=planned" in requests[0].headers["prefer"]
+
+    def test_fetch_parallel_with_limit(self):
+        with Client(base_url="http://example.com") as client:
+            query = SyncRequestBuilder(client, "/t").select("*").range(0, 9)
+            with pytest.raises(ValueError):
+                for _ in query.fetch_parallel():
+                    pass
+
+
+def filtering_transport(
+    rows: List[Dict[str, Any]], requests: List[Request]
+) -> MockTransport:
+    operators = {
+        "gt": lambda a, b: a > b,
+        "gte": lambda a, b: a >= b,
+        "lt": lambda a, b: a < b,
+        "lte": lambda a, b: a <= b,
+        "eq": lambda a, b: a == b,
+    }
+
+    def handler(request: Request) -> Response:
+        requests.append(request)
+        params = request.url.params
+        selected = rows
+        for column in ("id", "kind"):
+            for condition in params.get_list(column):
+                operator, value = condition.split(".", 1)
+                cast = int if column == "id" else str
+                selected = [
+                    row
+                    for row in selected
+                    if operators[operator](row[column], cast(value))
+                ]
+        selected = sorted(
+            selected, key=lambda row: row["id"], reverse="desc" in params["order"]
+        )
+        return Response(200, json=selected[: int(params["limit"])])
+
+    return MockTransport(handler)
+
+
+class TestScanPartitioned:
+    @pytest.mark.parametrize("partitions", [1, 3, 50])
+    def test_scan_partitioned_in_key_order(self, partitions: int):
+        requests: List[Request] = []
+        rows = [{"id": i, "kind": "a" if i % 3 else "b"} for i in range(3, 40)]
+        with Client(
+            base_url="http://example.com",
+            transport=filtering_transport(rows, requests),
+        ) as client:
+            query = SyncRequestBuilder(client, "/t").select("*").eq("kind", "a")
+            pages = [
+                page
+                for page in query.scan_partitioned(partitions=partitions, page_size=4)
+            ]
+        expected = [row for row in rows if row["kind"] == "a"]
+        assert [row for page in pages for row in page] == expected
+        assert all(len(page) <= 4 for page in pages)
+        assert requests[0].url.params["select"] == "id"
+        assert requests[0].url.params["order"] == "id.asc"
+        assert requests[1].url.params["order"] == "id.desc"
+        for request in requests[2:]:
+            assert request.url.params["kind"] == "eq.a"
+            assert "offset" not in request.url.params
+
+    def test_scan_partitioned_arrival_order(self):
+        requests: List[Request] = []
+        rows = [{"id": i, "kind": "a"} for i in range(100)]
+        with Client(
+            base_url="http://example.com",
+            transport=filtering_transport(rows, requests),
+        ) as client:
+            query = SyncRequestBuilder(client, "/t").select("*")
+            pages = [
+                page
+                for page in query.scan_partitioned(
+                    partitions=4, page_size=10, ordered=False
+                )
+            ]
+        assert sorted(row["id"] for page in pages for row in page) == list(range(100))
+
+    def test_scan_partitioned_uneven_ranges(self):
+        requests: List[Request] = []
+        rows = [{"id": i, "kind": "a"} for i in range(100)]
+        handler = filtering_transport(rows, requests).handler
+
+        def slow_upper_range(request: Request) -> Response:
+            if "gte.49" in request.url.params.get_list("id"):
+                time.sleep(0.05)
+            return handler(request)
+
+        with Client(
+            base_url="http://example.com", transport=MockTransport(slow_upper_range)
+        ) as client:
+            query = SyncRequestBuilder(client, "/t").select("*")
+            pages = [
+                page
+                for page in query.scan_partitioned(
+                    partitions=2, page_size=10, ordered=False
+                )
+            ]
+        assert sorted(row["id"] for page in pages for row in page) == list(range(100))
+        # the key space is split into [0, 49) and [49, 99]
+        lower = [i for i, page in enumerate(pages) if page[0]["id"] < 49]
+        upper = [i for i, page in enumerate(pages) if page[0]["id"] >= 49]
+        # the lower range is not held back by the slow one
+        assert max(lower) < upper[1]
+
+    def test_scan_partitioned_empty_table(self):
+        requests: List[Request] = []
+        with Client(
+            base_url="http://example.com",
+            transport=filtering_transport([], requests),
+        ) as client:
+            query = SyncRequestBuilder(client, "/t").select("*")
+            pages = [page for page in query.scan_partitioned()]
+        assert pages == []
+        assert len(requests) == 1
+
+    def test_scan_partitioned_non_numeric_key(self):
+        transport = MockTransport(lambda request: Response(200, json=[{"id": "a"}]))
+        with Client(base_url="http://example.com", transport=transport) as client:
+            query = SyncRequestBuilder(client, "/t").select("*")
+            with pytest.raises(ValueError):
+                for _ in query.scan_partitioned():
+                    pass
+
+
+def counting_transport(requests: List[Request]) -> MockTransport:
+    def handler(request: Request) -> Response:
+        requests.append(request)
+        match = re.search(r"count=(\w+)", request.headers.get("prefer", ""))
+        if match is None:
+            return Response(200, json=[{"id": 1}])
+        total = {"exact": 100, "planned": 90, "estimated": 95}[match.group(1)]
+        return Response(
+            200, json=[{"id": 1}], headers={"content-range": f"0-0/{total}"}
+        )
+
+    return MockTransport(handler)
+
+
+class TestCountCache:
+    def test_count_served_from_cache(self):
+        requests: List[Request] = []
+        cache = CountCache()
+        with Client(
+            base_url="http://example.com", transport=counting_transport(requests)
+        ) as client:
+            builder = SyncRequestBuilder(client, "/t", count_cache=cache)
+            first = builder.select("*", count=CountMethod.exact).execute()
+            second = builder.select("*", count=CountMethod.exact).limit(1).execute()
+            raw = builder.select("*", count=CountMethod.exact).execute(raw=True)
+            other = builder.select("*", count=CountMethod.exact).eq("id", 1).execute()
+        assert first.count == second.count == raw.count == other.count == 100
+        assert "count=exact" in requests[0].headers["prefer"]
+        assert "prefer" not in requests[1].headers
+        assert "prefer" not in requests[2].headers
+        assert "count=exact" in requests[3].headers["prefer"]
+        assert (cache.hits, cache.misses) == (2, 2)
+
+    def test_planned_count_while_refreshing(self):
+        requests: List[Request] = []
+        cache = CountCache(fallback=CountMethod.planned)
+        with Client(
+            base_url="http://example.com", transport=counting_transport(requests)
+        ) as client:
+            builder = SyncRequestBuilder(client, "/t", count_cache=cache)
+            first = builder.select("*", count=CountMethod.exact).execute()
+            time.sleep(0.05)
+            second = builder.select("*", count=CountMethod.exact).execute()
+        assert first.count == 90
+        assert second.count == 100
+        refresh = next(r for r in requests if r.method == "HEAD")
+        assert "count=exact" in refresh.headers["prefer"]
+
+    @pytest.mark.parametrize("method", ["single", "maybe_single"])
+    def test_single_count_served_from_cache(self, method: str):
+        requests: List[Request] = []
+
+        def handler(request: Request) -> Response:
+            requests.append(request)
+            return Response(200, json={"id": 1}, headers={"content-range": "0-0/100"})
+
+        cache = CountCache()
+        with Client(
+            base_url="http://example.com", transport=MockTransport(handler)
+        ) as client:
+            builder = SyncRequestBuilder(client, "/t", count_cache=cache)
+            for _ in range(2):
+                query = builder.select("*", count=CountMethod.exact).eq("id", 1)
+                response = getattr(query, method)().execute()
+                assert response is not None and response.count == 100
+        assert "count=exact" in requests[0].headers["prefer"]
+        assert "prefer" not in requests[1].headers
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_without_count(self):
+        requests: List[Request] = []
+        cache = CountCache()
+        with Client(
+            base_url="http://example.com", transport=counting_transport(requests)
+        ) as client:
+            builder = SyncRequestBuilder(client, "/t", count_cache=cache)
+            response = builder.select("*").execute()
+        assert response.count is None
+        assert len(cache) == 0
+
+
+class Country(BaseModel):
+    id: int
+    name: str
+    iso2: str
+
+
+class TestReturns:
+    def test_select_returns_models(self, api_response: List[Dict[str, Any]]):
+        transport = MockTransport(
+            lambda request: Response(
+                200, json=api_response, headers={"content-range": "0-1/2"}
+            )
+        )
+        with Client(base_url="http://example.com", transport=transport) as client:
+            builder = SyncRequestBuilder(client, "/countries")
+            result = (
+                builder.select("*", count=CountMethod.exact)
+                .eq("continent", "Americas")
+                .returns(Country)
+                .execute()
+            )
+            raw = builder.select("*").returns(Country).execute(raw=True)
+        assert result.data == [Country(**row) for row in api_response]
+        assert result.count == 2
+        assert raw.data == result.data
+
+    @pytest.mark.parametrize("method", ["single", "maybe_single"])
+    def test_single_returns_model(
+        self, single_api_response: Dict[str, Any], method: str
+    ):
+        transport = MockTransport(
+            lambda request: Response(200, json=single_api_response)
+        )
+        with Client(base_url="http://example.com", transport=transport) as client:
+            builder = SyncRequestBuilder(client, "/countries")
+            after = getattr(builder.select("*"), method)().returns(Country).execute()
+            before = getattr(builder.select("*").returns(Country), method)().execute()
+        assert after is not None and before is not None
+        assert after.data == before.data == Country(**single_api_response)
+
+    def test_returns_invalid_rows(self):
+        transport = MockTransport(lambda request: Response(200, json=[{"id": "x"}]))
+        with Client(base_url="http://example.com", transport=transport) as client:
+            builder = SyncRequestBuilder(client, "/countries").select("*")
+            with pytest.raises(ValidationError):
+                builder.returns(Country).execute()
+
+    def test_returns_empty_body(self):
+        transport = MockTransport(lambda request: Response(201))
+        with Client(base_url="http://example.com", transport=transport) as client:
+            builder = SyncRequestBuilder(client, "/countries")
+            result = (
+                builder.insert(
+                    {"id": 1, "name": "x", "iso2": "XX"},
+                    returning=ReturnMethod.minimal,
+                )
+                .returns(Country)
+                .execute()
+            )
+        assert result.data == []
+
+
+class TestColumnar:
+    def test_execute_columnar(self, api_response: List[Dict[str, Any]]):
+        transport = MockTransport(lambda request: Response(200, json=api_response))
+        with Client(base_url="http://example.com", transport=transport) as client:
+            builder = SyncRequestBuilder(client, "/countries").select("*")
+            columns = builder.execute_columnar(chunk_size=10)
+        assert columns["id"] == array("q", [1, 2])
+        assert columns["iso2"] == ["BQ", "CW"]
+        assert columns["continent"] == [None, None]
+
+
+@pytest.fixture
+def csv_export() -> str:
+    return 'id,name\n1,foo\n2,"bar\nbaz"\n3,qux\n'
+
+
+class TestStreamCSV:
+    @staticmethod
+    def transport(body: str) -> MockTransport:
+        def handler(request: Request) -> Response:
+            assert request.headers["accept"] == "text/csv"
+            return Response(
+                200, text=body, headers={"content-type": "text/csv; charset=utf-8"}
+            )
+
+        return MockTransport(handler)
+
+    def test_stream_csv(self, csv_export: str):
+        with Client(
+            base_url="http://example.com", transport=self.transport(csv_export)
+        ) as client:
+            builder = SyncRequestBuilder(client, "/countries").select("*")
+            rows = [
+                row for row in builder.stream_csv(converters={"id": int}, chunk_size=4)
+            ]
+        assert rows == [
+            {"id": 1, "name": "foo"},
+            {"id": 2, "name": "bar\nbaz"},
+            {"id": 3, "name": "qux"},
+        ]
+
+    def test_stream_csv_chunks(self, csv_export: str):
+        with Client(
+            base_url="http://example.com", transport=self.transport(csv_export)
+        ) as client:
+            builder = SyncRequestBuilder(client, "/countries").select("*")
+            chunks = [chunk for chunk in builder.stream_csv_chunks(5)]
+        assert "".join(chunks) == csv_export
+        assert all(chunk.endswith("\n") for chunk in chunks)
+        assert "bar\nbaz" in "".join(chunk for chunk in chunks if "bar" in chunk)
+
+    def test_write_csv(self, csv_export: str):
+        binary_sink, text_sink = BytesIO(), StringIO()
+        with Client(
+            base_url="http://example.com", transport=self.transport(csv_export)
+        ) as client:
+            builder = SyncRequestBuilder(client, "/countries")
+            written = builder.select("*").write_csv(binary_sink, chunk_size=3)
+            builder.select("*").write_csv(text_sink)
+        assert written == len(csv_export.encode())
+        assert binary_sink.getvalue() == csv_export.encode()
+        assert text_sink.getvalue() == csv_export
+
+    def test_execute_columnar_csv(self, csv_export: str):
+        with Client(
+            base_url="http://example.com", transport=self.transport(csv_export)
+        ) as client:
+            builder = SyncRequestBuilder(client, "/countries").select("*")
+            columns = builder.execute_columnar(csv=True, converters={"id": int})
+        assert columns == {
+            "id": array("q", [1, 2, 3]),
+            "name": ["foo", "bar\nbaz", "qux"],
+        }
+
+
+class TestResponseBody:
+    @pytest.mark.parametrize(
+        "accept, expected",
+        [
+            (None, "json"),
+            ("application/json", "json"),
+            ("application/vnd.pgrst.object+json", "json"),
+            ("text/csv", "csv"),
+            ("application/vnd.pgrst.plan+text; options=analyze", "text"),
+            ("application/vnd.pgrst.plan+json; options=analyze", "json"),
+        ],
+    )
+    def test_response_body_format(self, accept, expected):
+        assert response_body_format(accept) == expected
+
+    @pytest.mark.parametrize(
+        "accept, content, expected",
+        [
+            ("application/json", b'[{"id": 1}]', [{"id": 1}]),
+            ("application/json", b"", []),
+            ("application/json", b"not json", "not json"),
+            ("text/csv", b"id\n1\n", "id\n1\n"),
+            ("text/csv", b"[1]", "[1]"),
+        ],
+    )
+    def test_decode_response_body(self, accept, content, expected):
+        response = Response(
+            200,
+            content=content,
+            request=Request("GET", "http://example.com", headers={"accept": accept}),
+        )
+        assert decode_response_body(response) == expected
+
+    def test_execute_with_text_body(self):
+        transport = MockTransport(lambda request: Response(200, text="Seq Scan"))
+        with Client(base_url="http://example.com", transport=transport) as client:
+            builder = SyncRequestBuilder(client, "/countries").select("*").explain()
+            assert builder.execute() == "Seq Scan"
+
+
+def bulk_transport(
+    requests: List[Request], failures: Dict[int, List[int]]
+) -> MockTransport:
+    """Answer inserts with the rows sent, failing the chunk starting with a
+    given id with the listed statuses first."""
+    attempts: Dict[int, int] = {}
+
+    def handler(request: Request) -> Response:
+        requests.append(request)
+        rows = json.loads(request.content)
+        first = rows[0]["id"]
+        attempt = attempts.get(first, 0)
+        attempts[first] = attempt + 1
+        statuses = failures.get(first, [])
+        if attempt < len(statuses):
+            return Response(statuses[attempt], json={"message": "failed"})
+        headers = {}
+        if "count=exact" in request.headers["prefer"]:
+            headers["content-range"] = f"*/{len(rows)}"
+        if "return=minimal" in request.headers["prefer"]:
+            return Response(201, headers=headers)
+        return Response(201, json=rows, headers=headers)
+
+    return MockTransport(handler)
+
+
+class TestExecuteBulk:
+    def test_execute_bulk(self):
+        requests: List[Request] = []
+        rows = [{"id": i, "name": f"n{i}"} for i in range(10)]
+        with Client(
+            base_url="http://example.com", transport=bulk_transport(requests, {})
+        ) as client:
+            result = (
+                SyncRequestBuilder(client, "/t")
+                .insert(rows, count=CountMethod.exact)
+                .execute_bulk(chunk_rows=4, concurrency=2)
+            )
+        assert result.ok
+        assert result.data == rows
+        assert result.count == 10
+        assert [chunk.rows for chunk in result.chunks] == [4, 4, 2]
+        assert len(requests) == 3
+        for request in requests:
+            assert request.headers["prefer"] == "return=representation,count=exact"
+            assert request.headers["content-type"] == "application/json"
+            assert set(request.url.params["columns"].split(",")) == {'"id"', '"name"'}
+
+    def test_execute_bulk_upsert_keeps_prefer(self):
+        requests: List[Request] = []
+        rows = [{"id": i} for i in range(4)]
+        with Client(
+            base_url="http://example.com", transport=bulk_transport(requests, {})
+        ) as client:
+            result = (
+                SyncRequestBuilder(client, "/t")
+                .upsert(
+                    rows,
+                    returning=ReturnMethod.minimal,
+                    on_conflict="id",
+                    default_to_null=False,
+                )
+                .execute_bulk(chunk_rows=2)
+            )
+        assert result.data == []
+        assert result.count is None
+        assert len(requests) == 2
+        for request in requests:
+            assert request.headers["prefer"] == (
+                "return=minimal,resolution=merge-duplicates,missing=default"
+            )
+            assert request.url.params["on_conflict"] == "id"
+
+    def test_execute_bulk_retries_chunks(self):
+        requests: List[Request] = []
+        rows = [{"id": i} for i in range(6)]
+        transport = bulk_transport(requests, {2: [503, 503], 4: [409]})
+        with Client(base_url="http://example.com", transport=transport) as client:
+            result = (
+                SyncRequestBuilder(client, "/t")
+                .insert(rows)
+                .execute_bulk(chunk_rows=2, retries=2, backoff=0)
+            )
+        assert [chunk.attempts for chunk in result.chunks] == [1, 3, 1]
+        assert not result.ok
+        assert [chunk.start for chunk in result.errors] == [4]
+        assert result.data == rows[:4]
+        assert len(requests) == 5
+        with pytest.raises(APIError):
+            result.raise_for_errors()
+
+    def test_execute_bulk_gives_up_after_retries(self):
+        requests: List[Request] = []
+        transport = bulk_transport(requests, {0: [500, 500, 500]})
+        with Client(base_url="http://example.com", transport=transport) as client:
+            result = (
+                SyncRequestBuilder(client, "/t")
+                .insert([{"id": 0}])
+                .execute_bulk(retries=1, backoff=0)
+            )
+        assert result.chunks[0].attempts == 2
+        assert isinstance(result.chunks[0].error, APIError)
+
+    def test_execute_bulk_by_bytes(self):
+        requests: List[Request] = []
+        rows = [{"id": i, "payload": "x" * 100} for i in range(10)]
+        with Client(
+            base_url="http://example.com", transport=bulk_transport(requests, {})
+        ) as client:
+            result = (
+                SyncRequestBuilder(client, "/t")
+                .insert(rows)
+                .execute_bulk(chunk_rows=None, chunk_bytes=500)
+            )
+        assert result.data == rows
+        assert all(len(request.content) <= 500 for request in requests)
+
+    def test_execute_bulk_columns(self):
+        requests: List[Request] = []
+        with Client(
+            base_url="http://example.com", transport=bulk_transport(requests, {})
+        ) as client:
+            result = (
+                SyncRequestBuilder(client, "/t")
+                .insert_columns({"id": list(range(5)), "name": list("abcde")})
+                .execute_bulk(chunk_rows=2)
+            )
+        assert result.data == [{"id": i, "name": "abcde"[i]} for i in range(5)]
+        assert [chunk.start for chunk in result.chunks] == [0, 2, 4]
+        assert all(r.url.params["columns"] == '"id","name"' for r in requests)
+
+    def test_execute_bulk_csv(self):
+        requests: List[Request] = []
+
+        def handler(request: Request) -> Response:
+            requests.append(request)
+            rows = request.content.count(b"\n") - 1
+            return Response(201, headers={"content-range": f"*/{rows}"})
+
+        document = b"id,name\n" + b"".join(b"%d,n%d\n" % (i, i) for i in range(7))
+        with Client(
+            base_url="http://example.com", transport=MockTransport(handler)
+        ) as client:
+            result = (
+                SyncRequestBuilder(client, "/t")
+                .upsert_csv(
+                    BytesIO(document),
+                    count=CountMethod.exact,
+                    returning=ReturnMethod.minimal,
+                    on_conflict="id",
+                )
+                .execute_bulk(chunk_rows=3, concurrency=2)
+            )
+        assert result.ok
+        assert result.count == 7
+        assert [chunk.rows for chunk in result.chunks] == [3, 3, 1]
+        for request in requests:
+            assert request.headers["content-type"] == "text/csv"
+            assert request.headers["prefer"] == (
+                "return=minimal,count=exact,resolution=merge-duplicates"
+            )
+            assert request.url.params["on_conflict"] == "id"
+            assert request.content.startswith(b"id,name\n")
+        assert b"".join(r.content[8:] for r in requests) == document[8:]
+
+    def test_execute_bulk_requires_a_list(self):
+        with Client(base_url="http://example.com") as client:
+            builder = SyncRequestBuilder(client, "/t")
+            with pytest.raises(ValueError):
+                builder.insert({"id": 1}).execute_bulk()
+            with pytest.raises(ValueError):
+                builder.update({"id": 1}).eq("id", 1).execute_bulk()
+
+
+def update_transport(requests: List[Request]) -> MockTransport:
+    """Answer updates filtered by `id=in.(...)` with the patched rows."""
+
+    def handler(request: Request) -> Response:
+        requests.append(request)
+        ids = request.url.params["id"][len("in.(") : -1].split(",")
+        patch = json.loads(request.content)
+        rows = [{"id": int(i), **patch} for i in ids]
+        headers = {"content-range": f"*/{len(rows)}"}
+        if "return=minimal" in request.headers["prefer"]:
+            return Response(204, headers=headers)
+        return Response(200, json=rows, headers=headers)
+
+    return MockTransport(handler)
+
+
+class TestUpdateMany:
+    def test_in_filter_chunks(self):
+        values = list(range(1000, 1100)) + ["a,b"]
+        chunks = list(in_filter_chunks(values, 60))
+        assert [value for chunk, _ in chunks for value in chunk] == values
+        for chunk, criteria in chunks:
+            assert len(str(QueryParams({"id": criteria}))) - 3 <= 60
+            assert criteria == "in.(" + ",".join(map(sanitize_param, chunk)) + ")"
+        assert chunks[-1][1].endswith(',"a,b")')
+
+    def test_update_many(self):
+        requests: List[Request] = []
+        updates = [(i, {"status": "done"}) for i in range(10)]
+        updates += [(i, {"status": "failed", "retry": True}) for i in range(10, 13)]
+        updates.append((3, {"retry": True, "status": "failed"}))
+        with Client(
+            base_url="http://example.com", transport=update_transport(requests)
+        ) as client:
+            result = SyncRequestBuilder(client, "/tasks").update_many(
+                updates, count=CountMethod.exact
+            )
+        assert result.ok
+        assert len(requests) == 2
+        assert requests[0].method == "PATCH"
+        assert requests[0].url.params["id"] == "in.(0,1,2,4,5,6,7,8,9)"
+        assert requests[1].url.params["id"] == "in.(10,11,12,3)"
+        assert json.loads(requests[1].content) == {"retry": True, "status": "failed"}
+        assert "count=exact" in requests[0].headers["prefer"]
+        assert result.count == 13
+        assert sorted(row["id"] for row in result.data) == list(range(13))
+        assert [chunk.start for chunk in result.chunks] == [0, 10]
+
+    def test_update_many_merges_repeated_keys(self):
+        requests: List[Request] = []
+        updates = [(1, {"a": 1}), (2, {"a": 1, "b": 2}), (1, {"b": 2})]
+        updates += [(3, {"a": 1, "b": 1}), (3, {"b": 2})]
+        with Client(
+            base_url="http://example.com", transport=update_transport(requests)
+        ) as client:
+            result = SyncRequestBuilder(client, "/tasks").update_many(updates)
+        assert result.ok
+        (request,) = requests
+        assert request.url.params["id"] == "in.(2,1,3)"
+        assert json.loads(request.content) == {"a": 1, "b": 2}
+
+    def test_update_many_splits_long_urls(self):
+        requests: List[Request] = []
+        updates = [(i, {"status": "done"}) for i in range(10_000, 12_000)]
+        with Client(
+            base_url="http://example.com", transport=update_transport(requests)
+        ) as client:
+            result = SyncRequestBuilder(client, "/tasks").update_many(
+                updates,
+                count=CountMethod.exact,
+                returning=ReturnMethod.minimal,
+                max_url_length=1000,
+            )
+        assert len(requests) > 1
+        assert all(len(str(request.url)) <= 1000 for request in requests)
+        assert result.count == 2000
+        assert result.data == []
+
+    def test_update_many_url_too_short(self):
+        with Client(base_url="http://example.com") as client:
+            with pytest.raises(ValueError):
+                SyncRequestBuilder(client, "/tasks").update_many(
+                    [(1, {"a": 1})], max_url_length=50
+                )
+
+
+def delete_transport(
+    requests: List[Request], failing: Optional[int] = None
+) -> MockTransport:
+    """Answer deletes filtered by `id=in.(...)` with the deleted rows, failing
+    the requests whose filter holds `failing`."""
+
+    def handler(request: Request) -> Response:
+        requests.append(request)
+        ids = [int(i) for i in request.url.params["id"][len("in.(") : -1].split(",")]
+        if failing in ids:
+            return Response(400, json={"message": "failed", "code": "P0001"})
+        headers = {"content-range": f"*/{len(ids)}"}
+        if "return=minimal" in request.headers["prefer"]:
+            return Response(204, headers=headers)
+        return Response(200, json=[{"id": i} for i in ids], headers=headers)
+
+    return MockTransport(handler)
+
+
+class TestDeleteMany:
+    def test_delete_many(self):
+        requests: List[Request] = []
+        with Client(
+            base_url="http://example.com", transport=delete_transport(requests)
+        ) as client:
+            result = SyncRequestBuilder(client, "/t").delete_many(
+                range(10_000, 13_000),
+                count=CountMethod.exact,
+                returning=ReturnMethod.minimal,
+                max_url_length=2000,
+            )
+        assert result.ok
+        assert result.count == 3000
+        assert result.data == []
+        assert len(requests) == len(result.chunks) > 1
+        assert all(request.method == "DELETE" for request in requests)
+        assert all(len(str(request.url)) <= 2000 for request in requests)
+        assert [chunk.start for chunk in result.chunks][:2] == [
+            0,
+            result.chunks[0].rows,
+        ]
+
+    def test_delete_many_returning_rows(self):
+        requests: List[Request] = []
+        with Client(
+            base_url="http://example.com", transport=delete_transport(requests)
+        ) as client:
+            result = SyncRequestBuilder(client, "/t").delete_many(
+                range(500), max_url_length=500
+            )
+        assert result.data == [{"id": i} for i in range(500)]
+        assert result.count is None
+
+    def test_stream_delete_many(self):
+        requests: List[Request] = []
+        with Client(
+            base_url="http://example.com", transport=delete_transport(requests)
+        ) as client:
+            builder = SyncRequestBuilder(client, "/t")
+            rows = [
+                row
+                for row in builder.stream_delete_many(
+                    range(1000), max_url_length=500, concurrency=3
+                )
+            ]
+        assert sorted(row["id"] for row in rows) == list(range(1000))
+        assert all("return=representation" in r.headers["prefer"] for r in requests)
+
+    def test_stream_delete_many_raises(self):
+        requests: List[Request] = []
+        with Client(
+            base_url="http://example.com",
+            transport=delete_transport(requests, failing=10),
+        ) as client:
+            builder = SyncRequestBuilder(client, "/t")
+            with pytest.raises(APIError):
+                for _ in builder.stream_delete_many(
+                    range(100), max_url_length=200, retries=0
+                ):
+                    pass
+
+    def test_stream_delete_many_stops_on_error(self):
+        started: List[List[int]] = []
+        running: List[List[int]] = []
+        with Client(
+            base_url="http://example.com",
+            transport=slow_delete_transport(started, running),
+        ) as client:
+            builder = SyncRequestBuilder(client, "/t")
+            with pytest.raises(APIError):
+                for _ in builder.stream_delete_many(
+                    range(100), max_url_length=200, concurrency=3, retries=0
+                ):
+                    pass
+            # the requests still running were cancelled before the error
+            # was raised, or awaited by threads
+            assert running == []
+        assert len(started) <= 3
+
+    def test_stream_delete_many_stops_on_close(self):
+        started: List[List[int]] = []
+        running: List[List[int]] = []
+        with Client(
+            base_url="http://example.com",
+            transport=slow_delete_transport(started, running),
+        ) as client:
+            builder = SyncRequestBuilder(client, "/t")
+            rows = builder.stream_delete_many(
+                range(1, 100), max_url_length=200, concurrency=3, retries=0
+            )
+            for _ in rows:
+                break
+            rows.close()  # type: ignore[attr-defined]
+            assert running == []
+        assert len(started) <= 4
+
+
+def slow_delete_transport(
+    started: List[List[int]], running: List[List[int]]
+) -> MockTransport:
+    """Answer deletes like `delete_transport` after a delay, failing at once
+    the request deleting the row 0; `running` holds the requests neither
+    answered nor cancelled yet."""
+
+    def handler(request: Request) -> Response:
+        ids = [int(i) for i in request.url.params["id"][len("in.(") : -1].split(",")]
+        started.append(ids)
+        if 0 in ids:
+            return Response(400, json={"message": "failed", "code": "P0001"})
+        running.append(ids)
+        try:
+            time.sleep(0.1)
+        finally:
+            running.remove(ids)
+        return Response(200, json=[{"id": i} for i in ids])
+
+    return MockTransport(handler)
+
+
+def in_transport(
+    rows: List[Dict[str, Any]], requests: List[Request], max_url_length: int
+) -> MockTransport:
+    """Serve `id=in.(...)` filters, `order`, `limit` and `offset` over rows,
+    refusing URLs longer than `max_url_length`."""
+
+    def handler(request: Request) -> Response:
+        requests.append(request)
+        if len(str(request.url)) > max_url_length:
+            return Response(414)
+        params = request.url.params
+        ids = {int(i) for i in params["id"][len("in.(") : -1].split(",")}
+        selected = [row for row in rows if row["id"] in ids]
+        if "order" in params:
+            column, direction = params["order"].split(".")
+            selected.sort(key=lambda row: row[column], reverse=direction == "desc")
+        total = len(selected)
+        offset = int(params.get("offset", 0))
+        selected = selected[offset:]
+        if "limit" in params:
+            selected = selected[: int(params["limit"])]
+        headers = {}
+        if "count=exact" in request.headers.get("prefer", ""):
+            headers["content-range"] = f"0-{len(selected) - 1}/{total}"
+        return Response(200, json=selected, headers=headers)
+
+    return MockTransport(handler)
+
+
+class TestSplitIn:
+    def test_split_in_list(self):
+        assert split_in_list('in.(1,"a,b",c)') == ["1", '"a,b"', "c"]
+        assert split_in_list("in.()") == []
+
+    def test_largest_in_filter(self):
+        params = QueryParams(
+            [("id", "in.(1,2)"), ("kind", "not.in.(1,2,3)"), ("tag", "in.(a,b,c)")]
+        )
+        assert largest_in_filter(params) == (2, "tag", "in.(a,b,c)")
+        assert largest_in_filter(QueryParams({"id": "eq.1"})) is None
+
+    def test_order_sort_key(self):
+        rows = [{"a": 1, "b": None}, {"a": None, "b": 1}, {"a": 1, "b": 2}]
+        assert sorted(rows, key=order_sort_key("a.asc,b.desc")) == [
+            {"a": 1, "b": None},
+            {"a": 1, "b": 2},
+            {"a": None, "b": 1},
+        ]
+        assert sorted(rows, key=order_sort_key("a.asc.nullsfirst,b.asc")) == [
+            {"a": None, "b": 1},
+            {"a": 1, "b": 2},
+            {"a": 1, "b": None},
+        ]
+
+    def test_split_in_keeps_order_and_limit(self):
+        requests: List[Request] = []
+        rows = [{"id": i, "score": (i * 7919) % 1000} for i in range(2000)]
+        ids = list(range(0, 2000, 2))
+        with Client(
+            base_url="http://example.com",
+            transport=in_transport(rows, requests, 1000),
+        ) as client:
+            response = (
+                SyncRequestBuilder(client, "/t")
+                .select("*", count=CountMethod.exact)
+                .in_("id", ids)
+                .order("score", desc=True)
+                .range(5, 24)
+                .split_in(max_url_length=1000)
+                .execute()
+            )
+        expected = sorted(
+            (row for row in rows if row["id"] % 2 == 0),
+            key=lambda row: row["score"],
+            reverse=True,
+        )[5:25]
+        assert [row["score"] for row in response.data] == [
+            row["score"] for row in expected
+        ]
+        assert response.count == 1000
+        assert len(requests) > 1
+        assert all(len(str(request.url)) <= 1000 for request in requests)
+        assert all("offset" not in request.url.params for request in requests)
+        assert all(request.url.params["limit"] == "25" for request in requests)
+
+    def test_split_in_without_order(self):
+        requests: List[Request] = []
+        rows = [{"id": i} for i in range(3000)]
+        with Client(
+            base_url="http://example.com",
+            transport=in_transport(rows, requests, 800),
+        ) as client:
+            response = (
+                SyncRequestBuilder(client, "/t")
+                .select("*")
+                .in_("id", list(range(1000, 3000)) + [1000])
+                .split_in(max_url_length=800, concurrency=2)
+                .execute(raw=True)
+            )
+        assert [row["id"] for row in response.data] == list(range(1000, 3000))
+
+    def test_split_in_refuses_oversized_urls(self):
+        requests: List[Request] = []
+        rows = [{"id": i} for i in range(3000)]
+        with Client(
+            base_url="http://example.com",
+            transport=in_transport(rows, requests, 800),
+        ) as client:
+            query = (
+                SyncRequestBuilder(client, "/t")
+                .select("*")
+                .in_("id", list(range(1000, 3000)))
+                .split_in(max_url_length=800)
+            )
+            with pytest.raises(ValueError):
+                query.execute(lazy=True)
+            with pytest.raises(ValueError):
+                for _ in query.paginate(page_size=10):
+                    pass
+            with pytest.raises(ValueError):
+                for _ in query.stream():
+                    pass
+            with pytest.raises(ValueError):
+                query.execute(spool=16)
+            with pytest.raises(ValueError):
+                query.execute_columnar()
+            with pytest.raises(ValueError):
+                for _ in query.stream_csv():
+                    pass
+            with pytest.raises(ValueError):
+                query.maybe_single().execute()
+            with pytest.raises(ValueError):
+                query.single().execute()
+            long_filter = (
+                SyncRequestBuilder(client, "/t")
+                .select("*")
+                .eq("name", "x" * 1000)
+                .split_in(max_url_length=800)
+            )
+            with pytest.raises(ValueError):
+                long_filter.execute()
+            no_room = (
+                SyncRequestBuilder(client, "/t")
+                .select("*")
+                .eq("name", "x" * 780)
+                .in_("id", [1, 2])
+                .split_in(max_url_length=800)
+            )
+            with pytest.raises(ValueError):
+                no_room.execute()
+        assert requests == []
+
+    def test_split_in_short_url(self):
+        requests: List[Request] = []
+        rows = [{"id": i} for i in range(10)]
+        with Client(
+            base_url="http://example.com",
+            transport=in_transport(rows, requests, 8000),
+        ) as client:
+            response = (
+                SyncRequestBuilder(client, "/t")
+                .select("*")
+                .in_("id", [1, 2])
+                .split_in()
+                .execute()
+            )
+        assert response.data == [{"id": 1}, {"id": 2}]
+        assert len(requests) == 1
+
+
+def gzip_transport(requests: List[Request]) -> MockTransport:
+    """Decompress the request bodies, and send back the rows compressed."""
+
+    def handler(request: Request) -> Response:
+        requests.append(request)
+        body = request.content
+        if request.headers.get("content-encoding") == "gzip":
+            body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+        rows = json.loads(body) if body else []
+        if isinstance(rows, dict):
+            rows = [rows]
+        return Response(
+            201,
+            content=Compression("gzip").compress(json.dumps(rows).encode()),
+            headers={"Content-Encoding": "gzip", "Content-Type": "application/json"},
+        )
+
+    return MockTransport(handler)
+
+
+class TestCompression:
+    def test_compresses_large_bodies(self):
+        requests: List[Request] = []
+        rows = [{"id": i, "name": "row"} for i in range(200)]
+        with Client(
+            base_url="http://example.com", transport=gzip_transport(requests)
+        ) as client:
+            builder = SyncRequestBuilder(
+                client, "/t", compression=Compression(threshold=100)
+            )
+            response = builder.insert(rows).execute()
+            small = builder.insert({"id": 1}).execute()
+        assert response.data == rows
+        assert small.data == [{"id": 1}]
+        large_request, small_request = requests
+        assert large_request.headers["content-encoding"] == "gzip"
+        assert int(large_request.headers["content-length"]) < len(json.dumps(rows))
+        assert "content-encoding" not in small_request.headers
+        assert "content-encoding" not in builder.insert({"id": 1}).headers
+
+    def test_compresses_streamed_bodies(self):
+        requests: List[Request] = []
+        rows = [{"id": i} for i in range(100)]
+        with Client(
+            base_url="http://example.com", transport=gzip_transport(requests)
+        ) as client:
+            builder = SyncRequestBuilder(
+                client, "/t", compression=Compression(threshold=10**9)
+            )
+            response = builder.insert(iter(rows), columns=["id"]).execute()
+            spooled = builder.insert(iter(rows), columns=["id"]).execute(spool=16)
+        assert response.data == rows
+        with spooled:
+            assert list(spooled) == rows
+        assert all(r.headers["content-encoding"] == "gzip" for r in requests)
+
+    def test_compresses_bulk_chunks(self):
+        requests: List[Request] = []
+        rows = [{"id": i, "name": "row"} for i in range(100)]
+        with Client(
+            base_url="http://example.com", transport=gzip_transport(requests)
+        ) as client:
+            result = (
+                SyncRequestBuilder(
+                    client, "/t", compression=Compression(level=9, threshold=0)
+                )
+                .insert(rows)
+                .execute_bulk(chunk_rows=40)
+            )
+        assert result.ok
+        assert result.data == rows
+        assert len(requests) == 3
+        assert all(r.headers["content-encoding"] == "gzip" for r in requests)
@@ -0,0 +1,134 @@
+import json
+from io import BytesIO
+
+import pytest
+from httpx import ConnectError
+
+from postgrest.bulk import (
+    BulkChunkResult,
+    BulkResult,
+    CSVSource,
+    encode_chunks,
+    encode_column_chunks,
+)
+from postgrest.codec import StdlibJSONCodec
+from postgrest.columnar import ColumnarRows
+from postgrest.exceptions import APIError
+
+codec = StdlibJSONCodec()
+
+
+def test_encode_chunks_by_rows():
+    rows = [{"id": i} for i in range(7)]
+    chunks = list(encode_chunks(rows, codec, max_rows=3))
+    assert [(c.index, c.start, c.rows) for c in chunks] == [
+        (0, 0, 3),
+        (1, 3, 3),
+        (2, 6, 1),
+    ]
+    assert [row for c in chunks for row in json.loads(c.body)] == rows
+
+
+def test_encode_chunks_by_bytes():
+    rows = [{"id": i} for i in range(10)]
+    row_size = len(codec.dumps(rows[0]))
+    max_bytes = 2 + 3 * row_size + 2
+    chunks = list(encode_chunks(rows, codec, max_bytes=max_bytes))
+    assert [c.rows for c in chunks] == [3, 3, 3, 1]
+    assert all(len(c.body) <= max_bytes for c in chunks)
+    assert [row for c in chunks for row in json.loads(c.body)] == rows
+
+
+def test_encode_chunks_with_oversized_row():
+    rows = [{"id": 1}, {"name": "x" * 100}, {"id": 2}]
+    chunks = list(encode_chunks(rows, codec, max_rows=10, max_bytes=50))
+    assert [c.rows for c in chunks] == [1, 1, 1]
+    assert json.loads(chunks[1].body) == [rows[1]]
+
+
+def test_encode_chunks_is_lazy():
+    consumed = []
+
+    def rows():
+        for i in range(10):
+            consumed.append(i)
+            yield {"id": i}
+
+    chunks = encode_chunks(rows(), codec, max_rows=2)
+    next(chunks)
+    assert consumed == [0, 1, 2]
+
+
+def test_encode_chunks_with_invalid_sizes():
+    with pytest.raises(ValueError):
+        list(encode_chunks([{}], codec, max_rows=0))
+    with pytest.raises(ValueError):
+        list(encode_chunks([{}], codec, max_bytes=2))
+
+
+def test_bulk_result():
+    error = APIError({"message": "duplicate key", "code": "23505"})
+    result = BulkResult(
+        [
+            BulkChunkResult(0, 0, 2, 2, [{"id": 1}, {"id": 2}], None, 1, 0.1),
+            BulkChunkResult(1, 2, 2, None, [], error, 1, 0.1),
+            BulkChunkResult(2, 4, 1, 1, [{"id": 5}], None, 3, 0.3),
+        ],
+        0.4,
+    )
+    assert not result.ok
+    assert result.rows == 5
+    assert result.count == 3
+    assert result.data == [{"id": 1}, {"id": 2}, {"id": 5}]
+    assert [chunk.index for chunk in result.errors] == [1]
+    with pytest.raises(APIError):
+        result.raise_for_errors()
+
+
+def test_bulk_result_without_count():
+    transport_error = ConnectError("refused")
+    result = BulkResult([BulkChunkResult(0, 0, 1, None, [], transport_error, 3, 1)], 1)
+    assert result.count is None
+    assert result.data == []
+    with pytest.raises(ConnectError):
+        result.raise_for_errors()
+    assert BulkResult([], 0).ok
+
+
+def test_encode_column_chunks():
+    rows = ColumnarRows({"id": [1, 2, 3], "name": ["a", "b", "c"]})
+    chunks = list(encode_column_chunks(rows, codec, 2))
+    assert [(c.index, c.start, c.rows) for c in chunks] == [(0, 0, 2), (1, 2, 1)]
+    assert json.loads(chunks[1].body) == [{"id": 3, "name": "c"}]
+
+
+CSV = b"id,name\n1,a\n2,b\n3,c\n"
+
+
+def test_csv_source_from_path(tmp_path):
+    path = tmp_path / "rows.csv"
+    path.write_bytes(CSV)
+    source = CSVSource(path, read_size=4)
+    assert b"".join(source.iter_bytes()) == CSV
+    chunks = list(CSVSource(str(path)).chunks(max_rows=2))
+    assert [(c.index, c.start, c.rows) for c in chunks] == [(0, 0, 2), (1, 2, 1)]
+    assert chunks[1].body == b"id,name\n3,c\n"
+
+
+def test_csv_source_from_file_and_iterator():
+    assert b"".join(CSVSource(BytesIO(CSV)).iter_bytes()) == CSV
+    source = CSVSource(iter([b"id,name\n1,", b"a\n", "2,b\n"]))
+    assert [c.body for c in source.chunks(max_rows=1)] == [
+        b"id,name\n1,a\n",
+        b"id,name\n2,b\n",
+    ]
+
+
+def test_csv_source_from_async_iterator():
+    async def parts():
+        yield CSV
+
+    source = CSVSource(parts())
+    assert source.is_async
+    with pytest.raises(TypeError):
+        list(source.iter_bytes())
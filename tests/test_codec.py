@@ -0,0 +1,103 @@
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from json import JSONDecodeError
+from uuid import UUID
+
+import pytest
+
+from postgrest.codec import (
+    JSONCodec,
+    MsgspecJSONCodec,
+    OrjsonJSONCodec,
+    StdlibJSONCodec,
+    get_default_json_codec,
+)
+
+
+def available_codecs():
+    codecs = [StdlibJSONCodec()]
+    for codec_class in (OrjsonJSONCodec, MsgspecJSONCodec):
+        try:
+            codecs.append(codec_class())
+        except ImportError:
+            pass
+    return codecs
+
+
+@pytest.fixture(params=available_codecs(), ids=lambda codec: codec.name)
+def codec(request) -> JSONCodec:
+    return request.param
+
+
+def test_roundtrip(codec: JSONCodec):
+    rows = [{"id": 1, "name": "Curaçao", "tags": ["a"], "parent": None}]
+    assert codec.loads(codec.dumps(rows)) == rows
+
+
+def test_dumps_rich_types(codec: JSONCodec):
+    row = {
+        "created_at": datetime(
+            2024, 1, 2, 3, 4, 5, tzinfo=timezone(timedelta(hours=2))
+        ),
+        "day": date(2024, 1, 2),
+        "amount": Decimal("12.340"),
+        "uuid": UUID("12345678-1234-5678-1234-567812345678"),
+    }
+    assert codec.loads(codec.dumps(row)) == {
+        "created_at": "2024-01-02T03:04:05+02:00",
+        "day": "2024-01-02",
+        "amount": "12.340",
+        "uuid": "12345678-1234-5678-1234-567812345678",
+    }
+
+
+def test_dumps_unsupported_type(codec: JSONCodec):
+    with pytest.raises(TypeError):
+        codec.dumps({"value": object()})
+
+
+@pytest.mark.parametrize("data", [b"", b"id,name\n1,foo\n", "{"])
+def test_loads_invalid_document(codec: JSONCodec, data):
+    with pytest.raises(JSONDecodeError):
+        codec.loads(data)
+
+
+@pytest.mark.parametrize("value", [2**70, -(2**70), 2**64])
+def test_dumps_big_integer(codec: JSONCodec, value: int):
+    assert codec.dumps({"n": value}) == f'{{"n":{value}}}'.encode()
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b'[{"n":123456789012345678901234567890}]',
+        '[{"n":123456789012345678901234567890}]',
+    ],
+)
+def test_loads_big_integer(codec: JSONCodec, data):
+    assert codec.loads(data) == [{"n": 123456789012345678901234567890}]
+
+
+def test_default_codec_handles_big_integers():
+    codec = get_default_json_codec()
+    assert not isinstance(codec, OrjsonJSONCodec)
+    assert codec.loads(codec.dumps([2**70])) == [2**70]
+
+
+def test_default_codec_is_shared():
+    assert get_default_json_codec() is get_default_json_codec()
+
+
+def test_dumps_rows(codec: JSONCodec):
+    rows = [(1, "a", None), (2, 'b "quoted"', 2.5)]
+    encoded = codec.dumps_rows(["id", "user name", "score"], rows)
+    assert codec.loads(encoded) == [
+        {"id": 1, "user name": "a", "score": None},
+        {"id": 2, "user name": 'b "quoted"', "score": 2.5},
+    ]
+    assert codec.loads(codec.dumps_rows(["id"], [])) == []
+
+
+def test_dumps_rows_with_wrong_width(codec: JSONCodec):
+    with pytest.raises(ValueError):
+        codec.dumps_rows(["id", "name"], [(1, "a"), (2,)])
@@ -0,0 +1,71 @@
+from array import array
+
+import pytest
+
+from postgrest.columnar import ColumnarBuilder, ColumnarRows
+
+
+def test_numeric_columns_use_arrays():
+    builder = ColumnarBuilder()
+    builder.extend(
+        [
+            {"id": 1, "price": 1.5, "name": "a"},
+            {"id": 2, "price": 2.0, "name": "b"},
+        ]
+    )
+    columns = builder.build()
+    assert len(builder) == 2
+    assert columns["id"] == array("q", [1, 2])
+    assert columns["price"] == array("d", [1.5, 2.0])
+    assert columns["name"] == ["a", "b"]
+
+
+def test_int_column_is_promoted_to_floats():
+    builder = ColumnarBuilder()
+    builder.extend([{"amount": 1}, {"amount": 2.5}, {"amount": 3}])
+    assert builder.build()["amount"] == array("d", [1.0, 2.5, 3.0])
+
+
+@pytest.mark.parametrize("value", [None, "x", True, 2**70])
+def test_numeric_column_falls_back_to_list(value):
+    builder = ColumnarBuilder()
+    builder.extend([{"id": 1}, {"id": value}, {"id": 3}])
+    assert builder.build()["id"] == [1, value, 3]
+
+
+def test_missing_and_new_columns_are_filled_with_none():
+    builder = ColumnarBuilder()
+    builder.extend([{"a": "x"}, {"b": "y"}, {"a": "z", "b": "w"}])
+    assert builder.columns == ["a", "b"]
+    assert builder.build() == {"a": ["x", None, "z"], "b": [None, "y", "w"]}
+
+
+def test_append_values():
+    builder = ColumnarBuilder(["id", "name"])
+    builder.append_values((1, "a"))
+    builder.append_values([2, "b"])
+    assert builder.build() == {"id": array("q", [1, 2]), "name": ["a", "b"]}
+    with pytest.raises(ValueError):
+        builder.append_values([3])
+
+
+def test_columnar_rows_from_rows():
+    rows = ColumnarRows([(1, "a"), (2, "b")], ["id", "name"])
+    assert rows.columns == ("id", "name")
+    assert list(rows) == [(1, "a"), (2, "b")]
+
+
+def test_columnar_rows_from_columns():
+    rows = ColumnarRows({"id": array("q", [1, 2]), "name": ["a", "b"]})
+    assert rows.columns == ("id", "name")
+    assert list(rows) == [(1, "a"), (2, "b")]
+    # the columns can be iterated again
+    assert list(rows) == [(1, "a"), (2, "b")]
+    assert list(ColumnarRows({"id": [1], "name": ["a"]}, ["name"])) == [("a",)]
+
+
+def test_columnar_rows_validation():
+    with pytest.raises(ValueError):
+        ColumnarRows([(1, "a")])
+    with pytest.raises(ValueError):
+        ColumnarRows({"id": [1, 2], "name": ["a"]})
@@ -0,0 +1,80 @@
+import zlib
+
+import httpx
+import pytest
+
+from postgrest import compression as compression_module
+from postgrest.compression import Compression, brotli, zstandard
+
+
+def test_gzip():
+    compression = Compression()
+    data = b'{"id": 1, "name": "row"}' * 1000
+    compressed = compression.compress(data)
+    assert len(compressed) < len(data) // 10
+    assert zlib.decompress(compressed, 16 + zlib.MAX_WBITS) == data
+
+
+def test_compressor_is_incremental():
+    compressor = Compression("gzip", 1).compressor()
+    parts = [compressor.compress(b"abc" * 100) for _ in range(10)]
+    parts.append(compressor.flush())
+    assert zlib.decompress(b"".join(parts), 16 + zlib.MAX_WBITS) == b"abc" * 1000
+
+
+def test_accept_encoding():
+    accept_encoding = Compression().accept_encoding
+    assert accept_encoding.startswith("gzip, ")
+    assert "deflate;q=0.8" in accept_encoding
+    assert "identity" not in accept_encoding
+    if brotli is None and zstandard is None:
+        assert accept_encoding == "gzip, deflate;q=0.8"
+
+
+@pytest.mark.parametrize(
+    "version, decodes_zstd",
+    [("0.26.0", False), ("0.27.0", False), ("0.27.1", True), ("0.28.1", True)],
+)
+def test_accept_encoding_zstd_needs_httpx_0_27_1(
+    monkeypatch: pytest.MonkeyPatch, version: str, decodes_zstd: bool
+):
+    monkeypatch.setattr(compression_module, "zstandard", object())
+    monkeypatch.setattr(httpx, "__version__", version)
+    assert ("zstd" in Compression().accept_encoding) is decodes_zstd
+    accept_encoding = Compression("zstd").accept_encoding
+    assert accept_encoding.startswith("zstd, ") is decodes_zstd
+    assert accept_encoding.startswith("gzip;q=0.8, ") is not decodes_zstd
+
+
+def test_accept_encoding_without_zstandard(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(compression_module, "zstandard", None)
+    assert "zstd" not in Compression().accept_encoding
+
+
+@pytest.mark.skipif(brotli is None, reason="brotli is not installed")
+def test_brotli():
+    data = b"row" * 1000
+    assert brotli.decompress(Compression("br", 5).compress(data)) == data
+    assert Compression("br").accept_encoding.startswith("br, ")
+
+
+@pytest.mark.skipif(zstandard is None, reason="zstandard is not installed")
+def test_zstd():
+    data = b"row" * 1000
+    decompressor = zstandard.ZstdDecompressor().decompressobj()
+    assert decompressor.decompress(Compression("zstd").compress(data)) == data
+
+
+def test_invalid():
+    with pytest.raises(ValueError):
+        Compression("lz4")
+    with pytest.raises(ValueError):
+        Compression("gzip", 10)
+    with pytest.raises(ValueError):
+        Compression(threshold=-1)
+    if brotli is None:
+        with pytest.raises(ImportError):
+            Compression("br")
+    if zstandard is None:
+        with pytest.raises(ImportError):
+            Compression("zstd")
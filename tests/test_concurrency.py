@@ -0,0 +1,240 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from postgrest.concurrency import (
+    AsyncReadAhead,
+    AsyncTaskPool,
+    SyncReadAhead,
+    SyncTaskPool,
+)
+
+
+async def test_async_map_ordered():
+    async def work(i):
+        await asyncio.sleep(0.01 * (5 - i))
+        return i
+
+    results = [r async for r in AsyncTaskPool(3).map(work, range(5))]
+    assert results == [0, 1, 2, 3, 4]
+
+
+async def test_async_map_unordered_and_bounded():
+    running = 0
+    peak = 0
+
+    async def work(i):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01 if i == 0 else 0)
+        running -= 1
+        return i
+
+    results = [r async for r in AsyncTaskPool(2).map(work, range(6), ordered=False)]
+    assert sorted(results) == list(range(6))
+    assert results[0] != 0
+    assert peak == 2
+
+
+async def test_async_map_cancels_on_error():
+    cancelled = []
+
+    async def work(i):
+        if i == 0:
+            raise RuntimeError("boom")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(i)
+            raise
+
+    with pytest.raises(RuntimeError):
+        async for _ in AsyncTaskPool(3).map(work, range(3)):
+            pass
+    assert sorted(cancelled) == [1, 2]
+
+
+def test_sync_map_ordered():
+    def work(i):
+        time.sleep(0.01 * (5 - i))
+        return i
+
+    assert list(SyncTaskPool(3).map(work, range(5))) == [0, 1, 2, 3, 4]
+
+
+def test_sync_map_unordered_and_bounded():
+    lock = threading.Lock()
+    running = 0
+    peak = 0
+
+    def work(i):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.05 if i == 0 else 0.01)
+        with lock:
+            running -= 1
+        return i
+
+    results = list(SyncTaskPool(2).map(work, range(6), ordered=False))
+    assert sorted(results) == list(range(6))
+    assert results[0] != 0
+    assert peak <= 2
+
+
+async def test_async_chain_map_continues_chains_independently():
+    async def page(item):
+        chain, number = item
+        await asyncio.sleep(0.05 if chain == "slow" else 0.001)
+        following = (chain, number + 1) if number < 4 else None
+        return item, following
+
+    results = [
+        r async for r in AsyncTaskPool(2).chain_map(page, [("slow", 0), ("fast", 0)])
+    ]
+    assert sorted(results) == sorted(
+        (chain, i) for chain in ("slow", "fast") for i in range(5)
+    )
+    # the fast chain is done before the slow one gets its second page
+    assert results.index(("fast", 4)) < results.index(("slow", 1))
+
+
+async def test_async_chain_map_bounded():
+    running = 0
+    peak = 0
+
+    async def work(i):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.001)
+        running -= 1
+        return i, i + 10 if i < 10 else None
+
+    results = [r async for r in AsyncTaskPool(2).chain_map(work, range(5))]
+    assert sorted(results) == sorted(list(range(5)) + list(range(10, 15)))
+    assert peak == 2
+
+
+def test_sync_chain_map_continues_chains_independently():
+    def page(item):
+        chain, number = item
+        time.sleep(0.05 if chain == "slow" else 0.001)
+        following = (chain, number + 1) if number < 4 else None
+        return item, following
+
+    results = list(SyncTaskPool(2).chain_map(page, [("slow", 0), ("fast", 0)]))
+    assert sorted(results) == sorted(
+        (chain, i) for chain in ("slow", "fast") for i in range(5)
+    )
+    assert results.index(("fast", 4)) < results.index(("slow", 1))
+
+
+def test_invalid_concurrency():
+    with pytest.raises(ValueError):
+        AsyncTaskPool(0)
+    with pytest.raises(ValueError):
+        SyncTaskPool(0)
+
+
+async def test_async_read_ahead():
+    produced = []
+
+    async def items():
+        for i in range(10):
+            produced.append(i)
+            yield i
+
+    async with AsyncReadAhead(items(), 2) as reader:
+        first = await reader.__anext__()
+        await asyncio.sleep(0.01)
+        # one item consumed, two waiting, one held by the blocked producer
+        assert first == 0
+        assert produced == [0, 1, 2, 3]
+        rest = [i async for i in reader]
+    assert rest == list(range(1, 10))
+
+
+async def test_async_read_ahead_cancelled_on_exit():
+    closed = []
+
+    async def items():
+        try:
+            for i in range(10):
+                await asyncio.sleep(0)
+                yield i
+        finally:
+            closed.append(True)
+
+    async with AsyncReadAhead(items(), 2) as reader:
+        async for i in reader:
+            break
+    assert closed == [True]
+
+
+async def test_async_read_ahead_error():
+    async def items():
+        yield 1
+        raise RuntimeError("boom")
+
+    async with AsyncReadAhead(items(), 1) as reader:
+        assert await reader.__anext__() == 1
+        with pytest.raises(RuntimeError):
+            await reader.__anext__()
+
+
+async def test_async_read_ahead_disabled():
+    async def items():
+        yield 1
+        yield 2
+
+    async with AsyncReadAhead(items(), 0) as reader:
+        assert [i async for i in reader] == [1, 2]
+
+
+def test_sync_read_ahead():
+    produced = []
+
+    def items():
+        for i in range(10):
+            produced.append(i)
+            yield i
+
+    with SyncReadAhead(items(), 2) as reader:
+        assert next(reader) == 0
+        time.sleep(0.05)
+        assert produced == [0, 1, 2, 3]
+        assert list(reader) == list(range(1, 10))
+
+
+def test_sync_read_ahead_stopped_on_exit():
+    produced = []
+    closed = []
+
+    def items():
+        try:
+            for i in range(100):
+                produced.append(i)
+                yield i
+        finally:
+            closed.append(True)
+
+    with SyncReadAhead(items(), 2) as reader:
+        next(reader)
+    assert closed == [True]
+    assert len(produced) < 10
+
+
+def test_sync_read_ahead_error():
+    def items():
+        yield 1
+        raise RuntimeError("boom")
+
+    with SyncReadAhead(items(), 1) as reader:
+        assert next(reader) == 1
+        with pytest.raises(RuntimeError):
+            next(reader)
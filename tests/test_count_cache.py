@@ -0,0 +1,82 @@
+import pytest
+from httpx import Headers, QueryParams
+
+from postgrest.count_cache import CountCache
+from postgrest.types import CountMethod
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def key(params="id=gt.1", headers=None, method=CountMethod.exact, path="/t"):
+    return CountCache.key(path, QueryParams(params), Headers(headers or {}), method)
+
+
+def test_key_normalizes_params():
+    assert key("a=eq.1&b=eq.2&limit=10&order=id") == key("offset=5&b=eq.2&a=eq.1")
+    assert key("a=eq.1") != key("a=eq.2")
+    assert key() != key(path="/u")
+    assert key() != key(method=CountMethod.planned)
+
+
+def test_key_depends_on_schema_and_role():
+    assert key(headers={"Accept-Profile": "a"}) != key(headers={"Accept-Profile": "b"})
+    assert key(headers={"Authorization": "Bearer a"}) != key(
+        headers={"Authorization": "Bearer b"}
+    )
+    assert "Bearer a" not in repr(key(headers={"Authorization": "Bearer a"}))
+
+
+def test_ttl():
+    clock = Clock()
+    cache = CountCache(ttl=10, clock=clock)
+    cache.set(key(), 42)
+    clock.now = 9.9
+    assert cache.get(key()) == 42
+    clock.now = 10
+    assert cache.get(key()) is None
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_lru_eviction():
+    cache = CountCache(max_entries=2)
+    cache.set(key("a=eq.1"), 1)
+    cache.set(key("a=eq.2"), 2)
+    assert cache.get(key("a=eq.1")) == 1
+    cache.set(key("a=eq.3"), 3)
+    assert cache.get(key("a=eq.2")) is None
+    assert cache.get(key("a=eq.1")) == 1
+    assert cache.get(key("a=eq.3")) == 3
+
+
+def test_invalidate():
+    cache = CountCache()
+    cache.set(key(path="/t"), 1)
+    cache.set(key(path="/u"), 2)
+    cache.invalidate("/t")
+    assert cache.get(key(path="/t")) is None
+    assert cache.get(key(path="/u")) == 2
+    cache.invalidate()
+    assert len(cache) == 0
+
+
+def test_refresh():
+    cache = CountCache()
+    assert cache.start_refresh(key())
+    assert not cache.start_refresh(key())
+    cache.end_refresh(key(), 7)
+    assert cache.get(key()) == 7
+    assert cache.start_refresh(key())
+    cache.end_refresh(key(), None)
+    assert cache.get(key()) == 7
+
+
+def test_exact_fallback_is_rejected():
+    with pytest.raises(ValueError):
+        CountCache(fallback=CountMethod.exact)
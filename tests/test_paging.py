@@ -0,0 +1,67 @@
+import pytest
+
+from postgrest.paging import AdaptivePageSize, PageStats
+
+
+def test_grows_at_most_by_max_growth():
+    sizer = AdaptivePageSize(100, target_latency=1.0)
+    assert sizer.record(rows=100, bytes=1000, elapsed=0.001) == 200
+    assert sizer.record(rows=200, bytes=2000, elapsed=0.002) == 400
+    assert sizer.history[0] == PageStats(100, 100, 1000, 0.001, 200)
+
+
+def test_shrinks_toward_target_latency():
+    sizer = AdaptivePageSize(1000, min_size=10, target_latency=0.5, smoothing=1.0)
+    # 10 ms per row, so 50 rows fit in the target latency
+    assert sizer.record(rows=1000, bytes=1000, elapsed=10.0) == 50
+
+
+def test_shrinks_toward_byte_budget():
+    sizer = AdaptivePageSize(1000, min_size=10, target_bytes=64_000)
+    # 1 KB per row, so 62 rows fit in the budget
+    assert sizer.record(rows=1000, bytes=1_024_000, elapsed=0.01) == 62
+
+
+def test_stays_within_bounds():
+    sizer = AdaptivePageSize(500, min_size=200, max_size=600)
+    assert sizer.record(rows=500, bytes=500, elapsed=0.0001) == 600
+    assert sizer.record(rows=600, bytes=600, elapsed=600.0) == 200
+
+
+def test_smoothing():
+    sizer = AdaptivePageSize(100, min_size=1, target_latency=1.0, smoothing=0.5)
+    sizer.record(rows=100, bytes=100, elapsed=1.0)
+    sizer.record(rows=100, bytes=100, elapsed=3.0)
+    assert sizer.seconds_per_row == pytest.approx(0.02)
+    assert sizer.size == 50
+
+
+def test_empty_page_keeps_size():
+    sizer = AdaptivePageSize(300)
+    assert sizer.record(rows=0, bytes=2, elapsed=0.01) == 300
+    assert sizer.rows == 0
+    assert len(sizer.history) == 1
+
+
+def test_totals():
+    sizer = AdaptivePageSize(100)
+    sizer.record(rows=100, bytes=1000, elapsed=0.1)
+    sizer.record(rows=50, bytes=500, elapsed=0.05)
+    assert sizer.rows == 150
+    assert sizer.bytes == 1500
+    assert sizer.elapsed == pytest.approx(0.15)
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"min_size": 0},
+        {"min_size": 10, "max_size": 5},
+        {"target_latency": 0},
+        {"max_growth": 0.5},
+        {"smoothing": 0},
+    ],
+)
+def test_invalid_settings(kwargs):
+    with pytest.raises(ValueError):
+        AdaptivePageSize(**kwargs)
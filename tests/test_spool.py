@@ -0,0 +1,74 @@
+from mmap import mmap
+
+import pytest
+from httpx import Headers
+
+from postgrest.spool import SpooledAPIResponse, SpooledBody
+
+
+def spool(chunks, threshold):
+    body = SpooledBody(threshold)
+    for chunk in chunks:
+        body.write(chunk)
+    return body
+
+
+def test_body_kept_in_memory():
+    body = spool([b"[1,", b"2]"], threshold=16)
+    assert not body.on_disk
+    assert body.size == 5
+    assert isinstance(body.buffer, memoryview)
+    assert bytes(body.buffer) == b"[1,2]"
+    body.close()
+
+
+def test_body_spilled_to_disk(tmp_path):
+    body = SpooledBody(4, directory=str(tmp_path))
+    body.write(b"[1,")
+    assert not body.on_disk
+    body.write(b"2]")
+    assert body.on_disk
+    assert isinstance(body.buffer, mmap)
+    assert body.buffer[:] == b"[1,2]"
+    assert b"".join(body.iter_bytes(2)) == b"[1,2]"
+    body.close()
+    assert body.size == 0
+
+
+def test_iter_text_with_split_characters():
+    body = spool(['["été"]'.encode()], threshold=0)
+    assert "".join(body.iter_text(chunk_size=2)) == '["été"]'
+    body.close()
+
+
+@pytest.mark.parametrize("threshold", [0, 1024])
+def test_json_rows(threshold):
+    body = spool([b'[{"id": 1},', b' {"id": 2}]'], threshold)
+    with SpooledAPIResponse(body, 2, Headers()) as response:
+        assert list(response) == [{"id": 1}, {"id": 2}]
+        # the rows can be read more than once
+        assert list(response.rows()) == [{"id": 1}, {"id": 2}]
+        assert response.count == 2
+    assert body.size == 0
+
+
+def test_empty_json_body():
+    with SpooledAPIResponse(spool([], 0), None, Headers()) as response:
+        assert list(response) == []
+
+
+def test_csv_rows():
+    body = spool([b"id,name\n1,Al", b"ice\n2,Bob\n"], threshold=0)
+    with SpooledAPIResponse(body, None, Headers(), "csv") as response:
+        assert list(response.rows(converters={"id": int})) == [
+            {"id": 1, "name": "Alice"},
+            {"id": 2, "name": "Bob"},
+        ]
+
+
+def test_text_plan_has_no_rows():
+    body = spool([b"Seq Scan"], threshold=0)
+    with SpooledAPIResponse(body, None, Headers(), "text") as response:
+        assert bytes(response.buffer) == b"Seq Scan"
+        with pytest.raises(ValueError):
+            list(response)
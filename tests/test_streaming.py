@@ -0,0 +1,195 @@
+import json
+from csv import reader
+from io import StringIO
+
+import pytest
+
+from postgrest.codec import StdlibJSONCodec
+from postgrest.streaming import (
+    CSVChunker,
+    CSVStreamParser,
+    JSONArrayEncoder,
+    JSONArrayParser,
+)
+
+
+def parse_in_chunks(document: str, size: int):
+    parser = JSONArrayParser()
+    items = []
+    for i in range(0, len(document), size):
+        items.extend(parser.feed(document[i : i + size]))
+    items.extend(parser.close())
+    return items
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_parse_rows_in_chunks(size):
+    rows = [
+        {"id": 1, "name": 'a, "quoted" [name]', "tags": ["x", "y"]},
+        {"id": 2, "name": "Curaçao", "nested": {"a": [1, {"b": None}]}},
+        {"id": 3, "name": None, "amount": -12.5e3},
+    ]
+    document = json.dumps(rows, indent=2, ensure_ascii=False)
+    assert parse_in_chunks(document, size) == rows
+
+
+@pytest.mark.parametrize("size", [1, 3, 100])
+def test_parse_scalars_split_across_chunks(size):
+    assert parse_in_chunks('[12345, true, null, "ab", 6]', size) == [
+        12345,
+        True,
+        None,
+        "ab",
+        6,
+    ]
+
+
+SPLIT_DOCUMENT = (
+    '[1.5, -2e-3, 10, true, false, null, "a \\"b\\" \\\\", '
+    '{"id": 1, "s": "x]}\\"", "t": [1.25, {"u": null}]}, [[], {}], "", 0.5]'
+)
+
+
+@pytest.mark.parametrize("offset", range(len(SPLIT_DOCUMENT) + 1))
+def test_parse_split_at_every_offset(offset):
+    parser = JSONArrayParser()
+    items = parser.feed(SPLIT_DOCUMENT[:offset])
+    items += parser.feed(SPLIT_DOCUMENT[offset:])
+    items += parser.close()
+    assert items == json.loads(SPLIT_DOCUMENT)
+
+
+def test_parse_number_cut_after_decimal_point():
+    parser = JSONArrayParser()
+    assert parser.feed("[1.") == []
+    assert parser.feed("5]") == [1.5]
+    assert parser.close() == []
+
+
+def test_parse_large_element_in_small_chunks():
+    row = {"id": 1, "payload": ["x" * 100, {"y": '"]}'}] * 2000}
+    document = json.dumps([row, row])
+    parser = JSONArrayParser()
+    items = []
+    for i in range(0, len(document), 64):
+        items.extend(parser.feed(document[i : i + 64]))
+        # the element being received is kept as a list of chunks
+        assert len(parser._pending) <= len(document) // 64 + 1
+    items.extend(parser.close())
+    assert items == [row, row]
+
+
+def test_parse_empty_array():
+    assert parse_in_chunks(" [ ] ", 1) == []
+
+
+def test_feed_returns_completed_rows_only():
+    parser = JSONArrayParser()
+    assert parser.feed('[{"id": 1}, {"id"') == [{"id": 1}]
+    assert parser.feed(": 2}]") == [{"id": 2}]
+    assert parser.close() == []
+
+
+@pytest.mark.parametrize(
+    "document",
+    ['{"id": 1}', '[{"id": 1}', "[1 2]", "[1] 2", "[1.]", "[tru, 1]", "[1,]"],
+)
+def test_invalid_documents(document):
+    with pytest.raises(json.JSONDecodeError):
+        parse_in_chunks(document, 3)
+
+
+CSV_DOCUMENT = 'id,name,note\n1,"a, b","multi\nline ""quoted"""\n2,x,\n3,"y",z'
+
+
+@pytest.mark.parametrize("size", [1, 2, 5, 1000])
+def test_csv_parse_rows_in_chunks(size):
+    parser = CSVStreamParser({"id": int, "note": str})
+    rows = []
+    for i in range(0, len(CSV_DOCUMENT), size):
+        rows.extend(parser.feed(CSV_DOCUMENT[i : i + size]))
+    rows.extend(parser.close())
+    assert parser.columns == ["id", "name", "note"]
+    assert rows == [
+        [1, "a, b", 'multi\nline "quoted"'],
+        [2, "x", None],
+        [3, "y", "z"],
+    ]
+
+
+@pytest.mark.parametrize("size", [1, 3, 1000])
+def test_csv_split_on_record_boundaries(size):
+    parser = CSVStreamParser()
+    chunks = []
+    for i in range(0, len(CSV_DOCUMENT), size):
+        records = parser.split(CSV_DOCUMENT[i : i + size])
+        assert records == "" or records.endswith("\n")
+        chunks.append(records)
+    chunks.append(parser.flush())
+    assert "".join(chunks) == CSV_DOCUMENT
+    assert 'line ""quoted"""\n' in "".join(chunks[:-1])
+
+
+@pytest.mark.parametrize("chunk_size", [1, 10, 1000])
+def test_encode_array_in_chunks(chunk_size):
+    rows = [{"id": i, "name": f"row {i}"} for i in range(20)]
+    encoder = JSONArrayEncoder(StdlibJSONCodec(), chunk_size)
+    chunks = [encoder.feed(row) for row in rows]
+    chunks.append(encoder.close())
+    assert json.loads(b"".join(chunks)) == rows
+    assert encoder.rows == 20
+    if chunk_size == 1:
+        assert all(chunks)
+    if chunk_size == 1000:
+        assert not any(chunks[:-1])
+
+
+def test_encode_empty_array():
+    assert JSONArrayEncoder(StdlibJSONCodec()).close() == b"[]"
+
+
+CSV_BYTES = b'id,name\r\n1,"a\nb"\r\n2,"say ""hi"", then\nleave"\r\n3,c\r\n4,d\r\n5,e'
+
+
+def chunk_csv(chunker: CSVChunker, document: bytes, size: int):
+    chunks = []
+    for i in range(0, len(document), size):
+        chunks.extend(chunker.feed(document[i : i + size]))
+    chunks.extend(chunker.close())
+    return chunks
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+def test_csv_chunker_by_rows(size):
+    chunks = chunk_csv(CSVChunker(max_rows=2), CSV_BYTES, size)
+    assert [rows for rows, _ in chunks] == [2, 2, 1]
+    parsed = [list(reader(StringIO(body.decode(), newline=""))) for _, body in chunks]
+    assert all(records[0] == ["id", "name"] for records in parsed)
+    assert [record for records in parsed for record in records[1:]] == [
+        ["1", "a\nb"],
+        ["2", 'say "hi", then\nleave'],
+        ["3", "c"],
+        ["4", "d"],
+        ["5", "e"],
+    ]
+
+
+@pytest.mark.parametrize("size", [1, 5, 1000])
+def test_csv_chunker_by_bytes(size):
+    document = b"id\n" + b"".join(b"%d\n" % i for i in range(100, 200))
+    chunks = chunk_csv(CSVChunker(max_bytes=23), document, size)
+    assert all(len(body) <= 23 for _, body in chunks)
+    assert [rows for rows, _ in chunks] == [5] * 20
+    assert b"".join(body[3:] for _, body in chunks) == document[3:]
+
+
+def test_csv_chunker_with_oversized_record():
+    chunks = CSVChunker(max_bytes=10).feed(b"id\n1\n1234567890\n2\n")
+    assert chunks == [(1, b"id\n1\n"), (1, b"id\n1234567890\n")]
+
+
+def test_csv_chunker_without_records():
+    chunker = CSVChunker(max_rows=2)
+    assert chunker.feed(b"id,name\n") == []
+    assert chunker.close() == []
+    assert chunker.header == b"id,name\n"
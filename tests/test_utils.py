@@ -1,7 +1,11 @@
+from dataclasses import dataclass
+from typing import Optional
+
 import pytest
 from deprecation import fail_if_not_removed
+from pydantic import BaseModel
 
-from postgrest.utils import SyncClient, sanitize_param
+from postgrest.utils import SyncClient, json_model_decoder, sanitize_param
 
 
 @fail_if_not_removed
@@ -27,3 +31,38 @@ def test_sync_client():
 )
 def test_sanitize_params(value, expected):
     assert sanitize_param(value) == expected
+
+
+class Country(BaseModel):
+    id: int
+    name: str
+    iso2: Optional[str] = None
+
+
+@dataclass
+class City:
+    id: int
+    name: str
+
+
+def test_json_model_decoder_pydantic():
+    decode = json_model_decoder(Country, many=True)
+    countries = decode(b'[{"id": 1, "name": "Bonaire", "iso2": "BQ"}]')
+    assert countries == [Country(id=1, name="Bonaire", iso2="BQ")]
+    assert json_model_decoder(Country, many=True) is decode
+
+
+def test_json_model_decoder_dataclass():
+    decode = json_model_decoder(City, many=False)
+    assert decode(b'{"id": 1, "name": "Kralendijk"}') == City(id=1, name="Kralendijk")
+
+
+def test_json_model_decoder_msgspec():
+    msgspec = pytest.importorskip("msgspec")
+
+    class Point(msgspec.Struct):
+        x: int
+        y: int
+
+    decode = json_model_decoder(Point, many=True)
+    assert decode(b'[{"x": 1, "y": 2}]') == [Point(x=1, y=2)]